@@ -57,14 +57,15 @@ class CustomUserAdmin(UserAdmin):
         "profile_type",
     )
     search_fields = ("id", "email", "phone_number", "name")
+    list_filter = ("profile_type", "is_active", "is_staff", "is_superuser")
     ordering = ("id", "is_staff", "is_superuser")
     extra = 0
 
     def get_inline_instances(self, request, obj=None):
         try:
-            if obj.profile_type is ProfileType.CUSTOMER:
+            if obj.profile_type == ProfileType.CUSTOMER:
                 inline = [CustomerInline]
-            elif obj.profile_type is ProfileType.RESTAURANT:
+            elif obj.profile_type == ProfileType.RESTAURANT:
                 inline = [RestaurantInline]
             else:
                 inline = []
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = "apps.account"
+
+    def ready(self):
+        import apps.account.signals
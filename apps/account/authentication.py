@@ -0,0 +1,114 @@
+import time
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import ugettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# Cached users are invalidated on every change, the timeout only bounds how
+# long a user changed through `QuerySet.update` can be served.
+USER_CACHE_TIMEOUT = 60 * 5
+
+# Fields the views read from `request.user`, every other field is loaded from
+# the database on first access.
+USER_CACHE_FIELDS = (
+    "id",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "locale",
+    "profile_type",
+)
+
+
+def _version_key(user_id: int) -> str:
+    return f"account:user:version:{user_id}"
+
+
+def _new_version() -> int:
+    # Time based, so a version key evicted from the cache never comes back
+    # with the number of an older cached user.
+    return int(time.time() * 1000)
+
+
+def get_user_version(user_id: int) -> int:
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_cached_user(user_id: int):
+    """
+    Makes the next authenticated request of the user load it from the database.
+    """
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def get_cached_user(user_id: int) -> User:
+    """
+    Returns the user with only `USER_CACHE_FIELDS` loaded, without querying
+    the database while the cached copy is valid.
+    """
+    # `from_db` takes the values in the order of the model fields.
+    field_names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in USER_CACHE_FIELDS
+    ]
+
+    key = f"account:user:{user_id}:{get_user_version(user_id)}"
+    values = cache.get(key)
+    if values is None or values.keys() != set(field_names):
+        values = User.objects.values(*field_names).get(id=user_id)
+        cache.set(key, values, timeout=USER_CACHE_TIMEOUT)
+
+    # With the real alias, `save` only writes the loaded fields.
+    return User.from_db(
+        router.db_for_read(User), field_names, [values[name] for name in field_names]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication which resolves the user of the token from the cache.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = get_cached_user(user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+
+def authenticate_token(raw_token: str) -> Optional[User]:
+    """
+    Returns the active user of an access token, or None when the token is not
+    valid. Used where no Authorization header can be sent, e.g. websockets.
+    """
+    authentication = CachedJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
@@ -1,8 +1,10 @@
 from django.db import models
+from django.utils import timezone
 
+from apps.account.identity import get_cached_profiles
 from apps.account.models import User
 from apps.account.restaurant.models import Restaurant
-from apps.order.models import Order
+from apps.order.models import Order, OrderParticipant
 from .types import CustomerMiscType
 
 
@@ -11,6 +13,80 @@ class Customer(models.Model):
     qr_code = models.ImageField()
 
 
+def get_transition_fields(state: str, order=None) -> dict:
+    """
+    Fields a Misc gets when it moves to `state`. `order` is required to
+    move into `CustomerMiscType.IN_ORDER`.
+    """
+    if state == CustomerMiscType.IN_ORDER:
+        if order is None:
+            raise ValueError("An order is required to move into an order.")
+        return {
+            "last_order": order,
+            "last_order_in_checkout": False,
+            "last_order_in_rating": False,
+            "state": state,
+        }
+    elif state == CustomerMiscType.NO_ORDER:
+        return {
+            "last_order": None,
+            "last_order_in_checkout": False,
+            "last_order_in_rating": False,
+            "state": state,
+        }
+    elif state == CustomerMiscType.IN_CHECKOUT:
+        return {"last_order_in_checkout": True, "state": state}
+    elif state == CustomerMiscType.IN_RATING:
+        return {
+            "last_order_in_checkout": False,
+            "last_order_in_rating": True,
+            "state": state,
+        }
+    raise ValueError(f"Unknown state {state}.")
+
+
+class MiscQuerySet(models.QuerySet):
+    def for_order(self, order):
+        """
+        Misc of the participants of `order`, an order or its id.
+        """
+        return self.filter(
+            user__in=OrderParticipant.objects.filter(order=order).values("user")
+        )
+
+    def transition(self, state: str, order=None) -> int:
+        """
+        Moves every Misc of the queryset to `state` in one UPDATE. The Misc
+        of the active identity map are updated too, `get_profile` returns
+        them afterwards.
+        :return: the number of updated rows
+        """
+        fields = get_transition_fields(state, order)
+        fields["updated_at"] = timezone.now()
+
+        cached = get_cached_profiles("misc")
+        if cached:
+            cached_user_ids = list(
+                self.filter(user_id__in=list(cached)).values_list("user_id", flat=True)
+            )
+        else:
+            cached_user_ids = []
+
+        updated = self.update(**fields)
+        for user_id in cached_user_ids:
+            for name, value in fields.items():
+                setattr(cached[user_id], name, value)
+        return updated
+
+    def transition_order(self, order, state: str) -> int:
+        """
+        Moves the Misc of every participant of `order` to `state` in one UPDATE.
+        """
+        return self.for_order(order).transition(
+            state, order if state == CustomerMiscType.IN_ORDER else None
+        )
+
+
 class Misc(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     last_order = models.ForeignKey(
@@ -29,33 +105,10 @@ class Misc(models.Model):
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MiscQuerySet.as_manager()
+
     def last_restaurant(self) -> int:
         return self.last_order.restaurant.id if self.last_order else None
 
     def last_order_type(self) -> int:
         return self.last_order.order_type if self.last_order else None
-
-    def set_new_order(self, order: Order):
-        self.last_order = order
-        self.last_order_in_checkout = False
-        self.last_order_in_rating = False
-        self.state = CustomerMiscType.IN_ORDER
-        self.save()
-
-    def set_no_order(self):
-        self.last_order = None
-        self.last_order_in_checkout = False
-        self.last_order_in_rating = False
-        self.state = CustomerMiscType.NO_ORDER
-        self.save()
-
-    def set_order_in_checkout(self):
-        self.last_order_in_checkout = True
-        self.state = CustomerMiscType.IN_CHECKOUT
-        self.save()
-
-    def set_order_in_rating(self):
-        self.last_order_in_checkout = False
-        self.last_order_in_rating = True
-        self.state = CustomerMiscType.IN_RATING
-        self.save()
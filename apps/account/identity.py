@@ -0,0 +1,112 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from .models import User
+
+_local = threading.local()
+
+
+class IdentityMap:
+    """
+    Profiles (`customer`, `restaurant`, `misc`) resolved during one request,
+    keyed by relation name and user id. Every `User` instance of the same
+    user shares the same profile object.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+
+def get_identity_map() -> Optional[IdentityMap]:
+    return getattr(_local, "identity_map", None)
+
+
+@contextmanager
+def identity_map():
+    """
+    Activates a new identity map for the wrapped block, e.g. a request or a
+    task.
+    """
+    previous = get_identity_map()
+    _local.identity_map = IdentityMap()
+    try:
+        yield _local.identity_map
+    finally:
+        _local.identity_map = previous
+
+
+def get_cached_profiles(name: str) -> Dict[int, object]:
+    """
+    The `name` profiles of the active identity map, by user id.
+    """
+    current_map = get_identity_map()
+    if current_map is None:
+        return {}
+    return {
+        user_id: profile
+        for (profile_name, user_id), profile in current_map.objects.items()
+        if profile_name == name and profile is not None
+    }
+
+
+def load_profiles(users: Iterable[User], name: str) -> Dict[int, object]:
+    """
+    Resolves the `name` one to one relation of the users with at most one
+    query, and caches the result on each instance so `user.<name>` doesn't
+    query again.
+    :return: the profile of each user id, None for users without one
+    """
+    related = getattr(User, name).related
+    current_map = get_identity_map()
+    users = list(users)
+
+    profiles = {}
+    missing = set()
+    for user in users:
+        key = (name, user.id)
+        if user.id in profiles:
+            continue
+        if current_map is not None and key in current_map.objects:
+            current_map.hits += 1
+            profiles[user.id] = current_map.objects[key]
+        elif related.is_cached(user):
+            profiles[user.id] = related.get_cached_value(user)
+        else:
+            missing.add(user.id)
+
+    if missing:
+        found = {
+            getattr(profile, related.field.attname): profile
+            for profile in related.related_model.objects.filter(
+                **{f"{related.field.name}__in": missing}
+            )
+        }
+        for user_id in missing:
+            profiles[user_id] = found.get(user_id)
+
+    if current_map is not None:
+        current_map.misses += len(missing)
+        for user_id, profile in profiles.items():
+            current_map.objects[(name, user_id)] = profile
+
+    for user in users:
+        profile = profiles[user.id]
+        related.set_cached_value(user, profile)
+        if profile is not None and not related.field.is_cached(profile):
+            related.field.set_cached_value(profile, user)
+    return profiles
+
+
+def get_profile(user: User, name: str):
+    """
+    Returns `user.<name>`, shared with every other instance of the user in the
+    active identity map.
+    Raises `RelatedObjectDoesNotExist` like the attribute does.
+    """
+    profile = load_profiles([user], name)[user.id]
+    if profile is None:
+        raise getattr(User, name).RelatedObjectDoesNotExist(f"User has no {name}.")
+    return profile
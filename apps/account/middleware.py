@@ -0,0 +1,28 @@
+import logging
+
+from .identity import identity_map
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMapMiddleware:
+    """
+    Shares the profiles of users loaded through `apps.account.identity` for
+    the lifetime of a request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map() as profiles:
+            response = self.get_response(request)
+
+        logger.debug(
+            "%s %s: %d profile hits, %d profile misses",
+            request.method,
+            request.path,
+            profiles.hits,
+            profiles.misses,
+        )
+        return response
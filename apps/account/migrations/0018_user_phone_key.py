@@ -0,0 +1,32 @@
+# Generated by Django 2.2.12 on 2020-07-28 14:02
+
+from django.db import migrations, models
+
+
+def fill_phone_keys(apps, schema_editor):
+    User = apps.get_model("account", "User")
+
+    users = []
+    for user in User.objects.only("id", "phone_number").iterator():
+        digits = "".join(c for c in user.phone_number if c.isdigit())
+        user.phone_key = digits[-9:]
+        users.append(user)
+    User.objects.bulk_update(users, ["phone_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0017_user_name_in_ar"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="phone_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=9
+            ),
+        ),
+        migrations.RunPython(fill_phone_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.12 on 2020-07-29 11:26
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def fill_profile_types(apps, schema_editor):
+    User = apps.get_model("account", "User")
+
+    users = User.objects.filter(is_superuser=False, is_staff=False)
+    # Customers last, a user in both groups is a customer.
+    users.filter(groups__name="Restaurant").update(profile_type="Restaurant")
+    users.filter(groups__name="Customer").update(profile_type="Customer")
+    User.objects.filter(Q(is_superuser=True) | Q(is_staff=True)).update(
+        profile_type="Superuser"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+        ("account", "0018_user_phone_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_type",
+            field=models.CharField(
+                choices=[
+                    ("Superuser", "Superuser"),
+                    ("Customer", "Customer"),
+                    ("Restaurant", "Restaurant"),
+                    ("None", "None"),
+                ],
+                db_index=True,
+                default="None",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(fill_profile_types, migrations.RunPython.noop),
+    ]
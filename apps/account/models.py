@@ -17,6 +17,14 @@ _PHONE_REGEX = RegexValidator(
     regex=r"\d{10}", message=_("Phone number must be 10 digits."),
 )
 
+# Numbers are matched on their last digits, which are the same with and without
+# the country code or the leading 0.
+PHONE_KEY_LENGTH = 9
+
+
+def get_phone_key(phone_number: str) -> str:
+    return "".join(c for c in phone_number if c.isdigit())[-PHONE_KEY_LENGTH:]
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(
@@ -28,6 +36,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     phone_number = models.CharField(
         validators=[_PHONE_REGEX], max_length=17, unique=True
     )
+    phone_key = models.CharField(
+        max_length=PHONE_KEY_LENGTH, db_index=True, editable=False, blank=True
+    )
     phone_number_verified = models.BooleanField(
         default=False,
         db_index=True,
@@ -64,6 +75,16 @@ class User(AbstractBaseUser, PermissionsMixin):
         max_length=2, choices=settings.LANGUAGES, default=settings.USER_DEFAULT_LANGUAGE
     )
 
+    # Derived from the flags and groups of the user, kept up to date by
+    # `save` and `refresh_profile_types`.
+    profile_type = models.CharField(
+        max_length=20,
+        choices=ProfileType.CHOICES,
+        default=ProfileType.NONE,
+        db_index=True,
+        editable=False,
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     objects = CustomUserManager()
     USERNAME_FIELD = "phone_number"
@@ -73,6 +94,36 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "phone_number" in update_fields:
+                update_fields.add("phone_key")
+            if update_fields & {"is_superuser", "is_staff"}:
+                update_fields.add("profile_type")
+            kwargs["update_fields"] = update_fields
+
+        deferred_fields = self.get_deferred_fields()
+        if "phone_number" not in deferred_fields:
+            self.phone_key = get_phone_key(self.phone_number or "")
+
+        refresh_profile_type = False
+        if not deferred_fields & {"is_superuser", "is_staff", "profile_type"}:
+            if self.is_superuser or self.is_staff:
+                self.profile_type = ProfileType.SUPERUSER
+            elif self._state.adding:
+                # New users have no groups yet.
+                self.profile_type = ProfileType.NONE
+            elif self.profile_type == ProfileType.SUPERUSER:
+                refresh_profile_type = True
+
+        super().save(*args, **kwargs)
+
+        if refresh_profile_type:
+            User.refresh_profile_types([self.id])
+            self.refresh_from_db(fields=["profile_type"])
+
     def email_user(self, subject, message, from_email=None, **kwargs):
         """Send an email to this user if the user emial exists."""
         if self.email:
@@ -94,25 +145,39 @@ class User(AbstractBaseUser, PermissionsMixin):
         """
         Returns child profile if available, else None
         """
+        from .identity import get_profile
+
         if self.profile_type == ProfileType.CUSTOMER:
-            return self.customer
-        elif self.profile_type is ProfileType.RESTAURANT:
-            return self.restaurant
+            return get_profile(self, "customer")
+        elif self.profile_type == ProfileType.RESTAURANT:
+            return get_profile(self, "restaurant")
         else:
             return None
 
-    @property
-    def profile_type(self) -> str:
-        """ Returns users profile type by filtering groups """
-        if self.is_superuser or self.is_staff:
-            return ProfileType.SUPERUSER
-
-        if self.groups.filter(name="Customer").exists():
-            return ProfileType.CUSTOMER
-        elif self.groups.filter(name="Restaurant").exists():
-            return ProfileType.RESTAURANT
-        else:
-            return "None"
+    @classmethod
+    def refresh_profile_types(cls, user_ids):
+        """
+        Stores the profile type of the users, derived from their groups.
+        A user in both groups is a customer.
+        """
+        user_ids = set(user_ids)
+        groups = dict(
+            cls.groups.through.objects.filter(
+                user_id__in=user_ids,
+                group__name__in=[ProfileType.CUSTOMER, ProfileType.RESTAURANT],
+            )
+            .order_by("-group__name")
+            .values_list("user_id", "group__name")
+        )
+        profile_types = {}
+        for user_id in user_ids:
+            profile_types.setdefault(groups.get(user_id, ProfileType.NONE), []).append(
+                user_id
+            )
+
+        users = cls.objects.filter(is_superuser=False, is_staff=False)
+        for profile_type, ids in profile_types.items():
+            users.filter(id__in=ids).update(profile_type=profile_type)
 
     class Meta:
         verbose_name = _("User")
@@ -3,6 +3,8 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
 from apps.account.models import User
+from apps.account.types import ProfileType
+from .earnings import completed_order_count
 from .models import Category, Restaurant, RestaurantTable, Payable
 
 
@@ -11,7 +13,7 @@ class OnlyRestaurantInUserAdmin(admin.ModelAdmin):
         form = super(OnlyRestaurantInUserAdmin, self).get_form(request, obj, **kwargs)
         if obj is None:
             form.base_fields["user"].queryset = User.objects.filter(
-                groups__name="Restaurant", restaurant__is_public=True
+                profile_type=ProfileType.RESTAURANT, restaurant__is_public=True
             )
         else:
             form.base_fields["user"].queryset = User.objects.filter(id=obj.user.id)
@@ -116,6 +118,16 @@ class PayableAdmin(admin.ModelAdmin):
 
     date_hierarchy = "user__created_at"
     search_fields = ("user__name", "user__email", "user__phone_number")
+    list_select_related = ("user",)
+
+    def get_queryset(self, request):
+        # The other columns read the stored earnings, only the order count is
+        # computed.
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(completed_order_count=completed_order_count())
+        )
 
     def restaurant_inhouse_earning(self, obj: Restaurant):
         return obj.inhouse_earning
@@ -136,6 +148,7 @@ class PayableAdmin(admin.ModelAdmin):
         return obj.total_orders()
 
     get_total_orders.short_description = "Total Orders"
+    get_total_orders.admin_order_field = "completed_order_count"
 
     def get_total_order_amount(self, obj):
         return obj.total
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from apps.order.invoice.models import InvoiceItem, Transaction
+from apps.order.invoice.types import PaymentStatus
+from apps.order.models import Order
+from apps.order.types import OrderStatusType
+
+_AMOUNT_FIELD = DecimalField(max_digits=15, decimal_places=3)
+
+# Share of a transaction covered by the cut of its invoice.
+EARNING = ExpressionWrapper(
+    F("amount") / Value(Decimal(100)) * F("order__invoice__order_cut"),
+    output_field=_AMOUNT_FIELD,
+)
+
+
+def successful_transactions(order_type: int):
+    return Transaction.objects.filter(
+        transaction_status=PaymentStatus.SUCCESSFUL, order__order_type=order_type
+    )
+
+
+def completed_order_items():
+    return InvoiceItem.objects.filter(invoice__order__status=OrderStatusType.COMPLETED)
+
+
+def completed_orders():
+    return Order.objects.filter(status=OrderStatusType.COMPLETED)
+
+
+def get_earning(restaurant_user_id: int, order_type: int) -> Decimal:
+    """
+    Earning from the successful transactions of one order type, in one query.
+    """
+    total = (
+        successful_transactions(order_type)
+        .filter(order__restaurant_id=restaurant_user_id)
+        .aggregate(total=Sum(EARNING))["total"]
+    )
+    return total if total is not None else Decimal(0)
+
+
+def _per_restaurant(queryset, restaurant_field: str, total, output_field):
+    """
+    Correlated subquery computing `total` over the rows of `queryset` which
+    belong to the restaurant of the outer row.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{restaurant_field: OuterRef("user_id")})
+            .order_by()
+            .values(restaurant_field)
+            .annotate(total=total)
+            .values("total"),
+            output_field=output_field,
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def completed_order_count():
+    """
+    Number of completed orders of the restaurant, for a Restaurant queryset.
+    """
+    return _per_restaurant(
+        completed_orders(), "restaurant_id", Count("id"), IntegerField()
+    )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from apps.order.invoice.models import Invoice
+from ...models import DailyEarning
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily earnings of the restaurants from the invoices"
+
+    def handle(self, *args, **kwargs):
+        rows = (
+            Invoice.objects.filter(
+                app_earning__isnull=False,
+                restaurant_earning__isnull=False,
+                order__restaurant__restaurant__isnull=False,
+            )
+            .annotate(date=TruncDate("created_at"))
+            .order_by()
+            .values("order__restaurant__restaurant", "date", "order__order_type")
+            .annotate(
+                order_count=Count("id"),
+                app_earning_sum=Sum("app_earning"),
+                restaurant_earning_sum=Sum("restaurant_earning"),
+            )
+        )
+
+        daily_earnings = [
+            DailyEarning(
+                restaurant_id=row["order__restaurant__restaurant"],
+                date=row["date"],
+                order_type=row["order__order_type"],
+                order_count=row["order_count"],
+                total=row["app_earning_sum"] + row["restaurant_earning_sum"],
+                app_earning=row["app_earning_sum"],
+                restaurant_earning=row["restaurant_earning_sum"],
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            DailyEarning.objects.all().delete()
+            DailyEarning.objects.bulk_create(daily_earnings, batch_size=1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(daily_earnings)} daily earnings.")
+        )
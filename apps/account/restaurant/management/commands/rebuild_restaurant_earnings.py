@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Restaurant
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the earnings of the restaurants from the earning ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "restaurant_ids",
+            nargs="*",
+            type=int,
+            help="Ids of the restaurants, all restaurants by default.",
+        )
+
+    def handle(self, *args, **options):
+        Restaurant.rebuild_earnings(options["restaurant_ids"] or None)
+        self.stdout.write(self.style.SUCCESS("Rebuilt the restaurant earnings."))
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.12 on 2020-07-24 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0017_auto_20200720_1520"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyEarning",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(db_index=True)),
+                (
+                    "order_type",
+                    models.SmallIntegerField(choices=[(0, "Pick Up"), (1, "In House")]),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=3, default=0.0, max_digits=15),
+                ),
+                (
+                    "app_earning",
+                    models.DecimalField(decimal_places=3, default=0.0, max_digits=15),
+                ),
+                (
+                    "restaurant_earning",
+                    models.DecimalField(decimal_places=3, default=0.0, max_digits=15),
+                ),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_earnings",
+                        to="restaurant.Restaurant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("date", "order_type"),
+                "unique_together": {("restaurant", "date", "order_type")},
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.2.12 on 2020-07-27 09:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_ledger(apps, schema_editor):
+    Invoice = apps.get_model("invoice", "Invoice")
+    EarningEntry = apps.get_model("restaurant", "EarningEntry")
+
+    invoices = Invoice.objects.filter(
+        app_earning__isnull=False,
+        restaurant_earning__isnull=False,
+        order__restaurant__restaurant__isnull=False,
+    ).values(
+        "id",
+        "order__restaurant__restaurant",
+        "order__order_type",
+        "app_earning",
+        "restaurant_earning",
+    )
+    EarningEntry.objects.bulk_create(
+        [
+            EarningEntry(
+                restaurant_id=invoice["order__restaurant__restaurant"],
+                invoice_id=invoice["id"],
+                order_type=invoice["order__order_type"],
+                total=invoice["app_earning"] + invoice["restaurant_earning"],
+                app_earning=invoice["app_earning"],
+                restaurant_earning=invoice["restaurant_earning"],
+            )
+            for invoice in invoices.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoice", "0016_pendingearning"),
+        ("restaurant", "0018_dailyearning"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EarningEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "order_type",
+                    models.SmallIntegerField(choices=[(0, "Pick Up"), (1, "In House")]),
+                ),
+                ("total", models.DecimalField(decimal_places=3, max_digits=15)),
+                ("app_earning", models.DecimalField(decimal_places=3, max_digits=15)),
+                (
+                    "restaurant_earning",
+                    models.DecimalField(decimal_places=3, max_digits=15),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "invoice",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="earning_entry",
+                        to="invoice.Invoice",
+                    ),
+                ),
+                (
+                    "restaurant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="earning_entries",
+                        to="restaurant.Restaurant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Earning entries",
+                "ordering": ("-id",),
+            },
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -6,10 +6,9 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 from apps.account.models import User
-from apps.order.invoice.types import PaymentStatus
-from apps.order.types import OrderType, OrderStatusType
+from apps.order.types import OrderType
 from utils.file import RandomFileName
-from django.db.models import Sum
+from django.db.models import F, Sum
 
 
 class Category(models.Model):
@@ -76,66 +75,133 @@ class Restaurant(models.Model):
 
     total = models.DecimalField(max_digits=15, decimal_places=3, default=0.0)
 
+    EARNING_FIELDS = (
+        "pickup_earning",
+        "inhouse_earning",
+        "app_pickup_earning",
+        "app_inhouse_earning",
+        "total_earning",
+        "app_total_earning",
+        "total",
+    )
+
     def __str__(self):
         return f"{self.user} - {self.user.name}"
 
+    def save(self, *args, **kwargs):
+        # The earnings are only written by `add_earning` and
+        # `rebuild_earnings`, so saving a stale instance must not overwrite
+        # them.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.EARNING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def add_earning(
+        cls,
+        restaurant_id: int,
+        order_type: int,
+        total: Decimal,
+        app_earning: Decimal,
+        restaurant_earning: Decimal,
+    ):
+        """
+        Adds the earning of an order to the totals of the restaurant in one
+        UPDATE, so concurrent orders of the restaurant never lose an earning.
+        """
+        earnings = {
+            "total_earning": F("total_earning") + restaurant_earning,
+            "app_total_earning": F("app_total_earning") + app_earning,
+            "total": F("total") + total,
+        }
+        if order_type == OrderType.PICK_UP:
+            earnings["pickup_earning"] = F("pickup_earning") + restaurant_earning
+            earnings["app_pickup_earning"] = F("app_pickup_earning") + app_earning
+        elif order_type == OrderType.IN_HOUSE:
+            earnings["inhouse_earning"] = F("inhouse_earning") + restaurant_earning
+            earnings["app_inhouse_earning"] = F("app_inhouse_earning") + app_earning
+        cls.objects.filter(id=restaurant_id).update(**earnings)
+
+    @classmethod
+    def rebuild_earnings(cls, restaurant_ids=None):
+        """
+        Recomputes the earnings of the restaurants from their ledger entries.
+        """
+        restaurants = cls.objects.all()
+        if restaurant_ids is not None:
+            restaurants = restaurants.filter(id__in=restaurant_ids)
+
+        totals = {}
+        entries = EarningEntry.objects.filter(restaurant__in=restaurants)
+        for row in (
+            entries.order_by()
+            .values("restaurant", "order_type")
+            .annotate(
+                total=Sum("total"),
+                app_earning=Sum("app_earning"),
+                restaurant_earning=Sum("restaurant_earning"),
+            )
+        ):
+            totals.setdefault(row["restaurant"], []).append(row)
+
+        for restaurant_id in restaurants.values_list("id", flat=True):
+            earnings = dict.fromkeys(cls.EARNING_FIELDS, Decimal(0))
+            for row in totals.get(restaurant_id, []):
+                if row["order_type"] == OrderType.PICK_UP:
+                    earnings["pickup_earning"] += row["restaurant_earning"]
+                    earnings["app_pickup_earning"] += row["app_earning"]
+                elif row["order_type"] == OrderType.IN_HOUSE:
+                    earnings["inhouse_earning"] += row["restaurant_earning"]
+                    earnings["app_inhouse_earning"] += row["app_earning"]
+                earnings["total_earning"] += row["restaurant_earning"]
+                earnings["app_total_earning"] += row["app_earning"]
+                earnings["total"] += row["total"]
+            cls.objects.filter(id=restaurant_id).update(**earnings)
+
     def clean(self):
         if self.lat and self.lng:
             self.geolocation = Point(self.lng, self.lat, srid=4326)
 
     def rating(self):
-        from apps.order.models import Rating
+        from apps.order.models import RestaurantRatingSummary
 
-        rate = Rating.get_average_restaurant_rating(restaurant=self.user)
-        return rate
+        try:
+            return self.user.rating_summary.average_rating()
+        except RestaurantRatingSummary.DoesNotExist:
+            return Decimal(0.00)
 
     def total_orders(self) -> int:
-        from apps.order.models import Order
+        # Annotated with `earnings.completed_order_count` by the admin.
+        if hasattr(self, "completed_order_count"):
+            return self.completed_order_count
 
-        return Order.objects.filter(
-            restaurant=self.user, status=OrderStatusType.COMPLETED
-        ).count()
+        from .earnings import completed_orders
 
-    def get_total_order_amount(self):
-        from apps.order.invoice.models import InvoiceItem
+        return completed_orders().filter(restaurant=self.user_id).count()
 
-        items = InvoiceItem.objects.filter(
-            invoice__order__restaurant=self.user,
-            invoice__order__status=OrderStatusType.COMPLETED,
-        ).aggregate(Sum("amount"))
+    def get_total_order_amount(self) -> Decimal:
+        from .earnings import completed_order_items
 
-        amount = items["amount__sum"] if items is not None else Decimal(0.0)
-        return amount
+        amount = (
+            completed_order_items()
+            .filter(invoice__order__restaurant=self.user_id)
+            .aggregate(Sum("amount"))["amount__sum"]
+        )
+        return amount if amount is not None else Decimal(0.0)
 
     def get_inhouse_earning(self) -> Decimal:
-        from apps.order.invoice.models import Transaction
+        from .earnings import get_earning
 
-        total = Decimal(0)
-
-        transactions = Transaction.objects.filter(
-            order__restaurant=self.user,
-            transaction_status=PaymentStatus.SUCCESSFUL,
-            order__order_type=OrderType.IN_HOUSE,
-        )
-
-        for t in transactions:
-            total += (t.amount / Decimal(100)) * t.order.invoice.order_cut
-        return total
+        return get_earning(self.user_id, OrderType.IN_HOUSE)
 
     def get_pickup_earning(self) -> Decimal:
-        from apps.order.invoice.models import Transaction
-
-        total = Decimal(0)
+        from .earnings import get_earning
 
-        transactions = Transaction.objects.filter(
-            order__restaurant=self.user,
-            transaction_status=PaymentStatus.SUCCESSFUL,
-            order__order_type=OrderType.PICK_UP,
-        )
-
-        for t in transactions:
-            total += (t.amount / Decimal(100)) * t.order.invoice.order_cut
-        return total
+        return get_earning(self.user_id, OrderType.PICK_UP)
 
     def get_total_earning(self) -> Decimal:
         return self.get_inhouse_earning() + self.get_pickup_earning()
@@ -148,6 +214,80 @@ class Payable(Restaurant):
         verbose_name_plural = _("Restaurant Commissions and Earnings")
 
 
+class EarningEntry(models.Model):
+    """
+    Append-only ledger of the earnings of the restaurants, one entry per
+    invoice. The earning totals of `Restaurant` can be rebuilt from it.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="earning_entries"
+    )
+    invoice = models.OneToOneField(
+        "invoice.Invoice", on_delete=models.CASCADE, related_name="earning_entry"
+    )
+    order_type = models.SmallIntegerField(choices=OrderType.CHOICES)
+    total = models.DecimalField(max_digits=15, decimal_places=3)
+    app_earning = models.DecimalField(max_digits=15, decimal_places=3)
+    restaurant_earning = models.DecimalField(max_digits=15, decimal_places=3)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-id",)
+        verbose_name_plural = _("Earning entries")
+
+    def __str__(self):
+        return f"{self.restaurant} invoice {self.invoice_id}"
+
+
+class DailyEarning(models.Model):
+    """
+    Earnings of a restaurant per day and order type, added up when the
+    earning of an order is processed.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="daily_earnings"
+    )
+    date = models.DateField(db_index=True)
+    order_type = models.SmallIntegerField(choices=OrderType.CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=3, default=0.00)
+    app_earning = models.DecimalField(max_digits=15, decimal_places=3, default=0.00)
+    restaurant_earning = models.DecimalField(
+        max_digits=15, decimal_places=3, default=0.00
+    )
+
+    class Meta:
+        unique_together = ("restaurant", "date", "order_type")
+        ordering = ("date", "order_type")
+
+    def __str__(self):
+        return f"{self.restaurant} {self.date} {self.get_order_type_display()}"
+
+    @classmethod
+    def add_order(
+        cls,
+        restaurant: Restaurant,
+        date,
+        order_type: int,
+        total: Decimal,
+        app_earning: Decimal,
+        restaurant_earning: Decimal,
+    ):
+        cls.objects.get_or_create(
+            restaurant=restaurant, date=date, order_type=order_type
+        )
+        cls.objects.filter(
+            restaurant=restaurant, date=date, order_type=order_type
+        ).update(
+            order_count=F("order_count") + 1,
+            total=F("total") + total,
+            app_earning=F("app_earning") + app_earning,
+            restaurant_earning=F("restaurant_earning") + restaurant_earning,
+        )
+
+
 class RestaurantTable(models.Model):
     user = models.ForeignKey(User, db_index=True, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
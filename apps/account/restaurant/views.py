@@ -1,3 +1,4 @@
+import csv
 from decimal import Decimal
 
 from django.contrib.auth.decorators import login_required
@@ -6,6 +7,7 @@ from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
 from django.core.exceptions import PermissionDenied
 from django.db.models import Sum
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins
@@ -14,7 +16,12 @@ from rest_framework.viewsets import GenericViewSet, ReadOnlyModelViewSet, ModelV
 
 from apps.account.restaurant.filters import RestaurantTableFilter, RestaurantFilter
 from apps.account.restaurant.forms import PayableDetailsSearchForm
-from apps.account.restaurant.models import Restaurant, Category, RestaurantTable
+from apps.account.restaurant.models import (
+    Restaurant,
+    Category,
+    DailyEarning,
+    RestaurantTable,
+)
 from apps.account.restaurant.serializers import (
     CategorySerializer,
     RestaurantSerializer,
@@ -22,7 +29,6 @@ from apps.account.restaurant.serializers import (
     PublicRestaurantSerializer,
 )
 from apps.account.types import ProfileType
-from apps.order.invoice.models import Invoice
 from apps.order.types import OrderType
 from utils.permission import IsAuthenticatedOrCreateOnly, IsRestaurantOwnerOrReadOnly
 
@@ -55,6 +61,12 @@ class RestaurantViewSet(
     permission_classes = [IsAuthenticatedOrCreateOnly]
 
     def get_queryset(self):
+        # The serializers show the user, restaurant type and rating of each row.
+        return self.get_restaurants().select_related(
+            "user__rating_summary", "restaurant_type"
+        )
+
+    def get_restaurants(self):
         request = self.request
         if request.user.is_superuser:
             return Restaurant.objects.all()
@@ -149,62 +161,40 @@ def report_view(request, user_id: int):
             from_date = form.cleaned_data.get("from_date")
             to_date = form.cleaned_data.get("to_date")
 
-            inhouse = Invoice.objects.filter(
-                order__restaurant=restaurant.user,
-                order__payment_completed=True,
-                order__order_type=OrderType.IN_HOUSE,
-                created_at__date__gte=from_date,
-                created_at__date__lte=to_date,
-            ).aggregate(Sum("app_earning"), Sum("restaurant_earning"))
-
-            pickup = Invoice.objects.filter(
-                order__restaurant=restaurant.user,
-                order__payment_completed=True,
-                order__order_type=OrderType.PICK_UP,
-                created_at__date__gte=from_date,
-                created_at__date__lte=to_date,
-            ).aggregate(Sum("app_earning"), Sum("restaurant_earning"))
-
-            inhouse_app_earnings = (
-                inhouse["app_earning__sum"]
-                if inhouse["app_earning__sum"] is not None
-                else Decimal(0)
-            )
-            pickup_app_earnings = (
-                pickup["app_earning__sum"]
-                if pickup["app_earning__sum"] is not None
-                else Decimal(0)
+            earnings = DailyEarning.objects.filter(
+                restaurant=restaurant, date__gte=from_date, date__lte=to_date
             )
-
+            if "csv" in request.POST:
+                return daily_earnings_csv(restaurant, earnings)
+
+            totals = {
+                row["order_type"]: row
+                for row in earnings.order_by()
+                .values("order_type")
+                .annotate(
+                    order_count=Sum("order_count"),
+                    app_earning=Sum("app_earning"),
+                    restaurant_earning=Sum("restaurant_earning"),
+                )
+            }
+            empty = {
+                "order_count": 0,
+                "app_earning": Decimal(0),
+                "restaurant_earning": Decimal(0),
+            }
+            inhouse = totals.get(OrderType.IN_HOUSE, empty)
+            pickup = totals.get(OrderType.PICK_UP, empty)
+
+            inhouse_app_earnings = inhouse["app_earning"]
+            pickup_app_earnings = pickup["app_earning"]
             app_total = inhouse_app_earnings + pickup_app_earnings
 
-            inhouse_restaurant_earnings = (
-                inhouse["restaurant_earning__sum"]
-                if inhouse["restaurant_earning__sum"] is not None
-                else Decimal(0)
-            )
-            pickup_restaurant_earnings = (
-                pickup["restaurant_earning__sum"]
-                if pickup["restaurant_earning__sum"] is not None
-                else Decimal(0)
-            )
-
+            inhouse_restaurant_earnings = inhouse["restaurant_earning"]
+            pickup_restaurant_earnings = pickup["restaurant_earning"]
             restaurant_total = inhouse_restaurant_earnings + pickup_restaurant_earnings
 
-            pickup_count = Invoice.objects.filter(
-                order__restaurant=restaurant.user,
-                order__payment_completed=True,
-                order__order_type=OrderType.PICK_UP,
-                created_at__date__gte=from_date,
-                created_at__date__lte=to_date,
-            ).count()
-            inhouse_count = Invoice.objects.filter(
-                order__restaurant=restaurant.user,
-                order__payment_completed=True,
-                order__order_type=OrderType.IN_HOUSE,
-                created_at__date__gte=from_date,
-                created_at__date__lte=to_date,
-            ).count()
+            pickup_count = pickup["order_count"]
+            inhouse_count = inhouse["order_count"]
 
             return render(
                 request,
@@ -230,3 +220,26 @@ def report_view(request, user_id: int):
         "restaurant/report.html",
         {"restaurant": restaurant, "form": form, "get": True},
     )
+
+
+def daily_earnings_csv(restaurant: Restaurant, earnings) -> HttpResponse:
+    filename = f"report-{restaurant.user_id}.csv"
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    writer = csv.writer(response)
+    writer.writerow(
+        ["Date", "Order type", "Orders", "Total", "KOL earning", "Restaurant earning"]
+    )
+    for earning in earnings:
+        writer.writerow(
+            [
+                earning.date.isoformat(),
+                earning.get_order_type_display(),
+                earning.order_count,
+                earning.total,
+                earning.app_earning,
+                earning.restaurant_earning,
+            ]
+        )
+    return response
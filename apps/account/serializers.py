@@ -4,6 +4,7 @@ from django.utils import timezone
 from rest_framework import serializers
 from six import text_type
 
+from apps.account.identity import get_profile
 from apps.account.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import _PHONE_REGEX
@@ -113,11 +114,15 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         data["profile_type"] = self.user.profile_type
         if self.user.profile_type == ProfileType.CUSTOMER:
             try:
-                data["customer"] = {"qr_code": self.user.customer.qr_code.url}
+                data["customer"] = {
+                    "qr_code": get_profile(self.user, "customer").qr_code.url
+                }
             except ValueError:
                 pass
         elif self.user.profile_type == ProfileType.RESTAURANT:
-            data["restaurant"] = {"is_public": self.user.restaurant.is_public}
+            data["restaurant"] = {
+                "is_public": get_profile(self.user, "restaurant").is_public
+            }
 
         self.user.last_login = timezone.now()
         self.user.save()
@@ -0,0 +1,41 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Invalidated once committed, a request in between would cache the old
+    # row under the new version.
+    transaction.on_commit(partial(invalidate_cached_user, instance.id))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # The users of a cleared group are only known before the clear.
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list("id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        user_ids = [instance.id]
+    elif action == "post_clear":
+        user_ids = instance.__dict__.pop("_cleared_user_ids", [])
+    else:
+        user_ids = pk_set or []
+
+    User.refresh_profile_types(user_ids)
+    if not reverse:
+        instance.refresh_from_db(fields=["profile_type"])
+    for user_id in user_ids:
+        transaction.on_commit(partial(invalidate_cached_user, user_id))
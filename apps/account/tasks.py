@@ -1,3 +1,7 @@
+from celery.task import periodic_task
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.utils import flush_expired_tokens
+
 from apps.account.models import ForgotPasswordToken
 from conf.celery import app
 from .models import User
@@ -15,3 +19,10 @@ def send_password_change_alert(user_id: int):
         f"Your Kol password has been changed. "
         f"If you haven't made this change then please reset your password."
     )
+
+
+@periodic_task(run_every=timezone.timedelta(hours=1))
+def flush_expired_jwt_tokens():
+    # Bounded, so a large backlog is worked off over several runs instead of
+    # one long task.
+    flush_expired_tokens(batch_size=1000, sleep=0.1, max_batches=100)
@@ -0,0 +1,174 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from mixer.backend.django import mixer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apps.account.authentication import CachedJWTAuthentication
+from apps.account.customer.models import Misc
+from apps.account.identity import get_profile, identity_map, load_profiles
+from apps.account.models import User
+from apps.account.types import ProfileType
+from utils.testing import assert_max_queries
+
+pytestmark = pytest.mark.django_db
+
+
+class TestCachedJWTAuthentication:
+    @pytest.fixture
+    def user(self):
+        user = mixer.blend("account.User", is_active=True, is_staff=False)
+        user.groups.add(Group.objects.create(name="Customer"))
+        return user
+
+    def test_get_user(self, user):
+        authentication = CachedJWTAuthentication()
+        token = AccessToken.for_user(user)
+
+        authentication.get_user(token)
+        with assert_max_queries(0):
+            cached = authentication.get_user(token)
+            assert cached.id == user.id
+            assert cached.locale == user.locale
+            assert cached.profile_type == ProfileType.CUSTOMER
+
+        # Saving only writes the loaded fields, without loading the others.
+        cached.locale = "ar"
+        with assert_max_queries(1):
+            cached.save()
+        user.refresh_from_db()
+        assert user.locale == "ar"
+
+        # Fields which are not cached are loaded on access.
+        assert cached.name == user.name
+
+    @pytest.mark.django_db(transaction=True)
+    def test_invalidation(self, user):
+        authentication = CachedJWTAuthentication()
+        token = AccessToken.for_user(user)
+        authentication.get_user(token)
+
+        user.groups.clear()
+        assert authentication.get_user(token).profile_type == "None"
+
+        with transaction.atomic():
+            user.is_active = False
+            user.save()
+            # Requests keep the cached user until the change is committed.
+            assert authentication.get_user(token).is_active is True
+
+        with pytest.raises(AuthenticationFailed):
+            authentication.get_user(token)
+
+
+class TestTokenBlacklist:
+    def test_check_blacklist(self):
+        user = mixer.blend("account.User")
+        token = RefreshToken.for_user(user)
+        RefreshToken(str(token))
+
+        with assert_max_queries(0):
+            RefreshToken(str(token))
+
+        token.blacklist()
+        with pytest.raises(TokenError):
+            RefreshToken(str(token))
+
+    @pytest.mark.django_db(transaction=True)
+    def test_blacklist_on_commit(self):
+        user = mixer.blend("account.User")
+        token = RefreshToken.for_user(user)
+        key = f"token_blacklist:{token['jti']}"
+
+        with transaction.atomic():
+            token.blacklist()
+            assert cache.get(key) is None
+            # A lookup from another request does not see the row yet.
+            cache.set(key, False)
+
+        assert cache.get(key) is True
+        with pytest.raises(TokenError):
+            RefreshToken(str(token))
+
+    def test_flush_expired_tokens(self):
+        user = mixer.blend("account.User")
+        for _ in range(3):
+            RefreshToken.for_user(user).blacklist()
+        OutstandingToken.objects.update(expires_at=timezone.now())
+        RefreshToken.for_user(user)
+
+        call_command("flushexpiredtokens", batch_size=2, stdout=StringIO())
+
+        assert OutstandingToken.objects.count() == 1
+        assert BlacklistedToken.objects.count() == 0
+
+
+class TestProfileType:
+    def test_profile_type(self):
+        customer_group = Group.objects.create(name="Customer")
+        restaurant_group = Group.objects.create(name="Restaurant")
+        user = mixer.blend("account.User", is_staff=False, is_superuser=False)
+        assert user.profile_type == ProfileType.NONE
+
+        restaurant_group.user_set.add(user)
+        user.refresh_from_db()
+        assert user.profile_type == ProfileType.RESTAURANT
+
+        user.groups.add(customer_group)
+        assert user.profile_type == ProfileType.CUSTOMER
+
+        with assert_max_queries(0):
+            assert user.profile_type == ProfileType.CUSTOMER
+
+        user.is_staff = True
+        user.save()
+        assert user.profile_type == ProfileType.SUPERUSER
+        user.is_staff = False
+        user.save()
+        assert user.profile_type == ProfileType.CUSTOMER
+
+        user.groups.clear()
+        assert user.profile_type == ProfileType.NONE
+
+
+class TestIdentityMap:
+    def test_get_profile(self):
+        user = mixer.blend("account.User")
+        misc = Misc.objects.create(user=user)
+        other = mixer.blend("account.User")
+
+        with identity_map() as profiles:
+            assert get_profile(user, "misc") == misc
+            with assert_max_queries(0):
+                instance = User.objects.get(id=user.id)
+                assert get_profile(instance, "misc") is get_profile(user, "misc")
+                assert instance.misc is get_profile(user, "misc")
+
+            with pytest.raises(Misc.DoesNotExist):
+                get_profile(other, "misc")
+            with assert_max_queries(0), pytest.raises(Misc.DoesNotExist):
+                get_profile(other, "misc")
+
+        assert profiles.hits == 4
+        assert profiles.misses == 2
+
+    def test_load_profiles(self):
+        users = mixer.cycle(3).blend("account.User")
+        for user in users[:2]:
+            Misc.objects.create(user=user)
+
+        with assert_max_queries(1):
+            profiles = load_profiles(users, "misc")
+        assert profiles[users[2].id] is None
+        with assert_max_queries(0):
+            assert users[0].misc.user_id == users[0].id
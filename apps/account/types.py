@@ -2,6 +2,14 @@ from django.utils.translation import ugettext_lazy as _
 
 
 class ProfileType:
-    SUPERUSER = _("Superuser")
-    CUSTOMER = _("Customer")
-    RESTAURANT = _("Restaurant")
+    SUPERUSER = "Superuser"
+    CUSTOMER = "Customer"
+    RESTAURANT = "Restaurant"
+    NONE = "None"
+
+    CHOICES = (
+        (SUPERUSER, _("Superuser")),
+        (CUSTOMER, _("Customer")),
+        (RESTAURANT, _("Restaurant")),
+        (NONE, _("None")),
+    )
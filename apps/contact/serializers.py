@@ -15,6 +15,10 @@ class ContactUserSerializer(serializers.ModelSerializer):
 
 class ContactListSyncSerializer(serializers.Serializer):
     contacts = serializers.ListField(child=serializers.CharField())
+    removed = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list
+    )
+    contacts_hash = serializers.CharField(required=False, allow_blank=True)
 
 
 class ContactGroupSerializer(serializers.ModelSerializer):
@@ -0,0 +1,62 @@
+import hashlib
+from typing import Iterable, List, Optional, Set
+
+from django.core.cache import cache
+
+from apps.account.models import User, get_phone_key
+from apps.account.types import ProfileType
+
+# Keeps each lookup query small however many contacts a phone has.
+CONTACT_LOOKUP_CHUNK_SIZE = 500
+
+# How long the contact set of a user is kept for delta syncs.
+CONTACT_SYNC_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def get_phone_keys(phone_numbers: Iterable[str]) -> Set[str]:
+    return {get_phone_key(number) for number in phone_numbers} - {""}
+
+
+def get_contacts_hash(phone_keys: Set[str]) -> str:
+    return hashlib.sha1(",".join(sorted(phone_keys)).encode()).hexdigest()
+
+
+def find_contacts(phone_keys: Set[str]) -> List[User]:
+    """
+    Returns the customers with one of the phone keys.
+    """
+    phone_keys = sorted(phone_keys)
+    contacts = []
+    for i in range(0, len(phone_keys), CONTACT_LOOKUP_CHUNK_SIZE):
+        contacts.extend(
+            User.objects.filter(
+                profile_type=ProfileType.CUSTOMER,
+                phone_key__in=phone_keys[i : i + CONTACT_LOOKUP_CHUNK_SIZE],
+            ).order_by("id")
+        )
+    return contacts
+
+
+def _sync_key(user_id: int) -> str:
+    return f"contact:sync:{user_id}"
+
+
+def get_synced_phone_keys(user_id: int, contacts_hash: str) -> Optional[Set[str]]:
+    """
+    Returns the contact set of the last sync of the user when its hash is
+    `contacts_hash`.
+    """
+    synced = cache.get(_sync_key(user_id))
+    if synced is None or synced["hash"] != contacts_hash:
+        return None
+    return set(synced["phone_keys"])
+
+
+def save_synced_phone_keys(user_id: int, phone_keys: Set[str]) -> str:
+    contacts_hash = get_contacts_hash(phone_keys)
+    cache.set(
+        _sync_key(user_id),
+        {"hash": contacts_hash, "phone_keys": sorted(phone_keys)},
+        timeout=CONTACT_SYNC_TIMEOUT,
+    )
+    return contacts_hash
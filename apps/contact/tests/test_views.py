@@ -7,6 +7,7 @@ from rest_framework.test import force_authenticate, APIRequestFactory
 
 from apps.account.customer.models import Customer
 from apps.contact.models import ContactGroup
+from utils.testing import assert_max_queries
 from ..views import ContactListSyncApiView, ContactGroupViewSet
 
 pytestmark = pytest.mark.django_db
@@ -46,6 +47,46 @@ class TestSyncContacts:
         content = json.loads(response.content)
         assert len(content) == 9, "Should return 9 contacts"
 
+    def test_delta_sync_contacts(self, groups, customer):
+        contacts = mixer.cycle(3).blend(
+            "customer.Customer", user__phone_number=mixer.sequence("+96655000000{0}")
+        )
+        for contact in contacts:
+            contact.user.groups.add(groups)
+
+        factory = APIRequestFactory()
+        view = ContactListSyncApiView.as_view()
+
+        request = factory.post(
+            "/",
+            data={"contacts": ["0550000000", "0550000001"]},
+            format="json",
+        )
+        force_authenticate(request, customer.user)
+        response = view(request)
+        assert len(response.data) == 2, "Should match numbers without country code"
+
+        request = factory.post(
+            "/",
+            data={
+                "contacts": ["0550000002"],
+                "removed": ["0550000000"],
+                "contacts_hash": response["Contacts-Hash"],
+            },
+            format="json",
+        )
+        force_authenticate(request, customer.user)
+        response = view(request)
+        assert sorted(contact["id"] for contact in response.data) == sorted(
+            [contacts[1].user.id, contacts[2].user.id]
+        ), "Should apply the changes to the last synced contacts"
+
+        request = factory.post(
+            "/", data={"contacts": [], "contacts_hash": "unknown"}, format="json"
+        )
+        force_authenticate(request, customer.user)
+        assert view(request).status_code == status.HTTP_409_CONFLICT
+
 
 class TestGroupViewSet:
     @pytest.fixture
@@ -125,3 +166,40 @@ class TestGroupViewSet:
         ), "Should add the contact into group"
 
         assert contactGroup.contacts.count() == 1, "Should have a single contact"
+
+    def test_replace_group_contacts(self, customer, groups):
+        factory = APIRequestFactory()
+        contacts = mixer.cycle(3).blend("customer.Customer")
+        for contact in contacts:
+            contact.user.groups.add(groups)
+        contact_group: ContactGroup = mixer.blend(
+            "contact.ContactGroup", user=customer.user
+        )
+        contact_group.contacts.add(contacts[0].user, contacts[1].user)
+
+        request = factory.post(
+            "/", data={"ids": [contacts[1].user.id, contacts[2].user.id]}
+        )
+        force_authenticate(request, customer.user)
+        with assert_max_queries(8):
+            response = ContactGroupViewSet.as_view({"post": "contacts"})(
+                request, id=contact_group.id
+            )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert set(contact_group.contacts.values_list("id", flat=True)) == {
+            contacts[1].user.id,
+            contacts[2].user.id,
+        }
+
+        not_customer = mixer.blend("account.User")
+        request = factory.post(
+            "/", data={"ids": [contacts[0].user.id, not_customer.id]}
+        )
+        force_authenticate(request, customer.user)
+        response = ContactGroupViewSet.as_view({"post": "contacts"})(
+            request, id=contact_group.id
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert contact_group.contacts.count() == 2, "Should keep the contacts"
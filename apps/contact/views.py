@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.db import transaction
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
@@ -7,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from apps.account.models import User
+from apps.account.types import ProfileType
 from apps.contact.models import ContactGroup
 from .serializers import (
     ContactListSyncSerializer,
@@ -14,24 +16,50 @@ from .serializers import (
     ContactGroupSerializer,
     IdListSerializer,
 )
+from .sync import (
+    find_contacts,
+    get_phone_keys,
+    get_synced_phone_keys,
+    save_synced_phone_keys,
+)
 
 
 class ContactListSyncApiView(CreateAPIView):
+    """
+    Returns the Kol customers among the phone numbers in "contacts".
+    The response has a "Contacts-Hash" header. Later syncs can send it back as
+    "contacts_hash" along with only the numbers added to ("contacts") and
+    removed from ("removed") the contact list since. When the hash is not
+    known anymore the response is HTTP 409 and the full list must be sent.
+    """
+
     serializer_class = ContactListSyncSerializer
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            contact_list = serializer.validated_data.get("contacts")
-            contact_list = [
-                f"0{number[-9:]}" for number in contact_list
-            ]  # Check first 9 digits and add 0.
+            phone_keys = get_phone_keys(serializer.validated_data.get("contacts"))
+
+            contacts_hash = serializer.validated_data.get("contacts_hash")
+            if contacts_hash:
+                synced_phone_keys = get_synced_phone_keys(
+                    request.user.id, contacts_hash
+                )
+                if synced_phone_keys is None:
+                    return Response(
+                        {"contacts_hash": "Unknown hash, send the full contact list."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                removed = get_phone_keys(serializer.validated_data.get("removed"))
+                phone_keys = (synced_phone_keys - removed) | phone_keys
 
-            kole_contacts = User.objects.filter(
-                groups__name="Customer", phone_number__in=contact_list
-            )
+            kole_contacts = find_contacts(phone_keys)
             kole_contact_serializer = ContactUserSerializer(kole_contacts, many=True)
-            return Response(kole_contact_serializer.data, status=status.HTTP_200_OK)
+            response = Response(kole_contact_serializer.data, status=status.HTTP_200_OK)
+            response["Contacts-Hash"] = save_synced_phone_keys(
+                request.user.id, phone_keys
+            )
+            return response
 
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -78,21 +106,34 @@ class ContactGroupViewSet(ModelViewSet):
         serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid(raise_exception=True):
-            # Delete all contacts for new sync
-            group.contacts.clear()
-
-            contact_ids = serializer.validated_data.get("ids")
-            for contact_id in contact_ids:
-                try:
-                    user = User.objects.get(id=contact_id)
-                    if user.groups.filter(name="Customer").exists() is False:
-                        return Response(
-                            {"id": "User not found."}, status=status.HTTP_404_NOT_FOUND,
-                        )
-                except User.DoesNotExist:
-                    return Response(
-                        {"id": "User not found."}, status=status.HTTP_404_NOT_FOUND
+            contact_ids = set(serializer.validated_data.get("ids"))
+            customer_ids = set(
+                User.objects.filter(
+                    id__in=contact_ids, profile_type=ProfileType.CUSTOMER
+                ).values_list("id", flat=True)
+            )
+            if customer_ids != contact_ids:
+                return Response(
+                    {"id": "User not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Replace the contacts of the group, only writing the difference.
+            Membership = ContactGroup.contacts.through
+            with transaction.atomic():
+                # Concurrent replacements of the group wait for each other.
+                ContactGroup.objects.select_for_update().get(pk=group.pk)
+                current_ids = set(
+                    Membership.objects.filter(contactgroup=group).values_list(
+                        "user_id", flat=True
                     )
-                if group.contacts.filter(id=user.id).exists() is False:
-                    group.contacts.add(user)
+                )
+                Membership.objects.filter(
+                    contactgroup=group, user_id__in=current_ids - contact_ids
+                ).delete()
+                Membership.objects.bulk_create(
+                    [
+                        Membership(contactgroup=group, user_id=user_id)
+                        for user_id in contact_ids - current_ids
+                    ]
+                )
             return Response({"success": True}, status.HTTP_201_CREATED)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FoodConfig(AppConfig):
     name = "apps.food"
+
+    def ready(self):
+        import apps.food.signals
@@ -0,0 +1,93 @@
+import time
+from typing import List, NamedTuple
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import FoodAttribute, FoodItem
+from .serializers import FoodItemSerializer
+
+# Snapshots are replaced on every change of the menu or of the restaurant
+# profile, the timeout only bounds how long an unused snapshot is kept.
+MENU_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+class MenuSnapshot(NamedTuple):
+    etag: str
+    items: List[dict]
+
+
+def _version_key(restaurant_id: int) -> str:
+    return f"food:menu:version:{restaurant_id}"
+
+
+def _new_version() -> int:
+    # Time based, so a version key evicted from the cache never comes back
+    # with the number of an older snapshot.
+    return int(time.time() * 1000)
+
+
+def get_menu_version(restaurant_id: int) -> int:
+    key = _version_key(restaurant_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_menu_version(restaurant_id: int):
+    """
+    Invalidates every cached menu snapshot of the restaurant.
+    """
+    if restaurant_id is None:
+        return
+    key = _version_key(restaurant_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def prefetch_menu_items(queryset):
+    """
+    Loads everything FoodItemSerializer walks for the items.
+    """
+    return queryset.select_related("user", "category").prefetch_related(
+        "addons",
+        Prefetch(
+            "attributes",
+            queryset=FoodAttribute.objects.prefetch_related("attribute_matrix"),
+        ),
+    )
+
+
+def get_menu_snapshot(restaurant_id: int, locale: str, context: dict) -> MenuSnapshot:
+    """
+    Returns the serialized menu of the restaurant, serializing it only when
+    the menu has changed since the last snapshot.
+    Picture urls are built from the request, so snapshots are kept per host.
+    """
+    request = context.get("request")
+    host = request.get_host() if request is not None else ""
+    version = get_menu_version(restaurant_id)
+    key = f"food:menu:{restaurant_id}:{locale}:{host}:{version}"
+    etag = f'"menu-{restaurant_id}-{locale}-{version}"'
+
+    items = cache.get(key)
+    if items is None:
+        serializer = FoodItemSerializer(
+            prefetch_menu_items(
+                FoodItem.objects.filter(
+                    user_id=restaurant_id,
+                    is_active=True,
+                    is_deleted=False,
+                    category__is_deleted=False,
+                )
+            ),
+            many=True,
+            context=context,
+        )
+        items = list(serializer.data)
+        cache.set(key, items, timeout=MENU_SNAPSHOT_TIMEOUT)
+    return MenuSnapshot(etag, items)
@@ -45,11 +45,17 @@ class FoodItem(models.Model):
     def __str__(self):
         return f"{self.name} by {self.user.name}"
 
+    # The *_display helpers filter in python so they can use prefetched
+    # `addons`, `attributes` and `attribute_matrix`.
     def addons_display(self):
-        return FoodAddOn.objects.filter(food=self, is_deleted=False)
+        return [addon for addon in self.addons.all() if addon.is_deleted is False]
 
     def attributes_display(self):
-        return FoodAttribute.objects.filter(food=self, is_deleted=False)
+        return [
+            attribute
+            for attribute in self.attributes.all()
+            if attribute.is_deleted is False
+        ]
 
     class Meta:
         ordering = ("-created_at",)
@@ -72,7 +78,11 @@ class FoodAttribute(models.Model):
         return f"{self.name}"
 
     def attribute_matrix_display(self):
-        return FoodAttributeMatrix.objects.filter(attribute=self, is_deleted=False)
+        return [
+            matrix
+            for matrix in self.attribute_matrix.all()
+            if matrix.is_deleted is False
+        ]
 
 
 class FoodAttributeMatrix(models.Model):
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.account.models import User
+from apps.account.restaurant.models import Restaurant
+from apps.account.types import ProfileType
+from .menu import bump_menu_version
+from .models import (
+    FoodAddOn,
+    FoodAttribute,
+    FoodAttributeMatrix,
+    FoodCategory,
+    FoodItem,
+)
+
+
+def get_restaurant_id(food_id: int):
+    return FoodItem.objects.filter(id=food_id).values_list("user_id", flat=True).first()
+
+
+@receiver(post_save, sender=FoodCategory)
+@receiver(post_delete, sender=FoodCategory)
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def menu_owner_changed(sender, instance, **kwargs):
+    bump_menu_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def menu_restaurant_user_changed(sender, instance: User, **kwargs):
+    # Menu items embed the public profile of the restaurant user.
+    if instance.profile_type == ProfileType.RESTAURANT:
+        bump_menu_version(instance.id)
+
+
+@receiver(post_save, sender=Restaurant)
+def menu_restaurant_changed(sender, instance: Restaurant, **kwargs):
+    bump_menu_version(instance.user_id)
+
+
+@receiver(post_save, sender=FoodAddOn)
+@receiver(post_delete, sender=FoodAddOn)
+@receiver(post_save, sender=FoodAttribute)
+@receiver(post_delete, sender=FoodAttribute)
+def menu_item_changed(sender, instance, **kwargs):
+    bump_menu_version(get_restaurant_id(instance.food_id))
+
+
+@receiver(post_save, sender=FoodAttributeMatrix)
+@receiver(post_delete, sender=FoodAttributeMatrix)
+def menu_attribute_changed(sender, instance, **kwargs):
+    restaurant_id = (
+        FoodAttribute.objects.filter(id=instance.attribute_id)
+        .values_list("food__user_id", flat=True)
+        .first()
+    )
+    bump_menu_version(restaurant_id)
@@ -331,3 +331,56 @@ class TestFoodItemAddOnViewSet:
         assert (
             response.status_code == status.HTTP_403_FORBIDDEN
         ), "Should not destroy add on"
+
+    def test_menu_snapshot(self, restaurant1, category):
+        customer = mixer.blend("customer.Customer")
+        customer.user.groups.add(mixer.blend("auth.Group", name="Customer"))
+        item = mixer.blend(
+            "food.FoodItem", user=restaurant1.user, category=category, is_active=True
+        )
+        mixer.blend("food.FoodAddOn", food=item)
+
+        factory = APIRequestFactory()
+        request = factory.get("/", data={"user": restaurant1.user.id})
+        force_authenticate(request, customer.user)
+        response = FoodItemViewSet.as_view({"get": "list"})(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == 1, "Should list the restaurant menu"
+        etag = response["ETag"]
+
+        request = factory.get(
+            "/", data={"user": restaurant1.user.id}, HTTP_IF_NONE_MATCH=etag
+        )
+        force_authenticate(request, customer.user)
+        response = FoodItemViewSet.as_view({"get": "list"})(request)
+        assert (
+            response.status_code == status.HTTP_304_NOT_MODIFIED
+        ), "Should not send an unchanged menu"
+
+        item.name = "Meaw Burger"
+        item.save()
+
+        request = factory.get(
+            "/", data={"user": restaurant1.user.id}, HTTP_IF_NONE_MATCH=etag
+        )
+        force_authenticate(request, customer.user)
+        response = FoodItemViewSet.as_view({"get": "list"})(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.data["results"][0]["name"] == "Meaw Burger"
+        ), "Should rebuild the menu"
+        assert response["ETag"] != etag
+        etag = response["ETag"]
+
+        restaurant1.user.name = "Meaw"
+        restaurant1.user.save()
+
+        request = factory.get(
+            "/", data={"user": restaurant1.user.id}, HTTP_IF_NONE_MATCH=etag
+        )
+        force_authenticate(request, customer.user)
+        response = FoodItemViewSet.as_view({"get": "list"})(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.data["results"][0]["user"]["name"] == "Meaw"
+        ), "Should rebuild the menu when the restaurant profile changes"
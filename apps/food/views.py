@@ -1,5 +1,7 @@
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from apps.account.types import ProfileType
@@ -10,6 +12,7 @@ from .filters import (
     FoodAttributeFilter,
     FoodCategoryFilter,
 )
+from .menu import get_menu_snapshot, prefetch_menu_items
 from .models import (
     FoodCategory,
     FoodItem,
@@ -57,14 +60,54 @@ class FoodItemViewSet(ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.profile_type == ProfileType.RESTAURANT:
-            return FoodItem.objects.filter(is_deleted=False)
-        return FoodItem.objects.filter(
-            is_active=True, is_deleted=False, category__is_deleted=False
-        )
+            queryset = FoodItem.objects.filter(is_deleted=False)
+        else:
+            queryset = FoodItem.objects.filter(
+                is_active=True, is_deleted=False, category__is_deleted=False
+            )
+        return prefetch_menu_items(queryset)
 
     filter_backends = [DjangoFilterBackend]
     filterset_class = FoodItemFilter
 
+    # Query params a menu snapshot can answer, anything else goes to the db.
+    MENU_QUERY_PARAMS = {"user", "category", "limit", "offset"}
+
+    def list(self, request, *args, **kwargs):
+        """
+        Customers reading the menu of a restaurant (`?user=<restaurant id>`) are
+        served from the cached menu snapshot. The response has an ETag, send it
+        back with If-None-Match to get a 304 when the menu hasn't changed.
+        """
+        restaurant_id = request.query_params.get("user", "")
+        if (
+            request.user.profile_type == ProfileType.RESTAURANT
+            or restaurant_id.isdigit() is False
+            or set(request.query_params) - self.MENU_QUERY_PARAMS
+        ):
+            return super().list(request, *args, **kwargs)
+
+        snapshot = get_menu_snapshot(
+            int(restaurant_id), request.user.locale, self.get_serializer_context()
+        )
+        if request.META.get("HTTP_IF_NONE_MATCH") == snapshot.etag:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": snapshot.etag}
+            )
+
+        items = snapshot.items
+        category = request.query_params.get("category")
+        if category:
+            items = [item for item in items if str(item["category"]) == category]
+
+        page = self.paginate_queryset(items)
+        if page is not None:
+            response = self.get_paginated_response(page)
+        else:
+            response = Response(items)
+        response["ETag"] = snapshot.etag
+        return response
+
     def perform_create(self, serializer):
         user = self.request.user
         serializer.save(user=user)
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from django.conf import settings
+from django.utils import translation
+
+from apps.account.models import User
+from utils.fcm import PushMessage
+
+
+@lru_cache(maxsize=None)
+def translate(msgid: str, locale: str) -> str:
+    """
+    Returns the catalog string of `msgid` in `locale`. Catalogs do not change
+    while the process runs, so each lookup is only done once.
+    """
+    with translation.override(locale):
+        return translation.ugettext(msgid)
+
+
+def render(msgid: str, locale: str, **context) -> str:
+    return translate(msgid, locale).format(**context)
+
+
+def group_by_locale(users: Iterable[User]) -> Dict[str, List[User]]:
+    groups = {}
+    for user in users:
+        groups.setdefault(user.locale or settings.USER_DEFAULT_LANGUAGE, []).append(
+            user
+        )
+    return groups
+
+
+class PushTemplate(NamedTuple):
+    """
+    Title and body of a push notification. Both are msgids which may contain
+    `str.format` placeholders, e.g. "{joined_user} has joined the order".
+    """
+
+    title: str
+    body: str
+
+    def render(self, locale: str, **context) -> Tuple[str, str]:
+        title = render(self.title, locale, **context)
+        body = render(self.body, locale, **context)
+        return title, body
+
+    def build_messages(
+        self, users: Iterable[User], data: dict, **context
+    ) -> List[PushMessage]:
+        """
+        Renders the notification once per locale of the users, adding the
+        rendered title and body to a copy of `data`.
+        """
+        messages = []
+        for locale, locale_users in group_by_locale(users).items():
+            title, body = self.render(locale, **context)
+            locale_data = dict(data, title=title, body=body)
+            for user in locale_users:
+                messages.append(PushMessage(user, title, body, locale_data))
+        return messages
+
+
+class ActionTemplate(NamedTuple):
+    """
+    English and Arabic message of a notification `Action`.
+    """
+
+    message: str
+    message_in_ar: str
+
+    def render(self, **context) -> Dict[str, str]:
+        return {
+            "message": self.message.format(**context),
+            "message_in_ar": self.message_in_ar.format(**context),
+        }
@@ -12,6 +12,7 @@ from .models import (
     OrderItemInvite,
     Rating,
 )
+from .pricing import annotate_item_prices
 from .types import OrderStatusType
 
 
@@ -25,6 +26,7 @@ class OrderAdmin(admin.ModelAdmin):
         "created_by",
         "confirmed",
         "accepted",
+        "total",
         "invoice_link",
         "table",
         "created_at",
@@ -114,8 +116,12 @@ class OrderItemAdmin(admin.ModelAdmin):
         "shared_total_tax",
     )
     list_display_links = ("id", "order")
+    list_select_related = ("order",)
     inlines = [OrderItemAddOnInline, OrderItemMatrixInline]
 
+    def get_queryset(self, request):
+        return annotate_item_prices(super(OrderItemAdmin, self).get_queryset(request))
+
     def has_add_permission(self, request):
         return False
 
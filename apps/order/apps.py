@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 
 class OrderConfig(AppConfig):
-    name = "order"
+    name = "apps.order"
+
+    def ready(self):
+        import apps.order.signals
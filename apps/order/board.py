@@ -0,0 +1,159 @@
+import time
+from functools import partial
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Order
+from .room import send_to_group
+from .types import OrderStatusType
+
+# Deltas replayed to a reconnecting client, past that it gets a snapshot.
+BOARD_MAX_DELTAS = 200
+BOARD_DELTA_TIMEOUT = 60 * 60
+BOARD_SNAPSHOT_TIMEOUT = 60
+
+BOARD_EXCLUDED_STATUSES = (OrderStatusType.CANCELED, OrderStatusType.COMPLETED)
+
+
+def get_board_name(restaurant_id: int) -> str:
+    return f"restaurant_board_{restaurant_id}"
+
+
+def board_orders(restaurant_id: int):
+    """
+    Orders the restaurant has to work on.
+    """
+    return Order.objects.filter(restaurant_id=restaurant_id, confirmed=True).exclude(
+        status__in=BOARD_EXCLUDED_STATUSES
+    )
+
+
+def is_on_board(order: Order) -> bool:
+    return order.confirmed is True and order.status not in BOARD_EXCLUDED_STATUSES
+
+
+def get_order_summary(order: Order) -> dict:
+    return {
+        "id": order.id,
+        "order_type": order.order_type,
+        "table": order.table_id,
+        "table_name": order.table_name,
+        "status": order.status,
+        "confirmed": order.confirmed,
+        "has_restaurant_accepted": order.has_restaurant_accepted,
+        "payment_completed": order.payment_completed,
+        "total": str(order.total),
+        "created_at": order.created_at.isoformat(),
+    }
+
+
+def _cursor_key(restaurant_id: int) -> str:
+    return f"order:board:{restaurant_id}:cursor"
+
+
+def _delta_key(restaurant_id: int, cursor: int) -> str:
+    return f"order:board:{restaurant_id}:delta:{cursor}"
+
+
+def _initial_cursor() -> int:
+    # Time based, so a cursor evicted from the cache never comes back lower
+    # than one a client has seen.
+    return int(time.time() * 1000)
+
+
+def get_cursor(restaurant_id: int) -> int:
+    key = _cursor_key(restaurant_id)
+    cursor = cache.get(key)
+    if cursor is None:
+        cache.add(key, _initial_cursor(), timeout=None)
+        cursor = cache.get(key)
+    return cursor
+
+
+def _next_cursor(restaurant_id: int) -> int:
+    key = _cursor_key(restaurant_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_cursor(), timeout=None)
+        return cache.incr(key)
+
+
+def parse_cursor(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_snapshot(restaurant_id: int, cursor: int) -> list:
+    """
+    Summaries of every order on the board, including at least the changes up
+    to `cursor`. Cached per cursor, every device of the restaurant reconnecting
+    at the same time shares one query.
+    """
+    key = f"order:board:{restaurant_id}:snapshot:{cursor}"
+    orders = cache.get(key)
+    if orders is None:
+        orders = [
+            get_order_summary(order)
+            for order in board_orders(restaurant_id)
+            .select_related("table")
+            .order_by("id")
+        ]
+        cache.set(key, orders, timeout=BOARD_SNAPSHOT_TIMEOUT)
+    return orders
+
+
+def get_board(restaurant_id: int, cursor: Optional[int] = None) -> dict:
+    """
+    Brings a client at `cursor` up to date: the deltas after it when they
+    are all still cached, else a snapshot of the board.
+    """
+    current = get_cursor(restaurant_id)
+    if cursor is not None and 0 <= current - cursor <= BOARD_MAX_DELTAS:
+        keys = [_delta_key(restaurant_id, c) for c in range(cursor + 1, current + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) == len(keys):
+            return {
+                "type": "deltas",
+                "cursor": current,
+                "deltas": [deltas[key] for key in keys],
+            }
+
+    return {
+        "type": "snapshot",
+        "cursor": current,
+        "orders": get_snapshot(restaurant_id, current),
+    }
+
+
+def record_board_change(order_id: int):
+    """
+    Records the current state of the order as the next delta of its
+    restaurant's board, and pushes it to the connected clients.
+    """
+    order = Order.objects.select_related("table").filter(id=order_id).first()
+    if order is None or order.restaurant_id is None or order.confirmed is not True:
+        return
+
+    cursor = _next_cursor(order.restaurant_id)
+    if is_on_board(order):
+        delta = {"cursor": cursor, "order": get_order_summary(order)}
+    else:
+        delta = {"cursor": cursor, "removed": order.id}
+    cache.set(
+        _delta_key(order.restaurant_id, cursor), delta, timeout=BOARD_DELTA_TIMEOUT
+    )
+    send_to_group(get_board_name(order.restaurant_id), {"type": "delta", **delta})
+
+
+def broadcast_board_change(order: Order):
+    """
+    Records the order on its restaurant's board once the current transaction
+    commits. Orders which were never confirmed never reach the board.
+    """
+    if order.confirmed is True:
+        transaction.on_commit(partial(record_board_change, order.id))
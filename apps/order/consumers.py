@@ -0,0 +1,123 @@
+from urllib.parse import parse_qs
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+
+from apps.account.authentication import authenticate_token
+from apps.account.types import ProfileType
+from .board import get_board, get_board_name, parse_cursor
+from .room import (
+    build_changes,
+    can_join_room,
+    get_member_name,
+    get_room_name,
+    mark_connected,
+    mark_disconnected,
+)
+
+
+class OrderConsumer(JsonWebsocketConsumer):
+    """
+    Room of an order. Participants and the restaurant of the order receive a
+    `sync` message with the whole order when they connect, then a `changes`
+    message for every committed change, see `apps.order.room`.
+
+    Clients authenticate with an access token in the `token` query parameter
+    and send `{"type": "ping"}` at least every `ROOM_PRESENCE_TIMEOUT`
+    seconds, push notifications are skipped while they are connected.
+    Participants removed from the order are disconnected.
+    """
+
+    def get_group_names(self):
+        return [
+            get_room_name(self.order_id),
+            get_member_name(self.order_id, self.user.id),
+        ]
+
+    def connect(self):
+        self.order_id = self.scope["url_route"]["kwargs"]["order_id"]
+        self.user = None
+
+        token = parse_qs(self.scope["query_string"].decode()).get("token")
+        user = authenticate_token(token[0]) if token else None
+        if user is None or not can_join_room(self.order_id, user):
+            self.close()
+            return
+
+        self.user = user
+        for group_name in self.get_group_names():
+            async_to_sync(self.channel_layer.group_add)(group_name, self.channel_name)
+        self.accept()
+        mark_connected(self.order_id, self.user.id, self.channel_name)
+        self.send_json(
+            build_changes(
+                self.order_id,
+                item_ids=None,
+                participant_ids=None,
+                order=True,
+                message_type="sync",
+            )
+        )
+
+    def disconnect(self, code):
+        if self.user is None:
+            return
+        for group_name in self.get_group_names():
+            async_to_sync(self.channel_layer.group_discard)(
+                group_name, self.channel_name
+            )
+        mark_disconnected(self.order_id, self.user.id, self.channel_name)
+
+    def receive_json(self, content, **kwargs):
+        if content.get("type") == "ping":
+            mark_connected(self.order_id, self.user.id, self.channel_name)
+            self.send_json({"type": "pong"})
+
+    def group_message(self, event):
+        self.send_json(event["message"])
+
+    def room_leave(self, event):
+        if not can_join_room(self.order_id, self.user):
+            self.close()
+
+
+class RestaurantBoardConsumer(JsonWebsocketConsumer):
+    """
+    Live board of the open orders of a restaurant, see `apps.order.board`.
+
+    Restaurants authenticate with an access token in the `token` query
+    parameter, and pass the `cursor` of the last message they received when
+    reconnecting. They first receive the deltas they missed, or a snapshot
+    when those are gone, then a `delta` message for every change.
+    Deltas carry their cursor, clients ignore the ones they already applied.
+    """
+
+    def connect(self):
+        self.restaurant_id = None
+
+        query = parse_qs(self.scope["query_string"].decode())
+        token = query.get("token")
+        user = authenticate_token(token[0]) if token else None
+        if user is None or user.profile_type != ProfileType.RESTAURANT:
+            self.close()
+            return
+
+        self.restaurant_id = user.id
+        # Joined before reading the board, so no delta is missed in between.
+        async_to_sync(self.channel_layer.group_add)(
+            get_board_name(self.restaurant_id), self.channel_name
+        )
+        self.accept()
+        self.send_json(
+            get_board(self.restaurant_id, parse_cursor(query.get("cursor", [""])[0]))
+        )
+
+    def disconnect(self, code):
+        if self.restaurant_id is None:
+            return
+        async_to_sync(self.channel_layer.group_discard)(
+            get_board_name(self.restaurant_id), self.channel_name
+        )
+
+    def group_message(self, event):
+        self.send_json(event["message"])
@@ -0,0 +1,104 @@
+from typing import Tuple
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.order.models import Order
+from .models import CaptureAttempt, Transaction
+from .paytabs import get_client
+from .types import PaymentStatus
+
+# Attempts after which a transaction PayTabs could not be reached for is
+# given up on.
+MAX_CAPTURE_ATTEMPTS = 3
+
+# Seconds after which the claim of a capture which never recorded its outcome,
+# e.g. because its worker died, is released. Longer than the PayTabs calls
+# with their retries can take.
+CAPTURE_CLAIM_TIMEOUT = 60 * 5
+
+
+def start_capture(order: Order) -> int:
+    """
+    Marks the authorized transactions of the order to be captured.
+    :return: the number of transactions to capture
+    """
+    return Transaction.objects.filter(
+        order=order, transaction_status=PaymentStatus.AUTHORIZED
+    ).update(transaction_status=PaymentStatus.CAPTURING)
+
+
+def capture_order_transactions(order_id: int) -> Tuple[int, int]:
+    """
+    Captures the CAPTURING transactions of the order, recording an attempt for
+    each call to PayTabs. Captured transactions become SUCCESSFUL, declined
+    ones FAILED. Transactions PayTabs could not be reached for stay CAPTURING
+    until they run out of attempts.
+
+    The transactions are claimed with an unfinished attempt in a short
+    transaction, PayTabs is called outside of it, so no lock is held during
+    the calls. Transactions claimed by another capture are skipped.
+    :return: the number of processed transactions and of transactions which
+    still have to be captured
+    """
+    in_flight = CaptureAttempt.objects.filter(
+        finished_at=None,
+        created_at__gte=timezone.now()
+        - timezone.timedelta(seconds=CAPTURE_CLAIM_TIMEOUT),
+    ).values("transaction_id")
+
+    with transaction.atomic():
+        transactions = list(
+            Transaction.objects.select_for_update(skip_locked=True)
+            .filter(order_id=order_id, transaction_status=PaymentStatus.CAPTURING)
+            .exclude(id__in=in_flight)
+        )
+        attempts = dict(
+            CaptureAttempt.objects.filter(transaction__in=transactions)
+            .order_by()
+            .values_list("transaction")
+            .annotate(Count("id"))
+        )
+
+        to_capture = []
+        for t in transactions:
+            if attempts.get(t.id, 0) < MAX_CAPTURE_ATTEMPTS:
+                to_capture.append(t)
+            else:
+                t.transaction_status = PaymentStatus.FAILED
+                t.save(update_fields=["transaction_status"])
+        claims = CaptureAttempt.objects.bulk_create(
+            CaptureAttempt(transaction=t) for t in to_capture
+        )
+
+    results = get_client().capture_many(
+        (t.pt_transaction_id, t.amount) for t in to_capture
+    )
+
+    finished_at = timezone.now()
+    with transaction.atomic():
+        for attempt, result in zip(claims, results):
+            attempt.successful = result.ok
+            attempt.response_code = result.response_code
+            attempt.result = result.result[:255]
+            attempt.error = result.error
+            attempt.finished_at = finished_at
+        CaptureAttempt.objects.bulk_update(
+            claims, ["successful", "response_code", "result", "error", "finished_at"]
+        )
+        for t, result in zip(to_capture, results):
+            if result.ok:
+                status = PaymentStatus.SUCCESSFUL
+            elif result.error is None:
+                status = PaymentStatus.FAILED
+            else:
+                continue
+            Transaction.objects.filter(
+                id=t.id, transaction_status=PaymentStatus.CAPTURING
+            ).update(transaction_status=status)
+
+    pending = Transaction.objects.filter(
+        order_id=order_id, transaction_status=PaymentStatus.CAPTURING
+    ).count()
+    return len(transactions), pending
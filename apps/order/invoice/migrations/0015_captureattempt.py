@@ -0,0 +1,61 @@
+# Generated by Django 2.2.12 on 2020-07-25 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoice", "0014_auto_20200714_1954"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="transaction_status",
+            field=models.IntegerField(
+                choices=[
+                    (0, "Pending"),
+                    (1, "Successful"),
+                    (2, "Failed"),
+                    (3, "Invalid"),
+                    (5, "Authorized"),
+                    (6, "Capturing"),
+                ],
+                db_index=True,
+                default=0,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CaptureAttempt",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("successful", models.BooleanField(default=False)),
+                (
+                    "response_code",
+                    models.CharField(blank=True, max_length=10, null=True),
+                ),
+                ("result", models.CharField(blank=True, max_length=255)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="capture_attempts",
+                        to="invoice.Transaction",
+                    ),
+                ),
+            ],
+            options={"ordering": ("-id",)},
+        ),
+    ]
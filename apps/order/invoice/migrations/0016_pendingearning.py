@@ -0,0 +1,55 @@
+# Generated by Django 2.2.12 on 2020-07-26 10:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_unprocessed_earnings(apps, schema_editor):
+    Invoice = apps.get_model("invoice", "Invoice")
+    PendingEarning = apps.get_model("invoice", "PendingEarning")
+
+    order_ids = Invoice.objects.filter(
+        app_earning=None, restaurant_earning=None, order__payment_completed=True
+    ).values_list("order_id", flat=True)
+    PendingEarning.objects.bulk_create(
+        [PendingEarning(order_id=order_id) for order_id in order_ids],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0022_restaurantratingsummary"),
+        ("invoice", "0015_captureattempt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingEarning",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_earning",
+                        to="order.Order",
+                    ),
+                ),
+            ],
+            options={"ordering": ("id",)},
+        ),
+        migrations.RunPython(queue_unprocessed_earnings, migrations.RunPython.noop),
+    ]
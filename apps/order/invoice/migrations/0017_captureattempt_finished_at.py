@@ -0,0 +1,25 @@
+# Generated by Django 2.2.12 on 2020-07-28 09:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def finish_attempts(apps, schema_editor):
+    CaptureAttempt = apps.get_model("invoice", "CaptureAttempt")
+    CaptureAttempt.objects.update(finished_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoice", "0016_pendingearning"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="captureattempt",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(finish_attempts, migrations.RunPython.noop),
+    ]
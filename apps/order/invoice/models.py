@@ -8,6 +8,7 @@ from django.utils.translation import ugettext_lazy as _
 from apps.account.models import User
 from apps.order.invoice.types import PaymentStatus
 from apps.order.models import Order, OrderItem
+from apps.order.pricing import annotate_item_prices
 from apps.order.types import OrderItemStatusType
 
 
@@ -27,25 +28,21 @@ class Invoice(models.Model):
 
     def generate_invoice_items(self):
         order: Order = self.order
-        participants = order.order_participants.all()
-        for participant in participants:
-            ordered_items = OrderItem.objects.filter(
-                order=order,
-                shared_with=participant.user,
-                status=OrderItemStatusType.CONFIRMED,
-            )
-            if ordered_items.count() > 0:
-                price = order.shared_price_without_tax(participant.user)
-                tax = order.shared_tax_amount(participant.user)
-                amount = order.shared_price_with_tax(participant.user)
-
-                InvoiceItem.objects.create(
-                    invoice=self,
-                    user=participant.user,
-                    general_amount=price,
-                    tax_amount=tax,
-                    amount=amount,
+        shares = order.get_pricing().participant_shares()
+        invoice_items = []
+        for participant in order.order_participants.all():
+            if participant.user_id in shares:
+                share = shares[participant.user_id]
+                invoice_items.append(
+                    InvoiceItem(
+                        invoice=self,
+                        user_id=participant.user_id,
+                        general_amount=share.general_amount,
+                        tax_amount=share.tax_amount,
+                        amount=share.amount,
+                    )
                 )
+        InvoiceItem.objects.bulk_create(invoice_items)
 
     class Meta:
         ordering = ("-id",)
@@ -87,11 +84,13 @@ class InvoiceItem(models.Model):
 
     @property
     def food_items(self) -> []:
-        ordered_items = OrderItem.objects.filter(
-            order=self.invoice.order,
-            shared_with=self.user,
-            status=OrderItemStatusType.CONFIRMED,
-        )
+        ordered_items = annotate_item_prices(
+            OrderItem.objects.filter(
+                order=self.invoice.order_id,
+                shared_with=self.user,
+                status=OrderItemStatusType.CONFIRMED,
+            )
+        ).select_related("food_item")
 
         return ordered_items
 
@@ -130,6 +129,50 @@ class Transaction(models.Model):
         super(Transaction, self).save(*args, **kwargs)
 
 
+class CaptureAttempt(models.Model):
+    """
+    One call to PayTabs capturing an authorized transaction. Created before
+    the call, `finished_at` is set once its outcome is recorded.
+    """
+
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.CASCADE, related_name="capture_attempts"
+    )
+    successful = models.BooleanField(default=False)
+    response_code = models.CharField(max_length=10, null=True, blank=True)
+    result = models.CharField(max_length=255, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-id",)
+
+    def __str__(self):
+        return f"Capture of {self.transaction_id}: {self.result or self.error}"
+
+
+class PendingEarning(models.Model):
+    """
+    Outbox of paid orders whose earnings have not been processed yet. Rows are
+    written in the transaction which completes the payment of the order and
+    deleted once the earnings are processed.
+    """
+
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, related_name="pending_earning"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"Pending earning of {self.order_id}"
+
+
 def generate_order_id(user_id: int) -> str:
     max_length = 32
     user_id_length = len(str(user_id))
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PayTabsResult(NamedTuple):
+    transaction_id: str
+    response_code: Optional[str]
+    result: str
+    data: dict
+    # Set when PayTabs could not be reached or answered with invalid json.
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return (
+            self.error is None and self.response_code in settings.PAYTABS_SUCCESS_CODES
+        )
+
+
+class PayTabsClient:
+    """
+    PayTabs api client. Connections are pooled and reused across calls, and
+    calls are retried with backoff on connection errors and gateway errors.
+    Verifying and capturing a transaction are safe to repeat, PayTabs only
+    captures a pre-authorization once.
+    """
+
+    def __init__(
+        self,
+        merchant_email: str,
+        secret_key: str,
+        verify_url: str,
+        capture_url: str,
+        timeout: float = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10,
+    ):
+        self.merchant_email = merchant_email
+        self.secret_key = secret_key
+        self.verify_url = verify_url
+        self.capture_url = capture_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            method_whitelist=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, url: str, transaction_id: str, **data) -> PayTabsResult:
+        data.update(
+            merchant_email=self.merchant_email,
+            secret_key=self.secret_key,
+            transaction_id=transaction_id,
+        )
+        try:
+            response = self.session.post(url, data=data, timeout=self.timeout)
+            response_data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return PayTabsResult(transaction_id, None, "", {}, error=str(e))
+
+        return PayTabsResult(
+            transaction_id,
+            response_data.get("response_code"),
+            response_data.get("result", ""),
+            response_data,
+        )
+
+    def verify(self, transaction_id: str) -> PayTabsResult:
+        return self._post(self.verify_url, transaction_id)
+
+    def capture(self, transaction_id: str, amount: Decimal) -> PayTabsResult:
+        return self._post(self.capture_url, transaction_id, amount=amount)
+
+    def capture_many(
+        self, transactions: Iterable[Tuple[str, Decimal]]
+    ) -> List[PayTabsResult]:
+        """
+        Captures (transaction_id, amount) pairs concurrently.
+        :return: the results in the order of `transactions`
+        """
+        transactions = list(transactions)
+        if len(transactions) <= 1:
+            return [self.capture(*transaction) for transaction in transactions]
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(transactions), self.pool_size)
+        ) as executor:
+            return list(executor.map(lambda t: self.capture(*t), transactions))
+
+
+@lru_cache(maxsize=None)
+def get_client() -> PayTabsClient:
+    return PayTabsClient(
+        merchant_email=settings.PAYTABS_MERCHANT_EMAIL,
+        secret_key=settings.PAYTABS_SECRET_KEY,
+        verify_url=settings.PAYTABS_VERIFY_PAYMENT_URL,
+        capture_url=settings.PAYTABS_CAPTURE_URL,
+        timeout=settings.PAYTABS_TIMEOUT,
+        max_retries=settings.PAYTABS_MAX_RETRIES,
+    )
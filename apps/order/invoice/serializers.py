@@ -4,6 +4,9 @@ from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, PermissionDenied
 
+from apps.account.customer.models import Misc
+from apps.account.customer.types import CustomerMiscType
+from apps.account.identity import get_profile
 from apps.account.models import User
 from apps.account.serializers import PublicUserSerializer
 from apps.order.invoice.tasks import (
@@ -154,18 +157,18 @@ class InvoiceSerializer(serializers.ModelSerializer):
         try:
             invoice = Invoice.objects.get(order=order)
         except Invoice.DoesNotExist:
+            restaurant = get_profile(order.restaurant, "restaurant")
             with transaction.atomic():
                 invoice = Invoice.objects.create(
                     **validated_data,
-                    order_cut=order.restaurant.restaurant.pickup_order_cut
+                    order_cut=restaurant.pickup_order_cut
                     if order.order_type is OrderType.PICK_UP
-                    else order.restaurant.restaurant.inhouse_order_cut,
+                    else restaurant.inhouse_order_cut,
                 )
                 invoice.generate_invoice_items()
                 order.status = OrderStatusType.CHECKOUT
                 order.save()
-                for p in order.order_participants.all():
-                    p.user.misc.set_order_in_checkout()
+                Misc.objects.transition_order(order, CustomerMiscType.IN_CHECKOUT)
 
             # Send necessary Signals.
             send_checkout_push_notification_to_other_users(
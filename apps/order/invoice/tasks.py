@@ -1,38 +1,115 @@
 from celery.task import periodic_task
-from django.utils import translation, timezone
+from django.utils import timezone
+from django.utils.translation import gettext_noop
 
+from apps.account.customer.models import Misc
+from apps.account.customer.types import CustomerMiscType
 from apps.account.models import User
+from apps.notification.messages import ActionTemplate, PushTemplate
 from apps.notification.models import Action
 from apps.notification.types import NotificationActionType
+from apps.order.invoice.capture import capture_order_transactions
 from apps.order.invoice.models import Invoice, Transaction
 from apps.order.invoice.types import PaymentStatus
-from apps.order.invoice.utils import process_new_completed_order_earning
+from apps.order.invoice.utils import process_pending_earnings
 from apps.order.models import Order
 from apps.order.types import OrderType
+from apps.order.tasks import get_participant_users
 from conf.celery import app
-from utils.fcm import send_push_notification
+from utils.fcm import send_bulk_push_notification
 
-_ = translation.ugettext
+CHECKOUT_CUSTOMER = PushTemplate(
+    gettext_noop("Please checkout"), gettext_noop("Tap to see more")
+)
+CHECKOUT_RESTAURANT = PushTemplate(
+    gettext_noop(
+        "The order #{order.id} from #{order.table_id} has been checked out. "
+        "Please check the payment status."
+    ),
+    gettext_noop("Tap to see more"),
+)
+SINGLE_USER_PAID = PushTemplate(
+    gettext_noop("{user.name} has paid bill."), gettext_noop("Tap to see more")
+)
+SINGLE_USER_PAID_RESTAURANT = PushTemplate(
+    gettext_noop(
+        "{user.name} has paid for the Table order #{order.id} from {order.table_id}. "
+        "Please check it from the order."
+    ),
+    gettext_noop("Tap to see more"),
+)
+ALL_BILL_PAID = PushTemplate(
+    gettext_noop("Bill has been paid"), gettext_noop("Tap to get started")
+)
+ALL_BILL_PAID_RESTAURANT = PushTemplate(
+    gettext_noop(
+        "The Table order #{order.id} from {order.table_id} has been fully paid. "
+        "Please open it from the completed order list to print invoice."
+    ),
+    gettext_noop("Tap to see more"),
+)
+PAYMENTS_CAPTURED = PushTemplate(
+    gettext_noop("The payments of order #{order.id} have been received."),
+    gettext_noop("Tap to see more"),
+)
+PAYMENTS_CAPTURE_FAILED = PushTemplate(
+    gettext_noop(
+        "Some payments of order #{order.id} could not be received. "
+        "Please check the payment status."
+    ),
+    gettext_noop("Tap to see more"),
+)
+
+CHECKOUT_ACTION = ActionTemplate(
+    "The order #{order.id} from #{order.table_id} has been checked out. "
+    "Please check the payment status.",
+    " تم تحويل طلب {order.id}  من طاولة {order.table_id}  إلى الدفع."
+    "الرجاء التحقق من حالة الفاتورة ",
+)
+SINGLE_USER_PAID_ACTION = ActionTemplate(
+    "{user.name} has paid for the Table order #{order.id} from {order.table_id}. "
+    "Please check it from the order.",
+    "{user.name} دفع فاتورة الطاولة {order.id} من {order.table_id}. "
+    "الرجاء التحقق من حالة الطلب ",
+)
+ALL_BILL_PAID_ACTION = ActionTemplate(
+    "The Table order #{order.id} from {order.table_id} has been fully paid. "
+    "Please open it from the completed order list to print invoice.",
+    "تم دفع طلب طاولة {order.id} من {order.table_id} بالكامل."
+    "لطباعة الفاتورة، الرجاء الذهاب إلى الطلبات المكتملة.",
+)
+
+
+def get_unpaid_users(order: Order):
+    paid_user_ids = set(
+        Transaction.objects.filter(
+            order=order,
+            transaction_status__in=[
+                PaymentStatus.AUTHORIZED,
+                PaymentStatus.CAPTURING,
+                PaymentStatus.SUCCESSFUL,
+            ],
+        ).values_list("user_id", flat=True)
+    )
+    return [
+        user for user in get_participant_users(order) if user.id not in paid_user_ids
+    ]
 
 
 @app.task
 def send_checkout_push_notification_to_other_users(from_user: int, order_id: int):
     order = Order.objects.get(id=order_id)
     try:
-        notification_users = order.order_participants.all().exclude(user__id=from_user)
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"Please checkout")
-            body = _("Tap to see more")
-            data = {
-                "notification_id": 11,
-                "notification_action": "ORDER_MARKED_AS_CHECKOUT_CUSTOMER",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 11,
+            "notification_action": "ORDER_MARKED_AS_CHECKOUT_CUSTOMER",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            CHECKOUT_CUSTOMER.build_messages(
+                get_participant_users(order, exclude_user=from_user), data
+            )
+        )
     except:
         pass
 
@@ -40,35 +117,23 @@ def send_checkout_push_notification_to_other_users(from_user: int, order_id: int
 @app.task
 def send_checkout_push_notification_to_the_restaurant(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        translation.activate(order.restaurant.user.locale)
-        title = _(
-            f"The order #{order_id} from #{order.table_id} has been checked out. Please check the payment status."
-        )
-        body = _("Tap to see more")
+        order = Order.objects.select_related("restaurant").get(id=order_id)
         data = {
             "notification_id": 12,
             "notification_action": "ORDER_MARKED_AS_CHECKOUT_RESTAURANT",
-            "title": title,
-            "body": body,
             "order_id": order_id,
         }
-        send_push_notification(order.restaurant.user, title, body, data)
-        translation.deactivate()
-
-        message = f"The order #{order_id} from #{order.table_id} has been checked out. Please check the payment status."
-        message_in_ar = f" تم تحويل طلب {order_id}  من طاولة {order.table_id}  إلى الدفع." \
-                        "الرجاء التحقق من حالة الفاتورة "
-
-        action_type = NotificationActionType.RESTAURANT_CHECKOUT_FROM_ORDER
+        messages = CHECKOUT_RESTAURANT.build_messages(
+            [order.restaurant], data, order=order
+        )
+        send_bulk_push_notification(messages)
 
         Action.objects.create(
-            message=message,
-            message_in_ar=message_in_ar,
-            action_type=action_type,
+            action_type=NotificationActionType.RESTAURANT_CHECKOUT_FROM_ORDER,
             user=order.restaurant,
             sender=order.created_by,
-            extra_data=data,
+            extra_data=messages[0].data,
+            **CHECKOUT_ACTION.render(order=order),
         )
     except:
         pass
@@ -81,130 +146,133 @@ def send_single_bill_paid_notification(
     user = User.objects.get(id=user_id)
     transaction = Transaction.objects.get(id=transaction_id)
 
-    invoice = Invoice.objects.get(id=invoice_id)
-    paid_transaction = Transaction.objects.filter(
-        order=invoice.order,
-        transaction_status__in=[PaymentStatus.AUTHORIZED, PaymentStatus.SUCCESSFUL],
+    invoice = Invoice.objects.select_related("order__restaurant").get(id=invoice_id)
+    order = invoice.order
+    data = {
+        "notification_id": 17,
+        "notification_action": "ORDER_SINGLE_USER_PAID",
+        "order_id": invoice.order_id,
+        "invoice_id": invoice.id,
+        "paid_for": [
+            invoice_item.user_id for invoice_item in transaction.invoice_items.all()
+        ],
+    }
+    send_bulk_push_notification(
+        SINGLE_USER_PAID.build_messages(get_unpaid_users(order), data, user=user)
     )
-    paid_transaction_users = [user for user in paid_transaction]
-
-    for participant_user in invoice.order.order_participants.all():
-
-        if participant_user.user not in paid_transaction_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{user.name} has paid bill.")
-            body = _("Tap to see more")
-            data = {
-                "notification_id": 17,
-                "notification_action": "ORDER_SINGLE_USER_PAID",
-                "title": title,
-                "body": body,
-                "order_id": invoice.order_id,
-                "invoice_id": invoice.id,
-                "paid_for": [
-                    invoice_item.user_id
-                    for invoice_item in transaction.invoice_items.all()
-                ],
-            }
-            print(f"debug notification data: {data})")
-
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
-
-    if invoice.order.order_type is OrderType.IN_HOUSE:
-        translation.activate(invoice.order.restaurant.locale)
-        message = f"{user.name} has paid for the Table order #{invoice.order.id} from {invoice.order.table_id}. Please check it from the order."
-        message_in_ar = f"{user.name} دفع فاتورة الطاولة {invoice.order.id} من {invoice.order.table_id}. الرجاء التحقق من حالة الطلب "
-
-        title = _(message)
-        body = _("Tap to see more")
-        data = {
-            "notification_id": 17,
-            "notification_action": "ORDER_SINGLE_USER_PAID",
-            "title": title,
-            "body": body,
-            "order_id": invoice.order_id,
-            "invoice_id": invoice.id,
-            "paid_for": [
-                invoice_item.user_id for invoice_item in transaction.invoice_items.all()
-            ],
-        }
-        send_push_notification(invoice.order.restaurant, title, body, data)
-        translation.deactivate()
-        action_type = NotificationActionType.RESTAURANT_RECEIVED_PAYMENT_FOR_ORDER
+
+    if order.order_type == OrderType.IN_HOUSE:
+        messages = SINGLE_USER_PAID_RESTAURANT.build_messages(
+            [order.restaurant], data, user=user, order=order
+        )
+        send_bulk_push_notification(messages)
 
         Action.objects.create(
-            message=message,
-            message_in_ar=message_in_ar,
-            action_type=action_type,
-            user=invoice.order.restaurant,
-            sender=invoice.order.created_by,
-            extra_data=data,
+            action_type=NotificationActionType.RESTAURANT_RECEIVED_PAYMENT_FOR_ORDER,
+            user=order.restaurant,
+            sender=order.created_by,
+            extra_data=messages[0].data,
+            **SINGLE_USER_PAID_ACTION.render(user=user, order=order),
         )
 
 
 @app.task
 def send_all_bill_paid_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        paid_transaction = Transaction.objects.filter(
-            order=order,
-            transaction_status__in=[PaymentStatus.AUTHORIZED, PaymentStatus.SUCCESSFUL],
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 16,
+            "notification_action": "ORDER_ALL_BILL_PAID",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ALL_BILL_PAID.build_messages(get_unpaid_users(order), data)
         )
-        paid_transaction_users = [user for user in paid_transaction]
-        for participant_user in order.order_participants.all():
-            if participant_user.user not in paid_transaction_users:
-                translation.activate(participant_user.user.locale)
-                title = _(f"Bill has been paid")
-                body = _("Tap to get started")
-                data = {
-                    "notification_id": 16,
-                    "notification_action": "ORDER_ALL_BILL_PAID",
-                    "title": title,
-                    "body": body,
-                    "order_id": order_id,
-                }
-                print(f"{participant_user}: {data}")
-                send_push_notification(participant_user.user, title, body, data)
-                translation.deactivate()
-
-        if order.order_type is OrderType.IN_HOUSE:
-            message = f"The Table order #{order_id} from {order.table_id} has been fully paid. " \
-                      f"Please open it from the completed order list to print invoice."
-            message_in_ar = f"تم دفع طلب طاولة {order_id} من {order.table_id} بالكامل." \
-                            "لطباعة الفاتورة، الرجاء الذهاب إلى الطلبات المكتملة."
-
-            translation.activate(order.restaurant.locale)
-            title = _(message)
-            body = _("Tap to see more")
-
-            data = {
-                "notification_id": 16,
-                "notification_action": "ORDER_ALL_BILL_PAID",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-
-            send_push_notification(order.restaurant, title, body, data)
-            translation.deactivate()
-
-            action_type = NotificationActionType.RESTAURANT_ORDER_COMPLETED
+
+        if order.order_type == OrderType.IN_HOUSE:
+            messages = ALL_BILL_PAID_RESTAURANT.build_messages(
+                [order.restaurant], data, order=order
+            )
+            send_bulk_push_notification(messages)
 
             Action.objects.create(
-                message=message,
-                message_in_ar=message_in_ar,
-                action_type=action_type,
+                action_type=NotificationActionType.RESTAURANT_ORDER_COMPLETED,
                 user=order.restaurant,
                 sender=order.created_by,
-                extra_data=data,
+                extra_data=messages[0].data,
+                **ALL_BILL_PAID_ACTION.render(order=order),
             )
     except:
         pass
 
 
+@app.task
+def set_participants_in_rating(order_id: int):
+    Misc.objects.transition_order(order_id, CustomerMiscType.IN_RATING)
+
+
 @periodic_task(run_every=timezone.timedelta(minutes=2))
-def sync_error_transactions():
-    unsync_invoices = Invoice.objects.filter(app_earning=None, restaurant_earning=None, order__payment_completed=True)
-    for invoice in unsync_invoices:
-        process_new_completed_order_earning(invoice.order)
+def process_earnings():
+    process_pending_earnings()
+
+
+CAPTURE_RETRY_DELAY = 60
+
+
+@app.task(bind=True, max_retries=5)
+def capture_order_payments(self, order_id: int):
+    """
+    Captures the payments of an accepted order, retrying while PayTabs can
+    not be reached. The restaurant is notified once every payment is
+    captured or has failed.
+    """
+    processed, pending = capture_order_transactions(order_id)
+    if pending > 0:
+        raise self.retry(countdown=CAPTURE_RETRY_DELAY)
+    if processed > 0:
+        send_payments_captured_notification(order_id)
+
+
+def send_payments_captured_notification(order_id: int):
+    order = Order.objects.select_related("restaurant").get(id=order_id)
+    # Only failed captures count, payments which failed their verification
+    # were never authorized.
+    if Transaction.objects.filter(
+        order=order,
+        transaction_status=PaymentStatus.FAILED,
+        capture_attempts__isnull=False,
+    ).exists():
+        template = PAYMENTS_CAPTURE_FAILED
+        data = {
+            "notification_id": 21,
+            "notification_action": "ORDER_PAYMENT_CAPTURE_FAILED",
+            "order_id": order_id,
+        }
+    else:
+        template = PAYMENTS_CAPTURED
+        data = {
+            "notification_id": 20,
+            "notification_action": "ORDER_PAYMENT_CAPTURED",
+            "order_id": order_id,
+        }
+    send_bulk_push_notification(
+        template.build_messages([order.restaurant], data, order=order)
+    )
+
+
+@periodic_task(run_every=timezone.timedelta(minutes=10))
+def reconcile_payment_captures():
+    """
+    Restarts the captures which stopped without a result, e.g. when a worker
+    died or the task ran out of retries.
+    """
+    cutoff = timezone.now() - timezone.timedelta(minutes=10)
+    order_ids = (
+        Transaction.objects.filter(transaction_status=PaymentStatus.CAPTURING)
+        .exclude(capture_attempts__created_at__gte=cutoff)
+        .order_by()
+        .values_list("order_id", flat=True)
+        .distinct()
+    )
+    for order_id in order_ids:
+        capture_order_payments.delay(order_id=order_id)
@@ -1,10 +1,35 @@
+import json
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
 import pytest
+from django.core.cache import cache
 from mixer.backend.django import mixer
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate
 
-from apps.order.invoice.models import Invoice, InvoiceItem
-from apps.order.invoice.views import InvoiceViewSet, TransactionViewSet
+from apps.order.invoice.capture import (
+    MAX_CAPTURE_ATTEMPTS,
+    capture_order_transactions,
+    start_capture,
+)
+from apps.order.invoice.models import (
+    CaptureAttempt,
+    Invoice,
+    InvoiceItem,
+    PendingEarning,
+)
+from apps.order.invoice.paytabs import PayTabsClient, PayTabsResult
+from apps.order.invoice.tasks import capture_order_payments, get_unpaid_users
+from apps.order.invoice.types import PaymentStatus
+from apps.order.invoice.utils import process_pending_earnings, queue_order_earning
+from apps.order.invoice.views import (
+    InvoiceViewSet,
+    TransactionVerifyViewSet,
+    TransactionViewSet,
+)
 from apps.order.tests.test_views import TOrderFixtures
 from apps.order.types import OrderStatusType, OrderItemStatusType
 
@@ -57,3 +82,285 @@ class TestInvoice(TOrderFixtures):
         assert (
             response.status_code == status.HTTP_201_CREATED
         ), "Should create a new transaction"
+
+
+class FakePayTabsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        data = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self.server.requests.append((self.path, data))
+
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        body = json.dumps(
+            {
+                "result": "Success",
+                "response_code": "100",
+                "transaction_id": data["transaction_id"],
+                "amount": data.get("amount"),
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def paytabs_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePayTabsHandler)
+    server.requests = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def paytabs_client(paytabs_server):
+    url = f"http://127.0.0.1:{paytabs_server.server_port}"
+    return PayTabsClient(
+        merchant_email="merchant@example.com",
+        secret_key="secret",
+        verify_url=f"{url}/verify",
+        capture_url=f"{url}/capture",
+        timeout=5,
+        backoff_factor=0,
+    )
+
+
+class TestPayTabsClient:
+    def test_capture_many(self, paytabs_server, paytabs_client):
+        results = paytabs_client.capture_many(
+            [("1", Decimal("10.500")), ("2", Decimal("3.000")), ("3", Decimal("1"))]
+        )
+
+        assert [result.transaction_id for result in results] == ["1", "2", "3"]
+        assert all(result.ok for result in results)
+        assert results[0].data["amount"] == "10.500"
+        assert len(paytabs_server.requests) == 3
+
+    def test_retry(self, paytabs_server, paytabs_client):
+        paytabs_server.failures = 2
+
+        result = paytabs_client.verify("1")
+
+        assert result.ok
+        assert len(paytabs_server.requests) == 3
+
+    def test_unreachable(self, paytabs_server, paytabs_client):
+        paytabs_server.shutdown()
+        paytabs_server.server_close()
+
+        result = paytabs_client.capture("1", Decimal("1"))
+
+        assert result.ok is False
+        assert result.error is not None
+
+
+class TestCapture(TOrderFixtures):
+    @pytest.fixture
+    def authorized(self, customer, order):
+        return mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            pt_transaction_id="123",
+            amount=Decimal("10.000"),
+            transaction_status=PaymentStatus.AUTHORIZED,
+        )
+
+    def test_capture(self, monkeypatch, paytabs_client, order, authorized):
+        monkeypatch.setattr(
+            "apps.order.invoice.capture.get_client", lambda: paytabs_client
+        )
+
+        assert start_capture(order) == 1
+        assert capture_order_transactions(order.id) == (1, 0)
+
+        authorized.refresh_from_db()
+        assert authorized.transaction_status == PaymentStatus.SUCCESSFUL
+        assert CaptureAttempt.objects.get().successful is True
+
+    def test_capture_claimed(
+        self, monkeypatch, paytabs_server, paytabs_client, order, authorized
+    ):
+        monkeypatch.setattr(
+            "apps.order.invoice.capture.get_client", lambda: paytabs_client
+        )
+        start_capture(order)
+        # Another capture is calling PayTabs for the transaction.
+        CaptureAttempt.objects.create(transaction=authorized)
+
+        assert capture_order_transactions(order.id) == (0, 1)
+        assert paytabs_server.requests == []
+
+    def test_capture_unreachable(
+        self, monkeypatch, paytabs_server, paytabs_client, order, authorized
+    ):
+        monkeypatch.setattr(
+            "apps.order.invoice.capture.get_client", lambda: paytabs_client
+        )
+        paytabs_server.failures = 100
+        start_capture(order)
+
+        for _ in range(MAX_CAPTURE_ATTEMPTS):
+            assert capture_order_transactions(order.id) == (1, 1)
+        authorized.refresh_from_db()
+        assert authorized.transaction_status == PaymentStatus.CAPTURING
+
+        assert capture_order_transactions(order.id) == (1, 0)
+        authorized.refresh_from_db()
+        assert authorized.transaction_status == PaymentStatus.FAILED
+        assert CaptureAttempt.objects.count() == MAX_CAPTURE_ATTEMPTS
+
+    def test_captured_notification(
+        self, monkeypatch, paytabs_client, customer, order, authorized
+    ):
+        monkeypatch.setattr(
+            "apps.order.invoice.capture.get_client", lambda: paytabs_client
+        )
+        sent = []
+        monkeypatch.setattr(
+            "apps.order.invoice.tasks.send_bulk_push_notification", sent.extend
+        )
+        # Failed at verification, before any capture.
+        mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            transaction_status=PaymentStatus.FAILED,
+        )
+        start_capture(order)
+
+        capture_order_payments(order.id)
+
+        assert [message.data["notification_action"] for message in sent] == [
+            "ORDER_PAYMENT_CAPTURED"
+        ]
+
+
+class TestPendingEarning(TOrderFixtures):
+    def test_process_pending_earnings(self, customer, order):
+        invoice = mixer.blend("invoice.Invoice", order=order, order_cut=Decimal("10"))
+        mixer.blend(
+            "invoice.InvoiceItem",
+            invoice=invoice,
+            user=customer.user,
+            amount=Decimal("100.000"),
+        )
+        queue_order_earning(order)
+        queue_order_earning(order)
+        # Orders without an invoice fail and stay queued.
+        queue_order_earning(mixer.blend("order.Order", restaurant=order.restaurant))
+
+        assert process_pending_earnings(batch_size=1) == 1
+
+        invoice.refresh_from_db()
+        assert invoice.app_earning == Decimal("10")
+        pending_earning = PendingEarning.objects.get()
+        assert pending_earning.attempts == 1
+        assert "Invoice does not exists" in pending_earning.last_error
+
+
+class TestUnpaidUsers(TOrderFixtures):
+    def test_unpaid_users(self, customer, other_customer, order):
+        order.order_participants.create(user=other_customer.user)
+        # Being captured counts as paid.
+        mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=other_customer.user,
+            transaction_status=PaymentStatus.CAPTURING,
+        )
+        assert get_unpaid_users(order) == [customer.user]
+
+        mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            transaction_status=PaymentStatus.SUCCESSFUL,
+        )
+        assert get_unpaid_users(order) == []
+
+
+class TestTransactionVerify(TOrderFixtures):
+    def test_verify_once(self, monkeypatch, customer, order):
+        invoice = mixer.blend("invoice.Invoice", order=order)
+        invoice_item = mixer.blend(
+            "invoice.InvoiceItem",
+            invoice=invoice,
+            user=customer.user,
+            amount=Decimal("10.500"),
+        )
+        transaction = mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            pt_transaction_id=None,
+            amount=Decimal("10.500"),
+            currency="SAR",
+            transaction_status=PaymentStatus.PENDING,
+        )
+        transaction.invoice_items.add(invoice_item)
+
+        calls = []
+
+        def verify_transaction(transaction_id):
+            calls.append(transaction_id)
+            data = {
+                "order_id": transaction.pt_order_id,
+                "transaction_id": transaction_id,
+                "response_code": "100",
+                "amount": "10.500",
+                "currency": "SAR",
+            }
+            return PayTabsResult(transaction_id, "100", "Success", data)
+
+        monkeypatch.setattr(
+            "apps.order.invoice.views.verify_transaction", verify_transaction
+        )
+        factory = APIRequestFactory()
+        for _ in range(2):
+            request = factory.post("/", data={"transaction_id": "4321"})
+            response = TransactionVerifyViewSet.as_view()(request)
+            assert response.data == {"transaction_status": PaymentStatus.SUCCESSFUL}
+
+        assert calls == ["4321"], "Should only verify the payment once"
+        order.refresh_from_db()
+        assert order.payment_completed is True
+        assert PendingEarning.objects.filter(order=order).exists()
+
+    def test_verify_unreachable(
+        self, monkeypatch, paytabs_server, paytabs_client, customer, order
+    ):
+        transaction = mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            pt_transaction_id=None,
+            transaction_status=PaymentStatus.PENDING,
+        )
+        monkeypatch.setattr(
+            "apps.order.invoice.utils.get_client", lambda: paytabs_client
+        )
+        paytabs_server.failures = 100
+
+        request = APIRequestFactory().post("/", data={"transaction_id": "4321"})
+        response = TransactionVerifyViewSet.as_view()(request)
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        transaction.refresh_from_db()
+        assert transaction.transaction_status == PaymentStatus.PENDING
+        # Errors are not cached, the next callback verifies again.
+        assert cache.get("paytabs:verification:4321") is None
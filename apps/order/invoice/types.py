@@ -7,6 +7,7 @@ class PaymentStatus:
     FAILED = 2
     INVALID = 3
     AUTHORIZED = 5
+    CAPTURING = 6
 
     CHOICES = (
         (PENDING, _("Pending")),
@@ -14,4 +15,5 @@ class PaymentStatus:
         (FAILED, _("Failed")),
         (INVALID, _("Invalid")),
         (AUTHORIZED, _("Authorized")),
+        (CAPTURING, _("Capturing")),
     )
@@ -1,45 +1,42 @@
 from decimal import Decimal
 
-import requests
-from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.utils import timezone
 
-from apps.account.restaurant.models import Restaurant
-from apps.order.invoice.models import Invoice
+from apps.account.identity import get_profile
+from apps.account.restaurant.models import DailyEarning, EarningEntry, Restaurant
+from apps.order.invoice.models import Invoice, PendingEarning
+from apps.order.invoice.paytabs import PayTabsResult, get_client
 from apps.order.models import Order
-from apps.order.types import OrderType
 
+# Webhook and app callbacks of one payment arrive together, the verification
+# result is shared between them.
+VERIFICATION_CACHE_TIMEOUT = 60 * 10
 
-def verify_transaction(transaction_id):
-    data = {
-        "merchant_email": settings.PAYTABS_MERCHANT_EMAIL,
-        "secret_key": settings.PAYTABS_SECRET_KEY,
-        "transaction_id": transaction_id,
-    }
 
-    response = requests.post(settings.PAYTABS_VERIFY_PAYMENT_URL, data=data)
-    response_data = response.json()
-    return response_data
+def verify_transaction(transaction_id) -> PayTabsResult:
+    """
+    Verifies the transaction with PayTabs. Check `error` of the result before
+    reading its data, errors are not cached.
+    """
+    key = f"paytabs:verification:{transaction_id}"
+    result = cache.get(key)
+    if result is None:
+        result = get_client().verify(transaction_id)
+        if result.error is None and result.data.get("order_id") is not None:
+            cache.set(key, result, timeout=VERIFICATION_CACHE_TIMEOUT)
+    return result
 
 
 def capture_transaction(transaction_id, amount):
-    data = {
-        "merchant_email": settings.PAYTABS_MERCHANT_EMAIL,
-        "secret_key": settings.PAYTABS_SECRET_KEY,
-        "transaction_id": transaction_id,
-        "amount": amount,
-    }
-    response = requests.post(
-        "https://www.paytabs.com/apiv3/release_capture_preauth", data=data
-    )
-    response_data = response.json()
-    return response_data
+    return get_client().capture(transaction_id, amount).data
 
 
 def process_new_completed_order_earning(order: Order):
     with transaction.atomic():
 
-        restaurant: Restaurant = order.restaurant.restaurant
+        restaurant: Restaurant = get_profile(order.restaurant, "restaurant")
         total = Decimal(0.0)
         try:
             invoice = Invoice.objects.get(order=order)
@@ -55,20 +52,89 @@ def process_new_completed_order_earning(order: Order):
         app_earning = (total / Decimal(100)) * invoice.order_cut
         restaurant_earning = total - app_earning
 
-        if order.order_type is OrderType.PICK_UP:
-            restaurant.app_pickup_earning += app_earning
-            restaurant.pickup_earning += restaurant_earning
-        elif order.order_type is OrderType.IN_HOUSE:
-            restaurant.app_inhouse_earning += app_earning
-            restaurant.inhouse_earning += restaurant_earning
-
-        restaurant.total_earning += restaurant_earning
-        restaurant.app_total_earning += app_earning
-
-        restaurant.total += total
+        # The ledger entry is unique per invoice, so an earning processed
+        # concurrently is only ever added once.
+        entry, created = EarningEntry.objects.get_or_create(
+            invoice=invoice,
+            defaults={
+                "restaurant": restaurant,
+                "order_type": order.order_type,
+                "total": total,
+                "app_earning": app_earning,
+                "restaurant_earning": restaurant_earning,
+            },
+        )
+        if not created:
+            return False
 
-        restaurant.save()
+        Restaurant.add_earning(
+            restaurant_id=restaurant.id,
+            order_type=order.order_type,
+            total=total,
+            app_earning=app_earning,
+            restaurant_earning=restaurant_earning,
+        )
 
         invoice.app_earning = app_earning
         invoice.restaurant_earning = restaurant_earning
-        invoice.save()
+        invoice.save(update_fields=["app_earning", "restaurant_earning"])
+
+        DailyEarning.add_order(
+            restaurant=restaurant,
+            date=timezone.localdate(invoice.created_at),
+            order_type=order.order_type,
+            total=total,
+            app_earning=app_earning,
+            restaurant_earning=restaurant_earning,
+        )
+
+
+# Pending earnings failing this many times are left for an admin to look at.
+MAX_EARNING_ATTEMPTS = 5
+
+
+def queue_order_earning(order: Order):
+    """
+    Queues the earnings of a paid order, to be called in the transaction which
+    marks the payment as completed.
+    """
+    PendingEarning.objects.get_or_create(order=order)
+
+
+def process_pending_earnings(batch_size: int = 100) -> int:
+    """
+    Processes the queued earnings in batches. Rows are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several workers can drain the queue
+    at the same time.
+    :return: the number of processed earnings
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            pending_earnings = list(
+                PendingEarning.objects.select_for_update(skip_locked=True, of=("self",))
+                .select_related("order")
+                .filter(id__gt=last_id, attempts__lt=MAX_EARNING_ATTEMPTS)[:batch_size]
+            )
+            if len(pending_earnings) == 0:
+                break
+
+            done = []
+            for pending_earning in pending_earnings:
+                try:
+                    with transaction.atomic():
+                        process_new_completed_order_earning(pending_earning.order)
+                except Exception as e:
+                    pending_earning.attempts += 1
+                    pending_earning.last_error = repr(e)
+                    pending_earning.save(update_fields=["attempts", "last_error"])
+                else:
+                    done.append(pending_earning.id)
+            PendingEarning.objects.filter(id__in=done).delete()
+
+        processed += len(done)
+        last_id = pending_earnings[-1].id
+        if len(pending_earnings) < batch_size:
+            break
+    return processed
@@ -1,5 +1,8 @@
+import logging
+
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
+from django.db import transaction as db_transaction
 from django.shortcuts import get_object_or_404, render
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status
@@ -11,14 +14,13 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from apps.account.types import ProfileType
 from apps.order.invoice.filters import InvoiceFilter
 from apps.order.invoice.tasks import (
+    process_earnings,
     send_all_bill_paid_notification,
     send_single_bill_paid_notification,
+    set_participants_in_rating,
 )
 from apps.order.invoice.types import PaymentStatus
-from apps.order.invoice.utils import (
-    verify_transaction,
-    process_new_completed_order_earning,
-)
+from apps.order.invoice.utils import queue_order_earning, verify_transaction
 from apps.order.models import Order
 from apps.order.types import OrderType, OrderStatusType
 from .models import Invoice, Transaction
@@ -29,6 +31,8 @@ from .serializers import (
 )
 from ..tasks import send_new_order_items_confirmed_notification
 
+logger = logging.getLogger(__name__)
+
 
 class InvoiceViewSet(
     GenericViewSet,
@@ -84,94 +88,114 @@ class TransactionVerifyViewSet(CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        transaction_id = serializer.validated_data.get("transaction_id")
+
+        # The PayTabs transaction id is the idempotency key: once a callback
+        # has processed it, repeated callbacks get the stored status.
+        transaction_status = (
+            Transaction.objects.filter(pt_transaction_id=transaction_id)
+            .exclude(transaction_status=PaymentStatus.PENDING)
+            .values_list("transaction_status", flat=True)
+            .first()
+        )
+        if transaction_status is not None:
+            return self.status_response(transaction_status)
+
+        result = verify_transaction(transaction_id)
+        if result.error is not None:
+            # The payment is verified again on the next callback.
+            logger.warning(
+                "Could not verify transaction %s: %s", transaction_id, result.error
+            )
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response_data = result.data
+        logger.info("Verified transaction %s: %s", transaction_id, response_data)
+
+        with db_transaction.atomic():
+            try:
+                transaction = Transaction.objects.select_for_update().get(
+                    pt_order_id=response_data.get("order_id")
+                )
+            except Transaction.DoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+
+            # A concurrent callback may have processed it while this one was
+            # waiting for the lock.
+            if transaction.transaction_status == PaymentStatus.PENDING:
+                self.apply_verification(transaction, response_data)
 
-        print("Transaction_ID " + serializer.validated_data.get("transaction_id"))
+        return self.status_response(transaction.transaction_status)
 
-        response_data = verify_transaction(
-            serializer.validated_data.get("transaction_id")
+    def status_response(self, transaction_status: int) -> Response:
+        return Response(
+            {"transaction_status": transaction_status}, status=status.HTTP_200_OK
         )
-        print(f"response from paytabs {response_data}")
 
-        try:
-            transaction = Transaction.objects.get(
-                pt_order_id=response_data.get("order_id")
-            )
-        except Transaction.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+    def apply_verification(self, transaction: Transaction, response_data: dict):
+        """
+        Stores the verification result of a locked pending transaction. The
+        notifications and the earnings are processed by tasks after commit.
+        """
+        transaction.pt_transaction_id = response_data.get("transaction_id")
 
-        if transaction.transaction_status != PaymentStatus.PENDING:
-            return Response(
-                {"transaction_status": transaction.transaction_status},
-                status=status.HTTP_200_OK,
-            )
+        if response_data.get("response_code") not in ["100"]:
+            transaction.transaction_status = PaymentStatus.FAILED
+            transaction.save()
+            return
 
-        transaction.pt_transaction_id = response_data.get("transaction_id")
-        transaction.save()
+        tamount = response_data.get("amount")
+        aamount = str(transaction.amount)
+        if tamount[-1] == "0":
+            tamount = tamount[:-1]
+            aamount = str(round(transaction.amount, 2))
+
+        if tamount != aamount or transaction.currency != response_data.get("currency"):
+            transaction.transaction_status = PaymentStatus.INVALID
+            transaction.save()
+            return
 
-        if response_data.get("response_code") in ["100"]:
-
-            tamount = response_data.get("amount")
-            aamount = str(transaction.amount)
-            if tamount[-1] == "0":
-                tamount = tamount[:-1]
-                aamount = str(round(transaction.amount, 2))
-
-            print(f"tamount: {tamount}, aamount: {aamount}")
-
-            if tamount != aamount or transaction.currency != response_data.get(
-                "currency"
-            ):
-                # Lets handle the failing state first.
-                transaction.transaction_status = PaymentStatus.INVALID
-                transaction.save()
-                return Response(
-                    {"transaction_status": transaction.transaction_status},
-                    status=status.HTTP_200_OK,
+        transaction.transaction_status = PaymentStatus.SUCCESSFUL
+        transaction.save()
+        transaction.invoice_items.update(paid=True)
+
+        # Payments of the other participants wait here, so exactly one of them
+        # sees the order fully paid.
+        order: Order = Order.objects.select_for_update().get(id=transaction.order_id)
+        invoice = order.invoice
+
+        if invoice.invoice_items.filter(paid=False).exists():
+            db_transaction.on_commit(
+                lambda: send_single_bill_paid_notification.delay(
+                    invoice_id=invoice.id,
+                    user_id=transaction.user_id,
+                    transaction_id=transaction.id,
                 )
-            else:
-                transaction.transaction_status = PaymentStatus.SUCCESSFUL
-                transaction.save()
-                # Send necessary signals
-                transaction.invoice_items.update(paid=True)
-                transaction.refresh_from_db()
-                order: Order = transaction.order
-
-                if order.invoice.invoice_items.filter(paid=False).exists() is False:
-                    # Everything is paid!!
-                    if order.order_type is OrderType.PICK_UP:
-                        order.status = OrderStatusType.IN_PROCESS
-                        order.confirmed = True
-                        order.payment_completed = True
-                        send_new_order_items_confirmed_notification.delay(order_id=order.id)
-                        order.save()
-                    else:
-                        order.status = OrderStatusType.COMPLETED
-                        order.payment_completed = True
-                        order.save()
-                        process_new_completed_order_earning(order)
-
-                    send_all_bill_paid_notification.delay(order_id=order.id)
-
-                    for participant in order.order_participants.all():
-                        participant.user.misc.set_order_in_rating()
-
-                else:
-                    send_single_bill_paid_notification.delay(
-                        invoice_id=order.invoice.id,
-                        user_id=transaction.user_id,
-                        transaction_id=transaction.id,
-                    )
-                return Response(
-                    {"transaction_status": transaction.transaction_status},
-                    status=status.HTTP_200_OK,
+            )
+            return
+
+        # Everything is paid!!
+        if order.order_type == OrderType.PICK_UP:
+            order.status = OrderStatusType.IN_PROCESS
+            order.confirmed = True
+            db_transaction.on_commit(
+                lambda: send_new_order_items_confirmed_notification.delay(
+                    order_id=order.id
                 )
-        else:
-            transaction.transaction_status = PaymentStatus.FAILED
-            transaction.save()
-            return Response(
-                {"transaction_status": transaction.transaction_status},
-                status=status.HTTP_200_OK,
             )
+        else:
+            order.status = OrderStatusType.COMPLETED
+
+        order.payment_completed = True
+        order.save()
+        queue_order_earning(order)
+
+        db_transaction.on_commit(process_earnings.delay)
+        db_transaction.on_commit(
+            lambda: send_all_bill_paid_notification.delay(order_id=order.id)
+        )
+        db_transaction.on_commit(
+            lambda: set_participants_in_rating.delay(order_id=order.id)
+        )
 
 
 class TransactionViewSet(
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from ...models import Order
+
+
+def _round(*amounts):
+    # Totals are stored with 3 decimal places.
+    return tuple(amount.quantize(Decimal("0.001")) for amount in amounts)
+
+
+class Command(BaseCommand):
+    help = "Verifies and rebuilds the cached totals of the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("order_ids", nargs="*", type=int)
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report the orders with stale totals, without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.select_related("restaurant__restaurant")
+        if options["order_ids"]:
+            orders = orders.filter(id__in=options["order_ids"])
+
+        stale = 0
+        for order in orders.iterator():
+            pricing = order.get_pricing()
+            expected = _round(
+                pricing.total_without_tax, pricing.total_tax, pricing.total_with_tax
+            )
+            participants_stale = any(
+                _round(*participant.share)
+                != _round(*pricing.participant_share(participant.user_id))
+                for participant in order.order_participants.all()
+            )
+            if (
+                not participants_stale
+                and _round(order.subtotal, order.tax_amount, order.total) == expected
+            ):
+                continue
+
+            stale += 1
+            self.stdout.write(f"Order #{order.id} has stale totals.")
+            if not options["verify"]:
+                order.refresh_totals()
+
+        if options["verify"]:
+            self.stdout.write(f"{stale} orders have stale totals.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {stale} orders."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...models import RestaurantRatingSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the rating totals of the restaurants from their ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "restaurant_ids",
+            nargs="*",
+            type=int,
+            help="User ids of the restaurants, all restaurants by default.",
+        )
+
+    def handle(self, *args, **options):
+        RestaurantRatingSummary.rebuild(options["restaurant_ids"] or None)
+        self.stdout.write(self.style.SUCCESS("Rebuilt the rating summaries."))
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.12 on 2020-04-20 10:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0020_auto_20200401_1555"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="subtotal",
+            field=models.DecimalField(
+                decimal_places=3,
+                default=Decimal("0"),
+                help_text="Total price of the confirmed items, without Tax.",
+                max_digits=15,
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="tax_amount",
+            field=models.DecimalField(
+                decimal_places=3, default=Decimal("0"), max_digits=15
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=3,
+                default=Decimal("0"),
+                help_text="Total price of the confirmed items, with Tax.",
+                max_digits=15,
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderparticipant",
+            name="general_amount",
+            field=models.DecimalField(
+                decimal_places=3, default=Decimal("0"), max_digits=15
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderparticipant",
+            name="tax_amount",
+            field=models.DecimalField(
+                decimal_places=3, default=Decimal("0"), max_digits=15
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderparticipant",
+            name="amount",
+            field=models.DecimalField(
+                decimal_places=3, default=Decimal("0"), max_digits=15
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.12 on 2020-04-22 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("order", "0021_order_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RestaurantRatingSummary",
+            fields=[
+                (
+                    "restaurant",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("rating_count", models.PositiveIntegerField(default=0)),
+                ("food_item_rating_sum", models.PositiveIntegerField(default=0)),
+                ("restaurant_rating_sum", models.PositiveIntegerField(default=0)),
+                (
+                    "customer_service_rating_sum",
+                    models.PositiveIntegerField(default=0),
+                ),
+                ("application_rating_sum", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,9 +1,11 @@
 from decimal import Decimal
+from typing import TYPE_CHECKING
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Avg
 from django.db.models import F
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
 from apps.account.models import User
@@ -17,6 +19,9 @@ from .types import (
 )
 from ..notification.models import Action
 
+if TYPE_CHECKING:
+    from .pricing import ItemPrice, OrderPricing, Share
+
 
 class Order(models.Model):
     order_type = models.SmallIntegerField(
@@ -61,14 +66,44 @@ class Order(models.Model):
 
     tax_percentage = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
 
+    # Cached totals of the confirmed items, kept up to date by signals.
+    subtotal = models.DecimalField(
+        max_digits=15,
+        decimal_places=3,
+        default=Decimal(0),
+        help_text=_("Total price of the confirmed items, without Tax."),
+    )
+    tax_amount = models.DecimalField(
+        max_digits=15, decimal_places=3, default=Decimal(0)
+    )
+    total = models.DecimalField(
+        max_digits=15,
+        decimal_places=3,
+        default=Decimal(0),
+        help_text=_("Total price of the confirmed items, with Tax."),
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    TOTAL_FIELDS = ("subtotal", "tax_amount", "total")
+
     class Meta:
         ordering = ("-id",)
 
     def __str__(self):
         return str(self.id)
 
+    def save(self, *args, **kwargs):
+        # The cached totals are only written by `refresh_totals`, so saving a
+        # stale instance must not overwrite them.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def table_name(self):
         if self.table:
@@ -83,52 +118,74 @@ class Order(models.Model):
             and self.status == OrderStatusType.OPEN
         )
 
+    def get_pricing(self) -> "OrderPricing":
+        from .pricing import OrderPricing
+
+        return OrderPricing(self)
+
+    def refresh_totals(self):
+        """
+        Recalculates the cached totals of the order and its participants.
+        Called when the items change, and for the open orders when the prices
+        of the menu or the tax of the restaurant change, see `signals`.
+        """
+        from .board import broadcast_board_change
+        from .room import broadcast_changes
+
+        pricing = self.get_pricing()
+
+        self.subtotal = pricing.total_without_tax
+        self.tax_amount = pricing.total_tax
+        self.total = pricing.total_with_tax
+
+        with transaction.atomic():
+            Order.objects.filter(pk=self.pk).update(
+                subtotal=self.subtotal, tax_amount=self.tax_amount, total=self.total
+            )
+            participants = list(self.order_participants.all())
+            for participant in participants:
+                share = pricing.participant_share(participant.user_id)
+                participant.general_amount = share.general_amount
+                participant.tax_amount = share.tax_amount
+                participant.amount = share.amount
+            OrderParticipant.objects.bulk_update(
+                participants, ["general_amount", "tax_amount", "amount"]
+            )
+            broadcast_changes(self.pk, participant_ids=None, order=True)
+            broadcast_board_change(self)
+
     def total_price_without_tax(self) -> Decimal:
         """
         calculates orders total amount to be paid.
         """
-        total = Decimal(0.0)
-        items = OrderItem.objects.filter(
-            order=self, status=OrderItemStatusType.CONFIRMED
-        )
-        for i in items:
-            total += i.total_price_without_tax()
-        return Decimal(total)
+        return self.subtotal
 
     def total_price_with_tax(self) -> Decimal:
-        total_with_tax = self.total_price_without_tax() + (
-            self.total_price_without_tax()
-            * Decimal(self.restaurant.restaurant.tax_percentage)
-        ) / Decimal(100.00)
-        return Decimal(total_with_tax)
+        return self.total
+
+    def get_participant_share(self, user: User) -> "Share":
+        participant = self.order_participants.filter(user=user).first()
+        if participant is None:
+            return self.get_pricing().participant_share(user.id)
+        return participant.share
 
     def shared_price_without_tax(self, user: User) -> Decimal:
         """
         Get total payable by each user.
         """
-        total = Decimal(0.0)
-        items = OrderItem.objects.filter(
-            order=self, status=OrderItemStatusType.CONFIRMED, shared_with=user
-        )
-
-        for i in items:
-            total += i.shared_price_without_tax()
-        return Decimal(total)
+        return self.get_participant_share(user).general_amount
 
     def shared_price_with_tax(self, user: User) -> Decimal:
         """
         Get total tax by each user
         """
-        total = self.shared_price_without_tax(user) + (
-            self.shared_price_without_tax(user) * Decimal(self.tax_percentage)
-        ) / Decimal(100.00)
-        return Decimal(total)
+        return self.get_participant_share(user).amount
 
     def total_tax_amount(self) -> Decimal:
-        return self.total_price_with_tax() - self.total_price_without_tax()
+        return self.tax_amount
 
     def shared_tax_amount(self, user: User):
-        return self.shared_price_with_tax(user) - self.shared_price_without_tax(user)
+        return self.get_participant_share(user).tax_amount
 
 
 class OrderParticipant(models.Model):
@@ -136,8 +193,24 @@ class OrderParticipant(models.Model):
         Order, related_name="order_participants", on_delete=models.CASCADE
     )
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+
+    # Cached share of the user in the order, kept up to date by signals.
+    general_amount = models.DecimalField(
+        max_digits=15, decimal_places=3, default=Decimal(0)
+    )
+    tax_amount = models.DecimalField(
+        max_digits=15, decimal_places=3, default=Decimal(0)
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=3, default=Decimal(0))
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def share(self) -> "Share":
+        from .pricing import Share
+
+        return Share(self.general_amount, self.tax_amount, self.amount)
+
 
 class OrderInvite(models.Model):
     order = models.ForeignKey(
@@ -200,38 +273,30 @@ class OrderItem(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def refresh_from_db(self, *args, **kwargs):
+        super(OrderItem, self).refresh_from_db(*args, **kwargs)
+        self.__dict__.pop("price", None)
+
+    @cached_property
+    def price(self) -> "ItemPrice":
+        from .pricing import get_item_price
+
+        return get_item_price(self)
+
     def total_price_without_tax(self) -> Decimal:
         """
         calculates items total amount to be paid.
         """
-        total = Decimal(0.0)
-        add_ons = OrderItemAddOn.objects.filter(order_item=self)
-        for a in add_ons:
-            total += (
-                a.food_add_on.price * Decimal(a.quantity) * Decimal(self.quantity)
-            )  # Number of add on * Number of item * price of add ons
-        total += self.food_item.price * Decimal(self.quantity)
-        return total
+        return self.price.total_without_tax()
 
     def total_price_with_tax(self) -> Decimal:
-        return self.total_price_without_tax() + (
-            self.total_price_without_tax()
-            * Decimal(self.food_item.user.restaurant.tax_percentage)
-        ) / Decimal(100.00)
+        return self.price.total_with_tax()
 
     def shared_price_without_tax(self) -> Decimal:
-        total = self.total_price_without_tax()
-        try:
-            return total / Decimal(self.shared_with.count())
-        except ZeroDivisionError:
-            return total
+        return self.price.shared_without_tax()
 
     def shared_price_with_tax(self) -> Decimal:
-        total = self.total_price_with_tax()
-        try:
-            return total / Decimal(self.shared_with.count())
-        except ZeroDivisionError:
-            return total
+        return self.price.shared_with_tax()
 
     def total_tax(self):
         return self.total_price_with_tax() - self.total_price_without_tax()
@@ -329,3 +394,91 @@ class Rating(models.Model):
             return Decimal(rating["avg_rating"] / 4)
         except (TypeError, ZeroDivisionError):
             return Decimal(0.00)
+
+
+class RestaurantRatingSummary(models.Model):
+    """
+    Running totals of the ratings of a restaurant, so the average rating is
+    read from one row instead of aggregating every Rating.
+    """
+
+    restaurant = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating_summary",
+    )
+    rating_count = models.PositiveIntegerField(default=0)
+    food_item_rating_sum = models.PositiveIntegerField(default=0)
+    restaurant_rating_sum = models.PositiveIntegerField(default=0)
+    customer_service_rating_sum = models.PositiveIntegerField(default=0)
+    application_rating_sum = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    RATING_FIELDS = (
+        "food_item_rating",
+        "restaurant_rating",
+        "customer_service_rating",
+        "application_rating",
+    )
+
+    def __str__(self):
+        return f"{self.restaurant.name}: {self.average_rating()}"
+
+    def average_rating(self) -> Decimal:
+        if self.rating_count == 0:
+            return Decimal(0.00)
+        total = sum(getattr(self, f"{field}_sum") for field in self.RATING_FIELDS)
+        return Decimal(total) / Decimal(self.rating_count * len(self.RATING_FIELDS))
+
+    @classmethod
+    def _update_totals(cls, rating: Rating, sign: int) -> int:
+        return cls.objects.filter(restaurant_id=rating.restaurant_id).update(
+            rating_count=F("rating_count") + sign,
+            **{
+                f"{field}_sum": F(f"{field}_sum") + sign * getattr(rating, field)
+                for field in cls.RATING_FIELDS
+            },
+        )
+
+    @classmethod
+    def add_rating(cls, rating: Rating):
+        """
+        Adds a rating to the totals of its restaurant.
+        """
+        with transaction.atomic():
+            cls.objects.get_or_create(restaurant_id=rating.restaurant_id)
+            cls._update_totals(rating, 1)
+
+    @classmethod
+    def remove_rating(cls, rating: Rating):
+        """
+        Removes a rating from the totals of its restaurant. Never creates the
+        summary, which may be deleted along with the restaurant.
+        """
+        cls._update_totals(rating, -1)
+
+    @classmethod
+    def rebuild(cls, restaurant_ids=None):
+        """
+        Recalculates the totals from the ratings with one grouped query.
+        """
+        ratings = Rating.objects.all()
+        if restaurant_ids is not None:
+            ratings = ratings.filter(restaurant_id__in=restaurant_ids)
+        totals = ratings.values("restaurant_id").annotate(
+            rating_count=models.Count("id"),
+            **{f"{field}_sum": models.Sum(field) for field in cls.RATING_FIELDS},
+        )
+
+        with transaction.atomic():
+            summaries = cls.objects.all()
+            if restaurant_ids is not None:
+                summaries = summaries.filter(restaurant_id__in=restaurant_ids)
+            summaries.delete()
+            cls.objects.bulk_create(
+                [
+                    cls(restaurant_id=total.pop("restaurant_id"), **total)
+                    for total in totals
+                ]
+            )
@@ -0,0 +1,201 @@
+from decimal import Decimal
+from typing import Dict, List, NamedTuple
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem, OrderItemAddOn
+from .types import OrderItemStatusType
+
+_PRICE_FIELD = DecimalField(max_digits=15, decimal_places=3)
+
+
+def add_tax(amount: Decimal, tax_percentage) -> Decimal:
+    """
+    Adds the tax percentage on top of the amount.
+    """
+    return amount + (amount * Decimal(tax_percentage)) / Decimal(100.00)
+
+
+class ItemPrice(NamedTuple):
+    quantity: int
+    unit_price: Decimal
+    add_on_price: Decimal
+    shared_count: int
+    tax_percentage: Decimal
+
+    def total_without_tax(self) -> Decimal:
+        # (price of food + price of add ons) * number of item
+        return (self.unit_price + self.add_on_price) * Decimal(self.quantity)
+
+    def total_with_tax(self) -> Decimal:
+        return add_tax(self.total_without_tax(), self.tax_percentage)
+
+    def shared_without_tax(self) -> Decimal:
+        if self.shared_count == 0:
+            return self.total_without_tax()
+        return self.total_without_tax() / Decimal(self.shared_count)
+
+    def shared_with_tax(self) -> Decimal:
+        if self.shared_count == 0:
+            return self.total_with_tax()
+        return self.total_with_tax() / Decimal(self.shared_count)
+
+
+class Share(NamedTuple):
+    general_amount: Decimal
+    tax_amount: Decimal
+    amount: Decimal
+
+
+def annotate_item_prices(queryset):
+    """
+    Annotates an OrderItem queryset with everything needed to price the items,
+    so pricing a whole list of items costs a single query.
+    """
+    add_ons = (
+        OrderItemAddOn.objects.filter(order_item=OuterRef("pk"))
+        .values("order_item")
+        .annotate(
+            price=Sum(
+                ExpressionWrapper(
+                    F("food_add_on__price") * F("quantity"), output_field=_PRICE_FIELD
+                )
+            )
+        )
+        .values("price")
+    )
+    shared_with = (
+        OrderItem.shared_with.through.objects.filter(orderitem=OuterRef("pk"))
+        .values("orderitem")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return queryset.annotate(
+        unit_price=Coalesce(
+            F("food_item__price"), Value(Decimal(0)), output_field=_PRICE_FIELD
+        ),
+        add_on_price=Coalesce(
+            Subquery(add_ons, output_field=_PRICE_FIELD),
+            Value(Decimal(0)),
+            output_field=_PRICE_FIELD,
+        ),
+        shared_count=Coalesce(
+            Subquery(shared_with, output_field=IntegerField()),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+        restaurant_tax_percentage=Coalesce(
+            F("food_item__user__restaurant__tax_percentage"),
+            Value(Decimal(0)),
+            output_field=_PRICE_FIELD,
+        ),
+    )
+
+
+def get_item_price(item: OrderItem) -> ItemPrice:
+    """
+    Returns the price of an item, using the annotations from
+    `annotate_item_prices` when the item was loaded with them.
+    """
+    if not hasattr(item, "add_on_price"):
+        item = annotate_item_prices(OrderItem.objects.filter(pk=item.pk)).get()
+
+    return ItemPrice(
+        quantity=item.quantity,
+        unit_price=item.unit_price,
+        add_on_price=item.add_on_price,
+        shared_count=item.shared_count,
+        tax_percentage=item.restaurant_tax_percentage,
+    )
+
+
+class OrderPricing:
+    """
+    Prices every confirmed item of an order with a single query.
+    """
+
+    def __init__(self, order: Order):
+        self.order = order
+        self._participant_shares = None
+        self.items: List[OrderItem] = list(
+            annotate_item_prices(
+                OrderItem.objects.filter(
+                    order=order, status=OrderItemStatusType.CONFIRMED
+                )
+            )
+            .annotate(
+                order_tax_percentage=F("order__restaurant__restaurant__tax_percentage")
+            )
+            .select_related("food_item")
+        )
+
+    @property
+    def tax_percentage(self) -> Decimal:
+        if len(self.items) == 0 or self.items[0].order_tax_percentage is None:
+            return Decimal(0)
+        return self.items[0].order_tax_percentage
+
+    @property
+    def total_without_tax(self) -> Decimal:
+        total = Decimal(0.0)
+        for item in self.items:
+            total += item.price.total_without_tax()
+        return total
+
+    @property
+    def total_with_tax(self) -> Decimal:
+        return add_tax(self.total_without_tax, self.tax_percentage)
+
+    @property
+    def total_tax(self) -> Decimal:
+        return self.total_with_tax - self.total_without_tax
+
+    def participant_shares(self) -> Dict[int, Share]:
+        """
+        Splits the order between the users sharing its confirmed items.
+        Returns `{user_id: (general_amount, tax_amount, amount)}`, fetching the
+        shared_with graph of all items with one query.
+        """
+        if self._participant_shares is not None:
+            return self._participant_shares
+
+        items = {item.id: item for item in self.items}
+        if len(items) == 0:
+            self._participant_shares = {}
+            return self._participant_shares
+
+        shared_with = OrderItem.shared_with.through.objects.filter(
+            orderitem_id__in=list(items)
+        ).values_list("orderitem_id", "user_id")
+
+        general_amounts = {}
+        for item_id, user_id in shared_with:
+            general_amounts.setdefault(user_id, Decimal(0.0))
+            general_amounts[user_id] += items[item_id].price.shared_without_tax()
+
+        shares = {}
+        for user_id, general_amount in general_amounts.items():
+            amount = add_tax(general_amount, self.order.tax_percentage)
+            shares[user_id] = Share(
+                general_amount=general_amount,
+                tax_amount=amount - general_amount,
+                amount=amount,
+            )
+        self._participant_shares = shares
+        return shares
+
+    def participant_share(self, user_id: int) -> Share:
+        return self.participant_shares().get(
+            user_id, Share(Decimal(0.0), Decimal(0.0), Decimal(0.0))
+        )
@@ -0,0 +1,311 @@
+import logging
+import math
+import time
+from threading import local
+from typing import Iterable, Optional, Set
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.account.models import User
+from .models import (
+    Order,
+    OrderItem,
+    OrderItemAddOn,
+    OrderItemAttributeMatrix,
+    OrderParticipant,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds a websocket stays marked as connected to a room without a ping.
+ROOM_PRESENCE_TIMEOUT = 90
+
+_local = local()
+
+
+def get_room_name(order_id: int) -> str:
+    return f"order_{order_id}"
+
+
+def get_member_name(order_id: int, user_id: int) -> str:
+    """
+    Group of the websockets of one user in the room of the order.
+    """
+    return f"order_{order_id}_user_{user_id}"
+
+
+def can_join_room(order_id: int, user: User) -> bool:
+    return (
+        Order.objects.filter(id=order_id)
+        .filter(Q(restaurant=user) | Q(order_participants__user=user))
+        .exists()
+    )
+
+
+def _presence_key(order_id: int, user_id: int) -> str:
+    return f"order:room:{order_id}:{user_id}"
+
+
+def _update_presence(order_id: int, user_id: int, channel_name: str, connected: bool):
+    """
+    The presence of a user is a map of their open websockets to the time they
+    expire, so a user with several devices stays connected until the last one
+    leaves. A websocket lost by concurrent updates is back at its next ping.
+    """
+    key = _presence_key(order_id, user_id)
+    now = time.time()
+    channels = {
+        name: expires_at
+        for name, expires_at in (cache.get(key) or {}).items()
+        if expires_at > now
+    }
+    if connected:
+        channels[channel_name] = now + ROOM_PRESENCE_TIMEOUT
+    else:
+        channels.pop(channel_name, None)
+
+    if channels:
+        timeout = math.ceil(max(channels.values()) - now)
+        cache.set(key, channels, timeout=timeout)
+    else:
+        cache.delete(key)
+
+
+def mark_connected(order_id: int, user_id: int, channel_name: str):
+    _update_presence(order_id, user_id, channel_name, connected=True)
+
+
+def mark_disconnected(order_id: int, user_id: int, channel_name: str):
+    _update_presence(order_id, user_id, channel_name, connected=False)
+
+
+def get_connected_user_ids(order_id: int, user_ids: Iterable[int]) -> Set[int]:
+    """
+    Users among `user_ids` with the room of the order open, who receive its
+    changes over the websocket instead of push notifications.
+    """
+    keys = {_presence_key(order_id, user_id): user_id for user_id in user_ids}
+    if not keys:
+        return set()
+    now = time.time()
+    return {
+        keys[key]
+        for key, channels in cache.get_many(list(keys)).items()
+        if any(expires_at > now for expires_at in channels.values())
+    }
+
+
+def get_order_state(order: Order) -> dict:
+    return {
+        "id": order.id,
+        "status": order.status,
+        "confirmed": order.confirmed,
+        "has_restaurant_accepted": order.has_restaurant_accepted,
+        "payment_completed": order.payment_completed,
+        "subtotal": str(order.subtotal),
+        "tax_amount": str(order.tax_amount),
+        "total": str(order.total),
+    }
+
+
+def get_item_states(items) -> list:
+    """
+    States of an OrderItem queryset, with a fixed number of queries.
+    """
+    items = list(items)
+    item_ids = [item.id for item in items]
+
+    shared_with = {}
+    for item_id, user_id in OrderItem.shared_with.through.objects.filter(
+        orderitem_id__in=item_ids
+    ).values_list("orderitem_id", "user_id"):
+        shared_with.setdefault(item_id, []).append(user_id)
+
+    add_ons = {}
+    for item_id, add_on_id, quantity in OrderItemAddOn.objects.filter(
+        order_item_id__in=item_ids
+    ).values_list("order_item_id", "food_add_on_id", "quantity"):
+        add_ons.setdefault(item_id, []).append(
+            {"food_add_on": add_on_id, "quantity": quantity}
+        )
+
+    attribute_matrices = {}
+    for item_id, matrix_id in OrderItemAttributeMatrix.objects.filter(
+        order_item_id__in=item_ids
+    ).values_list("order_item_id", "food_attribute_matrix_id"):
+        attribute_matrices.setdefault(item_id, []).append(matrix_id)
+
+    return [
+        {
+            "id": item.id,
+            "food_item": item.food_item_id,
+            "quantity": item.quantity,
+            "status": item.status,
+            "added_by": item.added_by_id,
+            "shared_with": shared_with.get(item.id, []),
+            "add_ons": add_ons.get(item.id, []),
+            "attribute_matrices": attribute_matrices.get(item.id, []),
+        }
+        for item in items
+    ]
+
+
+def get_participant_states(participants) -> list:
+    return [
+        {
+            "id": participant.id,
+            "user": participant.user_id,
+            "user_name": participant.user.name if participant.user else None,
+            "general_amount": str(participant.general_amount),
+            "tax_amount": str(participant.tax_amount),
+            "amount": str(participant.amount),
+        }
+        for participant in participants.select_related("user")
+    ]
+
+
+def build_changes(
+    order_id: int,
+    item_ids: Optional[Iterable[int]] = (),
+    participant_ids: Optional[Iterable[int]] = (),
+    order: bool = False,
+    message_type: str = "changes",
+) -> dict:
+    """
+    Compact diff of the order: the current state of the given items and
+    participants, and the ids of the ones which no longer exist.
+    `None` includes every item or participant of the order.
+    """
+    message = {"type": message_type, "order_id": order_id}
+
+    if order:
+        instance = Order.objects.filter(id=order_id).first()
+        if instance is not None:
+            message["order"] = get_order_state(instance)
+
+    items = OrderItem.objects.filter(order_id=order_id)
+    if item_ids is None:
+        message["items"] = get_item_states(items)
+    elif item_ids:
+        item_ids = set(item_ids)
+        message["items"] = get_item_states(items.filter(id__in=item_ids))
+        message["deleted_items"] = sorted(
+            item_ids - {item["id"] for item in message["items"]}
+        )
+
+    participants = OrderParticipant.objects.filter(order_id=order_id)
+    if participant_ids is None:
+        message["participants"] = get_participant_states(participants)
+    elif participant_ids:
+        participant_ids = set(participant_ids)
+        message["participants"] = get_participant_states(
+            participants.filter(id__in=participant_ids)
+        )
+        message["deleted_participants"] = sorted(
+            participant_ids - {p["id"] for p in message["participants"]}
+        )
+
+    return message
+
+
+def _group_send(group_name: str, event: dict):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name, event)
+    except Exception:
+        # Websockets only save clients a refetch, they must not fail the change.
+        logger.exception("Could not send to %s", group_name)
+
+
+def send_to_group(group_name: str, message: dict):
+    """
+    Sends `message` to every websocket of the channel layer group, handled by
+    `group_message` of the consumers.
+    """
+    _group_send(group_name, {"type": "group.message", "message": message})
+
+
+def remove_from_room(order_id: int, user_id: int):
+    """
+    Closes the websockets of the user in the room of the order once the
+    current transaction commits, unless they may still join it.
+    """
+    transaction.on_commit(
+        lambda: _group_send(get_member_name(order_id, user_id), {"type": "room.leave"})
+    )
+
+
+def send_to_room(order_id: int, message: dict):
+    """
+    Sends `message` to every client connected to the room of the order.
+    """
+    send_to_group(get_room_name(order_id), message)
+
+
+def send_changes(order_id: int, **changes):
+    send_to_room(order_id, build_changes(order_id, **changes))
+
+
+class ChangeBatch(dict):
+    """
+    Changes of the orders made in one transaction, merged per order and sent
+    as a single message per room once it commits.
+    """
+
+    def add(
+        self,
+        order_id: int,
+        item_ids: Optional[Iterable[int]] = (),
+        participant_ids: Optional[Iterable[int]] = (),
+        order: bool = False,
+    ):
+        changes = self.setdefault(
+            order_id, {"item_ids": set(), "participant_ids": set(), "order": False}
+        )
+        for name, ids in (("item_ids", item_ids), ("participant_ids", participant_ids)):
+            # `None` stands for every item or participant.
+            if ids is None or changes[name] is None:
+                changes[name] = None
+            else:
+                changes[name].update(ids)
+        changes["order"] = changes["order"] or order
+
+    def is_pending(self) -> bool:
+        # Rolling back the transaction drops the callback, with the changes.
+        return any(func is self for _, func in connection.run_on_commit)
+
+    def __call__(self):
+        if getattr(_local, "batch", None) is self:
+            _local.batch = None
+        for order_id, changes in self.items():
+            send_changes(order_id, **changes)
+
+
+def broadcast_changes(
+    order_id: int,
+    item_ids: Optional[Iterable[int]] = (),
+    participant_ids: Optional[Iterable[int]] = (),
+    order: bool = False,
+):
+    """
+    Sends the changes to the room once the current transaction commits, see
+    `build_changes` for the arguments. Every change of an order in the same
+    transaction goes out in one message.
+    """
+    if not connection.in_atomic_block:
+        send_changes(
+            order_id, item_ids=item_ids, participant_ids=participant_ids, order=order
+        )
+        return
+
+    batch = getattr(_local, "batch", None)
+    if batch is None or not batch.is_pending():
+        batch = _local.batch = ChangeBatch()
+        transaction.on_commit(batch)
+    batch.add(order_id, item_ids=item_ids, participant_ids=participant_ids, order=order)
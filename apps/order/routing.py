@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import OrderConsumer, RestaurantBoardConsumer
+
+websocket_urlpatterns = [
+    path("ws/order/<int:order_id>/", OrderConsumer),
+    path("ws/restaurant/board/", RestaurantBoardConsumer),
+]
@@ -1,6 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, PermissionDenied
 
+from apps.account.customer.models import Misc
+from apps.account.customer.types import CustomerMiscType
+from apps.account.identity import get_profile
 from apps.account.models import User
 from apps.account.serializers import PrivateUserSerializer
 from apps.food.serializers import FoodAttributeMatrixSerializer, FoodAddOnSerializer
@@ -21,6 +25,7 @@ from .models import (
     OrderItemAddOn,
     OrderItemAttributeMatrix,
     Rating,
+    RestaurantRatingSummary,
 )
 from ..account.restaurant.models import RestaurantTable
 
@@ -65,7 +70,9 @@ class OrderInviteSerializer(serializers.ModelSerializer):
             # Accepts
             order = instance.order
             order.order_participants.create(user=current_user)
-            current_user.misc.set_new_order(order)
+            Misc.objects.filter(user=current_user).transition(
+                CustomerMiscType.IN_ORDER, order
+            )
             instance.status = OrderInviteStatusType.ACCEPTED
             instance.save()
             send_order_invitation_accept_notification.delay(
@@ -384,12 +391,18 @@ class OrderSerializer(serializers.ModelSerializer):
             "confirmed",
             "status",
             "has_restaurant_accepted",
+            "subtotal",
+            "tax_amount",
+            "total",
             "created_by",
             "created_at",
         )
         read_only_fields = (
             "id",
             "status",
+            "subtotal",
+            "tax_amount",
+            "total",
             "table_name",
             "created_by",
             "created_at",
@@ -412,9 +425,9 @@ class OrderSerializer(serializers.ModelSerializer):
             if table.is_active is False:
                 raise ValidationError({"table": ["This table is not active."]})
 
+        restaurant = get_profile(validated_data.get("restaurant"), "restaurant")
         order = Order.objects.create(
-            **validated_data,
-            tax_percentage=validated_data.get("restaurant").restaurant.tax_percentage,
+            **validated_data, tax_percentage=restaurant.tax_percentage
         )
         order.order_participants.create(user=order.created_by)
         # By default the acceptance is on for in house but pickup needs to be accepted.
@@ -424,7 +437,9 @@ class OrderSerializer(serializers.ModelSerializer):
 
         order.save()
 
-        order.created_by.misc.set_new_order(order)
+        Misc.objects.filter(user=order.created_by).transition(
+            CustomerMiscType.IN_ORDER, order
+        )
 
         return order
 
@@ -472,9 +487,11 @@ class OrderRatingSerializer(serializers.ModelSerializer):
         if order.order_participants.filter(user=user).exists() is False:
             raise PermissionDenied
 
-        instance = Rating.objects.create(**validated_data)
+        with transaction.atomic():
+            instance = Rating.objects.create(**validated_data)
+            RestaurantRatingSummary.add_rating(instance)
 
-        user.misc.set_no_order()
+        Misc.objects.filter(user=user).transition(CustomerMiscType.NO_ORDER)
 
         return instance
 
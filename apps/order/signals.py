@@ -0,0 +1,144 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.account.restaurant.models import Restaurant
+from apps.food.models import FoodAddOn, FoodItem
+from .models import (
+    Order,
+    OrderItem,
+    OrderItemAddOn,
+    OrderParticipant,
+    Rating,
+    RestaurantRatingSummary,
+)
+from .board import broadcast_board_change
+from .room import broadcast_changes, remove_from_room
+from .types import OrderItemStatusType, OrderStatusType
+
+
+def refresh_order_totals(order_id: int):
+    order = Order.objects.filter(id=order_id).first()
+    if order is not None:
+        order.refresh_totals()
+
+
+def refresh_open_orders(orders):
+    """
+    Refreshes the totals of the orders which are not invoiced yet, the
+    invoice prices the order as it is at checkout.
+    """
+    orders = (
+        orders.filter(payment_completed=False, invoice__isnull=True)
+        .exclude(status__in=(OrderStatusType.CANCELED, OrderStatusType.COMPLETED))
+        .distinct()
+    )
+    for order in orders:
+        order.refresh_totals()
+
+
+@receiver(post_save, sender=FoodItem)
+def food_item_price_changed(sender, instance: FoodItem, created, **kwargs):
+    if not created:
+        refresh_open_orders(
+            Order.objects.filter(
+                order_item_set__food_item=instance,
+                order_item_set__status=OrderItemStatusType.CONFIRMED,
+            )
+        )
+
+
+@receiver(post_save, sender=FoodAddOn)
+def food_add_on_price_changed(sender, instance: FoodAddOn, created, **kwargs):
+    if not created:
+        refresh_open_orders(
+            Order.objects.filter(
+                order_item_set__order_item_add_ons__food_add_on=instance,
+                order_item_set__status=OrderItemStatusType.CONFIRMED,
+            )
+        )
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_tax_changed(sender, instance: Restaurant, **kwargs):
+    # Orders keep a copy of the tax, so only the ones out of date are refreshed.
+    orders = Order.objects.filter(
+        restaurant_id=instance.user_id, payment_completed=False, invoice__isnull=True
+    ).exclude(tax_percentage=instance.tax_percentage)
+    order_ids = list(orders.values_list("id", flat=True))
+    if order_ids:
+        Order.objects.filter(id__in=order_ids).update(
+            tax_percentage=instance.tax_percentage
+        )
+        refresh_open_orders(Order.objects.filter(id__in=order_ids))
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance: OrderItem, **kwargs):
+    broadcast_changes(instance.order_id, item_ids=[instance.id])
+    # Only confirmed items are counted in the order totals.
+    if instance.status == OrderItemStatusType.CONFIRMED:
+        refresh_order_totals(instance.order_id)
+
+
+@receiver(post_save, sender=OrderItemAddOn)
+@receiver(post_delete, sender=OrderItemAddOn)
+def order_item_add_on_changed(sender, instance: OrderItemAddOn, **kwargs):
+    item = (
+        OrderItem.objects.filter(id=instance.order_item_id)
+        .values("order_id", "status")
+        .first()
+    )
+    if item is None:
+        return
+    broadcast_changes(item["order_id"], item_ids=[instance.order_item_id])
+    if item["status"] == OrderItemStatusType.CONFIRMED:
+        refresh_order_totals(item["order_id"])
+
+
+@receiver(m2m_changed, sender=OrderItem.shared_with.through)
+def order_item_shared_with_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if reverse is False:
+        items = OrderItem.objects.filter(id=instance.id)
+    elif pk_set is not None:
+        items = OrderItem.objects.filter(id__in=pk_set)
+    else:
+        return
+
+    changed = {}
+    for item_id, order_id, status in items.values_list("id", "order_id", "status"):
+        changed.setdefault(order_id, ([], []))[0].append(item_id)
+        if status == OrderItemStatusType.CONFIRMED:
+            changed[order_id][1].append(item_id)
+
+    for order_id, (item_ids, confirmed_item_ids) in changed.items():
+        broadcast_changes(order_id, item_ids=item_ids)
+        if confirmed_item_ids:
+            refresh_order_totals(order_id)
+
+
+@receiver(post_save, sender=OrderParticipant)
+@receiver(post_delete, sender=OrderParticipant)
+def order_participant_changed(sender, instance: OrderParticipant, **kwargs):
+    broadcast_changes(instance.order_id, participant_ids=[instance.id])
+
+
+@receiver(post_delete, sender=OrderParticipant)
+def order_participant_removed(sender, instance: OrderParticipant, **kwargs):
+    if instance.user_id is not None:
+        remove_from_room(instance.order_id, instance.user_id)
+
+
+@receiver(post_save, sender=Order)
+def order_changed(sender, instance: Order, created, **kwargs):
+    if not created:
+        broadcast_changes(instance.id, order=True)
+    broadcast_board_change(instance)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance: Rating, **kwargs):
+    RestaurantRatingSummary.remove_rating(instance)
@@ -1,14 +1,104 @@
-from django.utils import translation
+from django.utils.translation import gettext_noop
 
 from apps.account.models import User
+from apps.notification.messages import ActionTemplate, PushTemplate
 from apps.notification.models import Action
 from apps.notification.types import NotificationActionType
 from apps.order.models import Order, OrderItem
+from apps.order.room import get_connected_user_ids
 from apps.order.types import OrderType
 from conf.celery import app
-from utils.fcm import send_push_notification
-
-_ = translation.ugettext
+from utils.fcm import send_bulk_push_notification
+
+ORDER_INVITE = PushTemplate(
+    gettext_noop("{f_user.name} has sent you an invitation"),
+    gettext_noop("Tap to get started"),
+)
+ORDER_INVITATION_ACCEPTED = PushTemplate(
+    gettext_noop("{joined_user} has joined the order"),
+    gettext_noop("Tap to get started"),
+)
+ORDER_LEFT = PushTemplate(
+    gettext_noop("{left_user} has left the order"), gettext_noop("Tap to get started")
+)
+NEW_ITEM = PushTemplate(
+    gettext_noop("{added_by_name} has added a new item"), gettext_noop("Tap to see")
+)
+REMOVED_ITEM = PushTemplate(
+    gettext_noop("{removed_by_name} has removed a item"), gettext_noop("Tap to see")
+)
+ORDER_ITEM_INVITATION_ACCEPTED = PushTemplate(
+    gettext_noop("{joined_user} has accepted to share the item."),
+    gettext_noop("Tap to get started"),
+)
+NEW_TABLE_ORDER = PushTemplate(
+    gettext_noop(
+        "ORDER #{order.id} A new Table order just arrived from Table #{order.table_name}."
+    ),
+    gettext_noop("See the dashboard for details"),
+)
+NEW_PICKUP_ORDER = PushTemplate(
+    gettext_noop("ORDER #{order.id} A new Pickup order just arrived."),
+    gettext_noop("See the dashboard for details"),
+)
+UPDATE_ORDER = PushTemplate(
+    gettext_noop(
+        "A new item just added to the order #{order.id} from {order.table_name}."
+    ),
+    gettext_noop("See the dashboard for details"),
+)
+FOOD_ITEMS_CONFIRMED = PushTemplate(
+    gettext_noop("Order items has been confirmed"), gettext_noop("Tap to see more")
+)
+ORDER_WILL_BE_READY = PushTemplate(
+    "{order.restaurant.name}",
+    gettext_noop("Your order will be ready in {time} minutes."),
+)
+ORDER_IS_READY = PushTemplate(
+    "{order.restaurant.name}", gettext_noop("Your order is ready.")
+)
+ORDER_IS_DELIVERED = PushTemplate(
+    "{order.restaurant.name}", gettext_noop("Your order is delivered.")
+)
+ORDER_ITEM_EDITED = PushTemplate(
+    gettext_noop("Order has been updated"), gettext_noop("Tap to get started")
+)
+ORDER_ACCEPTED = PushTemplate(
+    "{order.restaurant.name}", gettext_noop("Your order has been accepted.")
+)
+ORDER_REJECTED = PushTemplate(
+    "{order.restaurant.name}", gettext_noop("Your order has been rejected.")
+)
+
+NEW_TABLE_ORDER_ACTION = ActionTemplate(
+    "ORDER #{order.id} A new Table order just arrived from {order.table_name}.",
+    "طلب  {order.id}  تم إنشاء طلب جديد من طاولة {order.table_id}",
+)
+NEW_PICKUP_ORDER_ACTION = ActionTemplate(
+    "ORDER #{order.id} A new Pickup order just arrived.",
+    " طلب  {order.id}تم استلام طلب خارجي جديد",
+)
+UPDATE_ORDER_ACTION = ActionTemplate(
+    "A new item just added to the order #{order.id} from {order.table_name}.",
+    "تم إضافة صنف جديد إلى طلب {order.id}  من طاولة {order.table_name}",
+)
+
+
+def get_participant_users(
+    order: Order, exclude_user: int = None, background_only: bool = False
+):
+    """
+    :param background_only: skip the users connected to the room of the order,
+    they receive the change over the websocket.
+    """
+    participants = order.order_participants.select_related("user")
+    if exclude_user is not None:
+        participants = participants.exclude(user__id=exclude_user)
+    users = [participant.user for participant in participants if participant.user]
+    if background_only:
+        connected = get_connected_user_ids(order.id, [user.id for user in users])
+        users = [user for user in users if user.id not in connected]
+    return users
 
 
 @app.task
@@ -17,13 +107,7 @@ def send_order_invite_notification(from_user: int, to_user: int, invite_id: int)
         t_user = User.objects.get(id=to_user)
         f_user = User.objects.get(id=from_user)
 
-        translation.activate(t_user.locale)
-
-        title = _(f"{f_user.name} has sent you an invitation")
-        body = _("Tap to get started")
         data = {
-            "title": title,
-            "body": body,
             "from_user_id": from_user,
             "from_user_name": f_user.name,
             "from_user_profile_picture": f_user.profile_picture.url
@@ -34,8 +118,9 @@ def send_order_invite_notification(from_user: int, to_user: int, invite_id: int)
             "notification_id": 1,
             "notification_action": "NEW_INVITATION",
         }
-        send_push_notification(t_user, title, body, data)
-        translation.deactivate()
+        send_bulk_push_notification(
+            ORDER_INVITE.build_messages([t_user], data, f_user=f_user)
+        )
 
     except User.DoesNotExist:
         pass
@@ -48,14 +133,9 @@ def send_order_item_invite_notification(
     try:
         t_user = User.objects.get(id=to_user)
         f_user = User.objects.get(id=from_user)
-        order_item = OrderItem.objects.get(id=item_id)
+        order_item = OrderItem.objects.select_related("food_item").get(id=item_id)
 
-        translation.activate(t_user.locale)
-        title = _(f"{f_user.name} has sent you an invitation")
-        body = _("Tap to get started")
         data = {
-            "title": title,
-            "body": body,
             "from_user_name": f_user.name,
             "from_user_phone_number": f_user.phone_number,
             "from_user_profile_picture": f_user.profile_picture.url
@@ -72,8 +152,9 @@ def send_order_item_invite_notification(
             "notification_id": 4,
             "notification_action": "NEW_FOOD_ITEM_INVITATION",
         }
-        send_push_notification(t_user, title, body, data)
-        translation.deactivate()
+        send_bulk_push_notification(
+            ORDER_INVITE.build_messages([t_user], data, f_user=f_user)
+        )
 
     except User.DoesNotExist:
         pass
@@ -84,22 +165,22 @@ def send_order_invitation_accept_notification(from_user: int, order_id: int):
     try:
         joined_user = User.objects.get(id=from_user).name
         order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all().exclude(user__id=from_user)
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{joined_user} has joined the order")
-            body = _("Tap to get started")
-            data = {
-                "notification_id": 2,
-                "notification_action": "INVITATION_ACCEPTED",
-                "title": title,
-                "body": body,
-                "joined_user": from_user,
-                "join_user_name": joined_user,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 2,
+            "notification_action": "INVITATION_ACCEPTED",
+            "joined_user": from_user,
+            "join_user_name": joined_user,
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_INVITATION_ACCEPTED.build_messages(
+                get_participant_users(
+                    order, exclude_user=from_user, background_only=True
+                ),
+                data,
+                joined_user=joined_user,
+            )
+        )
     except:
         pass
 
@@ -109,24 +190,20 @@ def send_order_left_push_notification(order_id: int, from_user: int):
     try:
         left_user = User.objects.get(id=from_user).name
         order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{left_user} has left the order")
-            body = _("Tap to get started")
-            data = {
-                "notification_id": 5,
-                "notification_action": "ORDER_LEFT",
-                "title": title,
-                "body": body,
-                "left_user_id": from_user,
-                "left_user_name": left_user,
-                "order_id": order_id,
-            }
-            print(f"{participant_user}: {data}")
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 5,
+            "notification_action": "ORDER_LEFT",
+            "left_user_id": from_user,
+            "left_user_name": left_user,
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_LEFT.build_messages(
+                get_participant_users(order, background_only=True),
+                data,
+                left_user=left_user,
+            )
+        )
     except:
         pass
 
@@ -138,23 +215,20 @@ def send_new_order_in_cart_notification(
     added_by_name = User.objects.get(id=added_by).name
 
     order = Order.objects.get(id=order_id)
-    notification_users = order.order_participants.all().exclude(user__id=added_by)
-
-    for participant_user in notification_users:
-        translation.activate(participant_user.user.locale)
-        title = _(f"{added_by_name} has added a new item")
-        body = _("Tap to see")
-        data = {
-            "notification_id": 3,
-            "notification_action": "NEW_ITEM",
-            "title": title,
-            "body": body,
-            "order_item_id": order_item_id,
-            "added_by_name": added_by_name,
-            "order_id": order_id,
-        }
-        send_push_notification(participant_user.user, title, body, data)
-        translation.deactivate()
+    data = {
+        "notification_id": 3,
+        "notification_action": "NEW_ITEM",
+        "order_item_id": order_item_id,
+        "added_by_name": added_by_name,
+        "order_id": order_id,
+    }
+    send_bulk_push_notification(
+        NEW_ITEM.build_messages(
+            get_participant_users(order, exclude_user=added_by, background_only=True),
+            data,
+            added_by_name=added_by_name,
+        )
+    )
 
 
 @app.task
@@ -164,22 +238,19 @@ def send_order_item_removed_notification(
     removed_by_name = User.objects.get(id=from_user).name
 
     order = Order.objects.get(id=order_id)
-    notification_users = order.order_participants.all().exclude(user__id=from_user)
-
-    for participant_user in notification_users:
-        translation.activate(participant_user.user.locale)
-        title = _(f"{removed_by_name} has removed a item")
-        body = _("Tap to see")
-        data = {
-            "notification_id": 6,
-            "notification_action": "REMOVED_ITEM",
-            "title": title,
-            "body": body,
-            "order_item_id": order_item_id,
-            "order_id": order_id,
-        }
-        send_push_notification(participant_user.user, title, body, data)
-        translation.deactivate()
+    data = {
+        "notification_id": 6,
+        "notification_action": "REMOVED_ITEM",
+        "order_item_id": order_item_id,
+        "order_id": order_id,
+    }
+    send_bulk_push_notification(
+        REMOVED_ITEM.build_messages(
+            get_participant_users(order, exclude_user=from_user, background_only=True),
+            data,
+            removed_by_name=removed_by_name,
+        )
+    )
 
 
 @app.task
@@ -189,23 +260,22 @@ def send_order_item_invitation_accept_notification(
     try:
         joined_user = User.objects.get(id=from_user).name
         order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all().exclude(user__id=from_user)
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{joined_user} has accepted to share the item.")
-            body = _("Tap to get started")
-            data = {
-                "notification_id": 7,
-                "notification_action": "FOOD_ITEM_INVITATION_ACCEPTED",
-                "title": title,
-                "body": body,
-                "joined_user": from_user,
-                "join_user_name": joined_user,
-                "order_id": order_id,
-            }
-            print(f"{participant_user}: {data}")
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 7,
+            "notification_action": "FOOD_ITEM_INVITATION_ACCEPTED",
+            "joined_user": from_user,
+            "join_user_name": joined_user,
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_ITEM_INVITATION_ACCEPTED.build_messages(
+                get_participant_users(
+                    order, exclude_user=from_user, background_only=True
+                ),
+                data,
+                joined_user=joined_user,
+            )
+        )
     except:
         pass
 
@@ -213,44 +283,32 @@ def send_order_item_invitation_accept_notification(
 @app.task
 def send_new_order_items_confirmed_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        translation.activate(order.restaurant.locale)
-        if order.order_type is OrderType.IN_HOUSE:
-            title = f"ORDER #{order.id} A new Table order just arrived from Table #{order.table_name}."
+        order = Order.objects.select_related("restaurant", "table").get(id=order_id)
+        if order.order_type == OrderType.IN_HOUSE:
+            template = NEW_TABLE_ORDER
+            action_template = NEW_TABLE_ORDER_ACTION
+            action_type = NotificationActionType.RESTAURANT_NEW_TABLE_ORDER
         else:
-            title = f"ORDER #{order.id} A new Pickup order just arrived."
+            template = NEW_PICKUP_ORDER
+            action_template = NEW_PICKUP_ORDER_ACTION
+            action_type = NotificationActionType.RESTAURANT_NEW_PICKUP_ORDER
 
-        body = _("See the dashboard for details")
         data = {
             "notification_id": 8,
             "notification_action": "NEW_ORDER",
-            "title": title,
-            "body": body,
             "order_id": order_id,
         }
-
-        if order.order_type is OrderType.IN_HOUSE:
-            message = f"ORDER #{order.id} A new Table order just arrived from {order.table_name}."
-            message_in_ar = f"طلب  {order.id} " \
-                            f" تم إنشاء طلب جديد من طاولة {order.table_id}"
-            action_type = NotificationActionType.RESTAURANT_NEW_TABLE_ORDER
-        else:
-            message = f"ORDER #{order.id} A new Pickup order just arrived."
-            message_in_ar = f" طلب  {order.id}" \
-                            f"تم استلام طلب خارجي جديد"
-            action_type = NotificationActionType.RESTAURANT_NEW_PICKUP_ORDER
+        messages = template.build_messages([order.restaurant], data, order=order)
 
         Action.objects.create(
-            message=message,
-            message_in_ar=message_in_ar,
             action_type=action_type,
             user=order.restaurant,
             sender=order.created_by,
-            extra_data=data,
+            extra_data=messages[0].data,
+            **action_template.render(order=order),
         )
 
-        send_push_notification(order.restaurant, _(title), body, data)
-        translation.deactivate()
+        send_bulk_push_notification(messages)
     except:
         pass
 
@@ -258,35 +316,21 @@ def send_new_order_items_confirmed_notification(order_id: int):
 @app.task
 def send_update_order_items_confirmed_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        translation.activate(order.restaurant.locale)
-        title = _(
-            f"A new item just added to the order #{order_id} from {order.table_name}."
-        )
-        body = _("See the dashboard for details")
+        order = Order.objects.select_related("restaurant", "table").get(id=order_id)
         data = {
             "notification_id": 9,
             "notification_action": "UPDATE_ORDER",
-            "title": title,
-            "body": body,
             "order_id": order_id,
         }
-        send_push_notification(order.restaurant, title, body, data)
-        translation.deactivate()
-
-        message = (
-            f"A new item just added to the order #{order_id} from {order.table_name}."
-        )
-        message_in_ar = f"تم إضافة صنف جديد إلى طلب {order_id}  من طاولة {order.table_name}"
-        action_type = NotificationActionType.RESTAURANT_NEW_ITEM_IN_ORDER
+        messages = UPDATE_ORDER.build_messages([order.restaurant], data, order=order)
+        send_bulk_push_notification(messages)
 
         Action.objects.create(
-            message=message,
-            message_in_ar=message_in_ar,
-            action_type=action_type,
+            action_type=NotificationActionType.RESTAURANT_NEW_ITEM_IN_ORDER,
             user=order.restaurant,
             sender=order.created_by,
-            extra_data=data,
+            extra_data=messages[0].data,
+            **UPDATE_ORDER_ACTION.render(order=order),
         )
     except:
         pass
@@ -298,20 +342,19 @@ def send_update_order_items_confirmed_customer_notification(
 ):
     try:
         order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all().exclude(user__id=from_user)
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"Order items has been confirmed")
-            body = _("Tap to see more")
-            data = {
-                "notification_id": 10,
-                "notification_action": "FOOD_ITEMS_CONFIRMED",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 10,
+            "notification_action": "FOOD_ITEMS_CONFIRMED",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            FOOD_ITEMS_CONFIRMED.build_messages(
+                get_participant_users(
+                    order, exclude_user=from_user, background_only=True
+                ),
+                data,
+            )
+        )
     except:
         pass
 
@@ -319,21 +362,20 @@ def send_update_order_items_confirmed_customer_notification(
 @app.task
 def send_order_will_be_ready_in_x_notification(order_id: int, time: int):
     try:
-        order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{order.restaurant.name}")
-            body = _(f"Your order will be ready in {time} minutes.")
-            data = {
-                "notification_id": 13,
-                "notification_action": "ORDER_WILL_BE_READY",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 13,
+            "notification_action": "ORDER_WILL_BE_READY",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_WILL_BE_READY.build_messages(
+                get_participant_users(order, background_only=True),
+                data,
+                order=order,
+                time=time,
+            )
+        )
     except:
         pass
 
@@ -341,21 +383,17 @@ def send_order_will_be_ready_in_x_notification(order_id: int, time: int):
 @app.task
 def send_order_is_ready_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{order.restaurant.name}")
-            body = _(f"Your order is ready.")
-            data = {
-                "notification_id": 14,
-                "notification_action": "ORDER_IS_READY",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 14,
+            "notification_action": "ORDER_IS_READY",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_IS_READY.build_messages(
+                get_participant_users(order), data, order=order
+            )
+        )
     except:
         pass
 
@@ -363,22 +401,18 @@ def send_order_is_ready_notification(order_id: int):
 @app.task
 def send_order_is_delivered_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{order.restaurant.name}")
-            body = _(f"Your order is delivered.")
-            data = {
-                "notification_id": 14,
-                "notification_action": "ORDER_IS_READY",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
-            # TODO: Mark order as completed if it is a pickup order.
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 14,
+            "notification_action": "ORDER_IS_READY",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_IS_DELIVERED.build_messages(
+                get_participant_users(order), data, order=order
+            )
+        )
+        # TODO: Mark order as completed if it is a pickup order.
     except:
         pass
 
@@ -388,23 +422,21 @@ def send_order_edit_notification(from_user: int, order_id: int):
     try:
         joined_user = User.objects.get(id=from_user).name
         order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all().exclude(user__id=from_user)
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"Order has been updated")
-            body = _("Tap to get started")
-            data = {
-                "notification_id": 15,
-                "notification_action": "ORDER_ITEM_EDITED",
-                "title": title,
-                "body": body,
-                "joined_user": from_user,
-                "join_user_name": joined_user,
-                "order_id": order_id,
-            }
-            print(f"{participant_user}: {data}")
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        data = {
+            "notification_id": 15,
+            "notification_action": "ORDER_ITEM_EDITED",
+            "joined_user": from_user,
+            "join_user_name": joined_user,
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_ITEM_EDITED.build_messages(
+                get_participant_users(
+                    order, exclude_user=from_user, background_only=True
+                ),
+                data,
+            )
+        )
     except:
         pass
 
@@ -412,21 +444,17 @@ def send_order_edit_notification(from_user: int, order_id: int):
 @app.task
 def send_order_accepted_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{order.restaurant.name}")
-            body = _(f"Your order has been accepted.")
-            data = {
-                "notification_id": 19,
-                "notification_action": "ORDER_ACCEPTED",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 19,
+            "notification_action": "ORDER_ACCEPTED",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_ACCEPTED.build_messages(
+                get_participant_users(order), data, order=order
+            )
+        )
     except:
         pass
 
@@ -434,20 +462,16 @@ def send_order_accepted_notification(order_id: int):
 @app.task
 def send_order_rejected_notification(order_id: int):
     try:
-        order = Order.objects.get(id=order_id)
-        notification_users = order.order_participants.all()
-        for participant_user in notification_users:
-            translation.activate(participant_user.user.locale)
-            title = _(f"{order.restaurant.name}")
-            body = _(f"Your order has been rejected.")
-            data = {
-                "notification_id": 18,
-                "notification_action": "ORDER_REJECTED",
-                "title": title,
-                "body": body,
-                "order_id": order_id,
-            }
-            send_push_notification(participant_user.user, title, body, data)
-            translation.deactivate()
+        order = Order.objects.select_related("restaurant").get(id=order_id)
+        data = {
+            "notification_id": 18,
+            "notification_action": "ORDER_REJECTED",
+            "order_id": order_id,
+        }
+        send_bulk_push_notification(
+            ORDER_REJECTED.build_messages(
+                get_participant_users(order), data, order=order
+            )
+        )
     except:
         pass
@@ -1,19 +1,50 @@
 import json
+from decimal import Decimal
+from io import StringIO
 
 import pytest
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
 from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import transaction
 from fcm_django.models import FCMDevice
 from mixer.backend.django import mixer
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
 
-from apps.account.customer.models import Customer
-from apps.account.restaurant.models import Restaurant
+from apps.account.customer.models import Customer, Misc
+from apps.account.customer.types import CustomerMiscType
+from apps.account.identity import get_profile, identity_map
+from apps.account.restaurant.earnings import completed_order_count
+from apps.account.restaurant.models import DailyEarning, EarningEntry, Restaurant
 from apps.food.models import FoodAddOn, FoodItem, FoodAttributeMatrix
-from apps.order.models import Order
+from apps.notification.messages import translate
+from apps.order.board import BOARD_MAX_DELTAS
+from apps.order.models import Order, OrderItem, RestaurantRatingSummary
+from apps.order.room import get_connected_user_ids
+from conf.routing import application
+from utils.fcm import PushMessage, send_bulk_push_notification
+from utils.testing import assert_max_queries
+from ..invoice.types import PaymentStatus
+from ..invoice.utils import process_new_completed_order_earning
 from ..invoice.views import InvoiceViewSet
+from ..tasks import (
+    NEW_PICKUP_ORDER,
+    NEW_TABLE_ORDER,
+    NEW_TABLE_ORDER_ACTION,
+    ORDER_INVITATION_ACCEPTED,
+    UPDATE_ORDER,
+    get_participant_users,
+)
 from ..types import OrderType, OrderStatusType, OrderItemStatusType
-from ..views import OrderViewSet, OrderInviteViewSet, OrderItemViewSet
+from ..views import (
+    OrderViewSet,
+    OrderInviteViewSet,
+    OrderItemViewSet,
+    OrderRatingViewSet,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -274,3 +305,527 @@ class TestOrder(TOrderFixtures):
         assert (
             response.status_code == status.HTTP_201_CREATED
         ), "Should send delivered notification"
+
+
+class TestMiscTransition(TOrderFixtures):
+    def test_transition_order(self, order, customer, other_customer):
+        order.order_participants.create(user=other_customer.user)
+        outsider = mixer.blend("customer.Misc", state=CustomerMiscType.NO_ORDER)
+
+        with assert_max_queries(1):
+            updated = Misc.objects.transition_order(order, CustomerMiscType.IN_ORDER)
+        assert updated == 2
+        for user in (customer.user, other_customer.user):
+            misc = Misc.objects.get(user=user)
+            assert misc.state == CustomerMiscType.IN_ORDER
+            assert misc.last_order == order
+        outsider.refresh_from_db()
+        assert outsider.state == CustomerMiscType.NO_ORDER
+
+        Misc.objects.transition_order(order.id, CustomerMiscType.IN_CHECKOUT)
+        Misc.objects.transition_order(order.id, CustomerMiscType.IN_RATING)
+        misc = Misc.objects.get(user=customer.user)
+        assert misc.state == CustomerMiscType.IN_RATING
+        assert misc.last_order_in_rating is True
+        assert misc.last_order_in_checkout is False
+        assert misc.last_order == order
+
+        Misc.objects.transition_order(order, CustomerMiscType.NO_ORDER)
+        misc.refresh_from_db()
+        assert misc.state == CustomerMiscType.NO_ORDER
+        assert misc.last_order is None
+
+        with identity_map():
+            cached = get_profile(customer.user, "misc")
+            Misc.objects.filter(user=customer.user).transition(
+                CustomerMiscType.IN_ORDER, order
+            )
+            assert get_profile(customer.user, "misc") is cached
+            assert cached.state == CustomerMiscType.IN_ORDER
+            assert cached.last_order == order
+
+
+@pytest.mark.django_db(transaction=True)
+class TestOrderRoom(TOrderFixtures):
+    def connect(self, order, user):
+        communicator = WebsocketCommunicator(
+            application, f"/ws/order/{order.id}/?token={AccessToken.for_user(user)}"
+        )
+        connected, _ = async_to_sync(communicator.connect)()
+        return connected, communicator
+
+    def test_order_room(self, customer, other_customer, order, food):
+        connected, communicator = self.connect(order, customer.user)
+        assert connected
+        sync = async_to_sync(communicator.receive_json_from)()
+        assert sync["type"] == "sync"
+        assert sync["order"]["id"] == order.id
+        assert [p["user"] for p in sync["participants"]] == [customer.user.id]
+
+        user_ids = [customer.user.id, other_customer.user.id]
+        assert get_connected_user_ids(order.id, user_ids) == {customer.user.id}
+        assert get_participant_users(order, background_only=True) == []
+
+        item = OrderItem.objects.create(
+            order=order, food_item=food, added_by=customer.user
+        )
+        changes = async_to_sync(communicator.receive_json_from)()
+        assert changes["type"] == "changes"
+        assert [i["id"] for i in changes["items"]] == [item.id]
+        assert changes["deleted_items"] == []
+
+        item_id = item.id
+        item.delete()
+        changes = async_to_sync(communicator.receive_json_from)()
+        assert changes["items"] == []
+        assert changes["deleted_items"] == [item_id]
+
+        # The changes of one transaction are sent in one message.
+        with transaction.atomic():
+            items = [
+                OrderItem.objects.create(
+                    order=order, food_item=food, added_by=customer.user
+                )
+                for _ in range(2)
+            ]
+            order.refresh_totals()
+        changes = async_to_sync(communicator.receive_json_from)()
+        assert sorted(i["id"] for i in changes["items"]) == [i.id for i in items]
+        assert changes["order"]["id"] == order.id
+        assert async_to_sync(communicator.receive_nothing)() is True
+
+        # The user stays connected until their last device leaves.
+        connected, other_device = self.connect(order, customer.user)
+        assert connected
+        async_to_sync(communicator.disconnect)()
+        assert get_connected_user_ids(order.id, user_ids) == {customer.user.id}
+
+        async_to_sync(other_device.disconnect)()
+        assert get_connected_user_ids(order.id, user_ids) == set()
+
+    def test_outsider_is_rejected(self, order, other_customer):
+        connected, communicator = self.connect(order, other_customer.user)
+        assert connected is False
+
+    def test_removed_participant_is_disconnected(self, order, other_customer):
+        participant = order.order_participants.create(user=other_customer.user)
+        connected, communicator = self.connect(order, other_customer.user)
+        assert connected
+        async_to_sync(communicator.receive_json_from)()
+
+        participant.delete()
+        changes = async_to_sync(communicator.receive_json_from)()
+        assert changes["deleted_participants"] == [participant.id]
+        output = async_to_sync(communicator.receive_output)()
+        assert output["type"] == "websocket.close"
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRestaurantBoard(TOrderFixtures):
+    def get_board(self, restaurant, **params):
+        factory = APIRequestFactory()
+        request = factory.get("/", data=params)
+        force_authenticate(request, restaurant.user)
+        response = OrderViewSet.as_view({"get": "board"})(request)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def test_board(self, restaurant, order):
+        order.status = OrderStatusType.OPEN
+        order.confirmed = True
+        order.save()
+
+        board = self.get_board(restaurant)
+        assert board["type"] == "snapshot"
+        assert [o["id"] for o in board["orders"]] == [order.id]
+        cursor = board["cursor"]
+
+        board = self.get_board(restaurant, cursor=cursor)
+        assert board == {"type": "deltas", "cursor": cursor, "deltas": []}
+
+        order.has_restaurant_accepted = True
+        order.save()
+        order.status = OrderStatusType.COMPLETED
+        order.save()
+        board = self.get_board(restaurant, cursor=cursor)
+        assert board["type"] == "deltas"
+        assert board["cursor"] == cursor + 2
+        assert board["deltas"][0]["order"]["has_restaurant_accepted"] is True
+        assert board["deltas"][1] == {"cursor": cursor + 2, "removed": order.id}
+
+        # Too far behind, the client gets the whole board again.
+        board = self.get_board(restaurant, cursor=cursor - BOARD_MAX_DELTAS)
+        assert board["type"] == "snapshot"
+        assert board["orders"] == []
+
+
+class TestOrderQueryBudget(TOrderFixtures):
+    @pytest.fixture
+    def orders(self, customer, other_customer, restaurant, food, addon):
+        for _ in range(3):
+            order = mixer.blend(
+                "order.Order", created_by=customer.user, restaurant=restaurant.user
+            )
+            order.order_participants.create(user=customer.user)
+            order.order_participants.create(user=other_customer.user)
+            for _ in range(2):
+                order_item = mixer.blend(
+                    "order.OrderItem",
+                    order=order,
+                    food_item=food,
+                    shared_with=[customer.user, other_customer.user],
+                )
+                mixer.blend(
+                    "order.OrderItemAddOn", order_item=order_item, food_add_on=addon
+                )
+
+    def test_order_list_queries(self, customer, orders):
+        factory = APIRequestFactory()
+        request = factory.get("/")
+        force_authenticate(request, customer.user)
+        # The page count, the orders, their participants and their items.
+        with assert_max_queries(5):
+            response = OrderViewSet.as_view({"get": "list"})(request)
+            response.render()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 3
+        assert len(response.data["results"]) == 3, "Should list every order"
+
+    def test_order_item_list_queries(self, customer, orders):
+        factory = APIRequestFactory()
+        request = factory.get("/")
+        force_authenticate(request, customer.user)
+        with assert_max_queries(6):
+            response = OrderItemViewSet.as_view({"get": "list"})(request)
+            response.render()
+        assert response.status_code == status.HTTP_200_OK
+
+
+class TestPushNotification(TOrderFixtures):
+    def test_bulk_push_notification(self, monkeypatch, customer, other_customer):
+        FCMDevice.objects.create(
+            registration_id="android-token",
+            active=True,
+            type="android",
+            user=customer.user,
+        )
+        sent = []
+
+        def fcm_send(registration_ids, **kwargs):
+            sent.append(registration_ids)
+            return {"results": [{"error": "NotRegistered"} for _ in registration_ids]}
+
+        monkeypatch.setattr("utils.fcm.fcm_send_bulk_message", fcm_send)
+        monkeypatch.setattr("utils.fcm.fcm_send_bulk_data_messages", fcm_send)
+
+        messages = [
+            PushMessage(customer.user, "Title", "Body", {"order_id": 1}),
+            PushMessage(other_customer.user, "Title", "Body", {"order_id": 1}),
+        ]
+        with assert_max_queries(2):
+            failures = send_bulk_push_notification(messages)
+
+        assert len(sent) == 2, "Should send one request per platform and payload"
+        assert len(failures) == 3, "Should report every failed token"
+        assert (
+            FCMDevice.objects.filter(active=True).count() == 0
+        ), "Should drop devices with invalid tokens"
+
+    def test_messages_are_rendered_once_per_locale(
+        self, customer, other_customer, order
+    ):
+        customer.user.locale = "ar"
+        other_customer.user.locale = "en"
+        translate.cache_clear()
+
+        messages = ORDER_INVITATION_ACCEPTED.build_messages(
+            [customer.user, other_customer.user, customer.user],
+            {"order_id": order.id},
+            joined_user="Ali",
+        )
+
+        assert len(messages) == 3
+        assert (
+            translate.cache_info().misses == 4
+        ), "Should translate title and body once per locale"
+        assert messages[0].data is messages[2].data
+        assert messages[1].title == "Ali has joined the order"
+        assert messages[1].data["title"] == messages[1].title
+
+    @pytest.mark.parametrize(
+        "template", [NEW_TABLE_ORDER, NEW_PICKUP_ORDER, UPDATE_ORDER]
+    )
+    def test_restaurant_messages_are_translated(self, template):
+        assert translate(template.title, "ar") != template.title
+        assert translate(template.body, "ar") != template.body
+
+    def test_action_messages(self, order):
+        messages = NEW_TABLE_ORDER_ACTION.render(order=order)
+        assert messages["message"] == (
+            f"ORDER #{order.id} A new Table order just arrived from {order.table_name}."
+        )
+        assert str(order.id) in messages["message_in_ar"]
+
+
+class TestOrderPricing(TOrderFixtures):
+    def test_order_and_item_totals(
+        self, restaurant, order, customer, other_customer, food, addon
+    ):
+        restaurant.tax_percentage = Decimal("15.00")
+        restaurant.save()
+        food.price = Decimal("10.000")
+        food.save()
+        addon.price = Decimal("2.500")
+        addon.save()
+
+        order_item = mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=2,
+            order=order,
+            shared_with=[customer.user, other_customer.user],
+            status=OrderItemStatusType.CONFIRMED,
+        )
+        mixer.blend(
+            "order.OrderItemAddOn", order_item=order_item, food_add_on=addon, quantity=2
+        )
+        mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=5,
+            order=order,
+            status=OrderItemStatusType.UNCONFIRMED,
+        )
+
+        assert order_item.total_price_without_tax() == Decimal("30.000")
+        assert order_item.total_price_with_tax() == Decimal("34.500")
+        assert order_item.shared_price_without_tax() == Decimal("15.000")
+
+        order.refresh_from_db()
+        assert order.total_price_without_tax() == Decimal(
+            "30.000"
+        ), "Should only count confirmed items"
+        assert order.total_tax_amount() == Decimal("4.500")
+        assert order.total_price_with_tax() == Decimal("34.500")
+
+    def test_participant_shares(
+        self, restaurant, order, customer, other_customer, food
+    ):
+        order.tax_percentage = Decimal("10.00")
+        order.save()
+        food.price = Decimal("20.000")
+        food.save()
+
+        mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=1,
+            order=order,
+            shared_with=[customer.user, other_customer.user],
+            status=OrderItemStatusType.CONFIRMED,
+        )
+        mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=1,
+            order=order,
+            shared_with=[customer.user],
+            status=OrderItemStatusType.CONFIRMED,
+        )
+
+        shares = order.get_pricing().participant_shares()
+        assert shares[customer.user.id] == (
+            Decimal("30.000"),
+            Decimal("3.000"),
+            Decimal("33.000"),
+        )
+        assert shares[other_customer.user.id].amount == Decimal("11.000")
+        assert order.shared_price_with_tax(customer.user) == Decimal("33.000")
+
+    def test_totals_follow_item_changes(self, order, customer, other_customer, food):
+        order.tax_percentage = Decimal("10.00")
+        order.save()
+        food.price = Decimal("20.000")
+        food.save()
+
+        order_item = mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=1,
+            order=order,
+            shared_with=[customer.user, other_customer.user],
+            status=OrderItemStatusType.CONFIRMED,
+        )
+        order.refresh_from_db()
+        assert order.subtotal == Decimal("20.000")
+
+        order_item.shared_with.remove(other_customer.user)
+        participant = order.order_participants.get(user=customer.user)
+        assert participant.amount == Decimal(
+            "22.000"
+        ), "Share should be updated when the item is no longer shared"
+
+        order_item.delete()
+        order.refresh_from_db()
+        assert order.total == Decimal("0.000")
+
+        Order.objects.filter(id=order.id).update(total=Decimal("99.000"))
+        call_command("rebuild_order_totals", order.id, stdout=StringIO())
+        order.refresh_from_db()
+        assert order.total == Decimal("0.000"), "Stale totals should be rebuilt"
+
+    def test_totals_follow_menu_changes(self, order, customer, restaurant, food):
+        order.status = OrderStatusType.OPEN
+        order.payment_completed = False
+        order.save()
+        food.price = Decimal("20.000")
+        food.save()
+        mixer.blend(
+            "order.OrderItem",
+            food_item=food,
+            quantity=1,
+            order=order,
+            shared_with=[customer.user],
+            status=OrderItemStatusType.CONFIRMED,
+        )
+
+        food.price = Decimal("30.000")
+        food.save()
+        order.refresh_from_db()
+        assert order.subtotal == Decimal("30.000")
+
+        restaurant.tax_percentage = Decimal("10.00")
+        restaurant.save()
+        order.refresh_from_db()
+        assert order.tax_percentage == Decimal("10.00")
+        assert order.total == Decimal("33.000")
+        participant = order.order_participants.get(user=customer.user)
+        assert participant.amount == Decimal("33.000")
+
+
+class TestRating(TOrderFixtures):
+    def test_rating_summary(self, restaurant, customer, order):
+        order.status = OrderStatusType.CHECKOUT
+        order.save()
+
+        factory = APIRequestFactory()
+        request = factory.post(
+            "/",
+            data={
+                "order": order.id,
+                "restaurant": restaurant.user.id,
+                "food_item_rating": 5,
+                "restaurant_rating": 4,
+                "customer_service_rating": 3,
+                "application_rating": 4,
+            },
+        )
+        force_authenticate(request, customer.user)
+        response = OrderRatingViewSet.as_view({"post": "create"})(request)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        summary = RestaurantRatingSummary.objects.get(restaurant=restaurant.user)
+        assert summary.rating_count == 1
+        assert restaurant.rating() == Decimal(
+            "4"
+        ), "Should read the average from the summary"
+
+        RestaurantRatingSummary.objects.all().delete()
+        call_command("rebuild_rating_summaries", stdout=StringIO())
+        restaurant.user.refresh_from_db()
+        assert RestaurantRatingSummary.objects.get(
+            restaurant=restaurant.user
+        ).average_rating() == Decimal("4")
+
+        restaurant_id = restaurant.user.id
+        restaurant.user.delete()
+        assert not RestaurantRatingSummary.objects.filter(
+            restaurant_id=restaurant_id
+        ).exists(), "Deleting the ratings should not recreate the summary"
+
+
+class TestRestaurantEarning(TOrderFixtures):
+    def test_earnings(self, restaurant, customer, order):
+        order.order_type = OrderType.IN_HOUSE
+        order.status = OrderStatusType.COMPLETED
+        order.save()
+        invoice = mixer.blend("invoice.Invoice", order=order, order_cut=Decimal("10"))
+        mixer.blend(
+            "invoice.Transaction",
+            order=order,
+            user=customer.user,
+            amount=Decimal("100.000"),
+            transaction_status=PaymentStatus.SUCCESSFUL,
+        )
+        mixer.blend(
+            "invoice.InvoiceItem",
+            invoice=invoice,
+            user=customer.user,
+            amount=Decimal("100.000"),
+        )
+
+        assert restaurant.get_inhouse_earning() == Decimal("10")
+        assert restaurant.get_pickup_earning() == Decimal("0")
+
+        assert restaurant.get_total_order_amount() == Decimal("100")
+
+        with assert_max_queries(1):
+            annotated = Restaurant.objects.annotate(
+                completed_order_count=completed_order_count()
+            ).get(id=restaurant.id)
+            assert annotated.total_orders() == 1
+
+    def test_daily_earning(self, restaurant, customer, order):
+        order.order_type = OrderType.IN_HOUSE
+        order.status = OrderStatusType.COMPLETED
+        order.save()
+        invoice = mixer.blend("invoice.Invoice", order=order, order_cut=Decimal("10"))
+        mixer.blend(
+            "invoice.InvoiceItem",
+            invoice=invoice,
+            user=customer.user,
+            amount=Decimal("100.000"),
+        )
+
+        process_new_completed_order_earning(order)
+        # Already processed orders are not counted twice.
+        process_new_completed_order_earning(order)
+
+        daily = DailyEarning.objects.get(restaurant=restaurant)
+        assert daily.order_type == OrderType.IN_HOUSE
+        assert daily.order_count == 1
+        assert daily.total == Decimal("100")
+        assert daily.app_earning == Decimal("10")
+        assert daily.restaurant_earning == Decimal("90")
+
+        DailyEarning.objects.all().delete()
+        call_command("rebuild_daily_earnings", stdout=StringIO())
+        assert DailyEarning.objects.get(restaurant=restaurant).order_count == 1
+
+    def test_earning_ledger(self, restaurant, customer, order):
+        order.order_type = OrderType.PICK_UP
+        order.save()
+        invoice = mixer.blend("invoice.Invoice", order=order, order_cut=Decimal("10"))
+        mixer.blend(
+            "invoice.InvoiceItem",
+            invoice=invoice,
+            user=customer.user,
+            amount=Decimal("50.000"),
+        )
+
+        process_new_completed_order_earning(order)
+        # A stale instance does not overwrite the earnings when saved.
+        restaurant.online = True
+        restaurant.save()
+
+        restaurant.refresh_from_db()
+        assert restaurant.pickup_earning == Decimal("45")
+        assert restaurant.app_pickup_earning == Decimal("5")
+        assert restaurant.total == Decimal("50")
+        assert EarningEntry.objects.get().invoice == invoice
+
+        Restaurant.objects.update(pickup_earning=0, total=0)
+        call_command("rebuild_restaurant_earnings", stdout=StringIO())
+        restaurant.refresh_from_db()
+        assert restaurant.pickup_earning == Decimal("45")
+        assert restaurant.total == Decimal("50")
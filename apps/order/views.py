@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status
 from rest_framework.decorators import action
@@ -5,9 +7,11 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from apps.account.customer.models import Misc
+from apps.account.identity import get_profile
 from apps.account.models import User
 from apps.account.types import ProfileType
-from apps.order.invoice.models import InvoiceItem, Transaction
+from apps.order.invoice.models import InvoiceItem
 from apps.order.tasks import (
     send_order_invite_notification,
     send_order_left_push_notification,
@@ -28,16 +32,22 @@ from apps.order.types import (
     OrderType,
 )
 from .filters import OrderFilter, OrderItemFilter, OrderParticipantFilter
-from .invoice.types import PaymentStatus
-from .invoice.utils import capture_transaction, process_new_completed_order_earning
+from .invoice.capture import start_capture
+from .invoice.tasks import capture_order_payments
+from .invoice.utils import process_new_completed_order_earning
 from .models import (
     OrderInvite,
     Order,
     OrderItem,
+    OrderItemAddOn,
+    OrderItemAttributeMatrix,
     OrderItemInvite,
     OrderParticipant,
     Rating,
 )
+from .pricing import annotate_item_prices
+from .board import board_orders, get_board, parse_cursor
+from .room import broadcast_changes, send_to_room
 from .serializers import (
     OrderInviteSerializer,
     OrderSerializer,
@@ -102,7 +112,7 @@ class OrderInviteViewSet(
             except User.DoesNotExist:
                 continue
 
-            if user.misc.state != CustomerMiscType.NO_ORDER:
+            if get_profile(user, "misc").state != CustomerMiscType.NO_ORDER:
                 return Response(
                     {"non_field_error": ["The user is in another order."]},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -208,14 +218,21 @@ class OrderViewSet(
                 order_participants__user=current_user
             ).distinct("id")
         elif current_user.profile_type == ProfileType.RESTAURANT:
-            queryset = (
-                Order.objects.filter(restaurant=current_user, confirmed=True)
-                .exclude(status=OrderStatusType.CANCELED)
-                .exclude(status=OrderStatusType.COMPLETED)
-            )
+            queryset = board_orders(current_user.id)
         else:
             queryset = Order.objects.all()
 
+        if self.action in ("list", "retrieve"):
+            # Everything OrderSerializer walks for each order.
+            queryset = queryset.select_related("table").prefetch_related(
+                Prefetch(
+                    "order_participants",
+                    queryset=OrderParticipant.objects.select_related("user"),
+                ),
+                Prefetch(
+                    "order_item_set", queryset=OrderItem.objects.only("id", "order")
+                ),
+            )
         return queryset
 
     def perform_create(self, serializer):
@@ -236,7 +253,7 @@ class OrderViewSet(
         ):
             OrderParticipant.objects.filter(order=order, user=request.user).delete()
 
-            request.user.misc.set_no_order()
+            Misc.objects.filter(user=request.user).transition(CustomerMiscType.NO_ORDER)
 
             if order.order_participants.all().count() == 0:
                 order.status = OrderStatusType.CANCELED
@@ -261,11 +278,20 @@ class OrderViewSet(
 
         order: Order = self.get_object()
 
-        order_items = order.order_item_set.filter(
-            status=OrderItemStatusType.UNCONFIRMED
+        item_ids = list(
+            order.order_item_set.filter(
+                status=OrderItemStatusType.UNCONFIRMED
+            ).values_list("id", flat=True)
         )
-        if order_items.count() > 0:
-            order_items.update(status=OrderItemStatusType.CONFIRMED)
+        if len(item_ids) > 0:
+            # `update` does not send signals, so refresh the totals and
+            # broadcast the items here, in one message.
+            with transaction.atomic():
+                OrderItem.objects.filter(id__in=item_ids).update(
+                    status=OrderItemStatusType.CONFIRMED
+                )
+                order.refresh_totals()
+                broadcast_changes(order.id, item_ids=item_ids)
             send_update_order_items_confirmed_customer_notification.delay(
                 from_user=request.user.id, order_id=order.id
             )
@@ -297,6 +323,21 @@ class OrderViewSet(
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(detail=False, methods=["GET"])
+    def board(self, request):
+        """
+        Open orders of the restaurant. Pass the `cursor` of the last response
+        to only get the `deltas` since then, a `snapshot` of the orders is
+        returned when they are no longer available.
+        The websocket at `ws/restaurant/board/` pushes the deltas as they
+        happen.
+        """
+        if request.user.profile_type != ProfileType.RESTAURANT:
+            raise PermissionDenied
+        return Response(
+            get_board(request.user.id, parse_cursor(request.query_params.get("cursor")))
+        )
+
     @action(detail=True, methods=["POST"])
     def send_order_is_ready_in_x_notification(self, request, pk):
         order: Order = self.get_object()
@@ -304,9 +345,9 @@ class OrderViewSet(
             raise PermissionDenied
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        send_order_will_be_ready_in_x_notification.delay(
-            order_id=order.id, time=serializer.validated_data.get("time")
-        )
+        time = serializer.validated_data.get("time")
+        send_to_room(order.id, {"type": "ready_in", "order_id": order.id, "time": time})
+        send_order_will_be_ready_in_x_notification.delay(order_id=order.id, time=time)
         return Response({"status": "success"}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=["POST"])
@@ -345,23 +386,14 @@ class OrderViewSet(
             if order.has_restaurant_accepted is False:
                 if serializer.validated_data.get("sure") is True:
 
-                    transactions = Transaction.objects.filter(
-                        order=order, transaction_status=PaymentStatus.AUTHORIZED
-                    )
-                    for t in transactions:
-                        result = capture_transaction(
-                            t.pt_transaction_id, amount=t.amount
-                        )
-                        print(f"Transaction capture result: {result}")
-                        t.transaction_status = PaymentStatus.SUCCESSFUL
-                        t.save()
+                    start_capture(order)
                     order.has_restaurant_accepted = True
                     order.save()
+                    capture_order_payments.delay(order_id=order.id)
                     send_order_accepted_notification.delay(order_id=order.id)
                 else:
                     order.status = OrderStatusType.CANCELED
-                    for participant in order.order_participants.all():
-                        participant.user.misc.set_no_order()
+                    Misc.objects.transition_order(order, CustomerMiscType.NO_ORDER)
                     order.save()
                     send_order_rejected_notification.delay(order_id=order.id)
 
@@ -389,27 +421,19 @@ class OrderViewSet(
         if order.restaurant != request.user:
             raise PermissionDenied
         response = []
-        participants = order.order_participants.all()
-        for participant in participants:
-            ordered_items = OrderItem.objects.filter(
-                order=order,
-                shared_with=participant.user,
-                status=OrderItemStatusType.CONFIRMED,
+        shares = order.get_pricing().participant_shares()
+
+        paid_users = {}
+        if order.status in [OrderStatusType.CHECKOUT, OrderStatusType.COMPLETED]:
+            paid_users = dict(
+                InvoiceItem.objects.filter(invoice__order=order).values_list(
+                    "user_id", "paid"
+                )
             )
-            if ordered_items.count() > 0:
-                has_paid = False
-                if order.status in [
-                    OrderStatusType.CHECKOUT,
-                    OrderStatusType.COMPLETED,
-                ]:
-                    try:
-                        invoice_item = InvoiceItem.objects.get(
-                            order=order, user=participant.user
-                        )
-                        has_paid = invoice_item.paid
-                    except InvoiceItem.DoesNotExist:
-                        has_paid = False
 
+        participants = order.order_participants.select_related("user")
+        for participant in participants:
+            if participant.user_id in shares:
                 response.append(
                     {
                         "user": {
@@ -419,8 +443,8 @@ class OrderViewSet(
                             if participant.user.profile_picture
                             else None,
                         },
-                        "amount": order.shared_price_with_tax(participant.user),
-                        "has_paid": has_paid,
+                        "amount": shares[participant.user_id].amount,
+                        "has_paid": paid_users.get(participant.user_id, False),
                     }
                 )
         return Response(response, status=status.HTTP_200_OK)
@@ -451,6 +475,25 @@ class OrderItemViewSet(ModelViewSet):
         else:
             queryset = OrderItem.objects.all()
 
+        if self.action in ("list", "retrieve"):
+            # Everything OrderItemSerializer walks for each item.
+            queryset = (
+                annotate_item_prices(queryset)
+                .select_related("food_item")
+                .prefetch_related(
+                    Prefetch(
+                        "order_item_add_ons",
+                        queryset=OrderItemAddOn.objects.select_related("food_add_on"),
+                    ),
+                    Prefetch(
+                        "order_item_attribute_matrices",
+                        queryset=OrderItemAttributeMatrix.objects.select_related(
+                            "food_attribute_matrix__attribute"
+                        ),
+                    ),
+                    "shared_with",
+                )
+            )
         return queryset
 
     def perform_create(self, serializer):
@@ -491,7 +534,7 @@ class OrderParticipantViewSet(mixins.ListModelMixin, GenericViewSet):
 
     def get_queryset(self):
         order = Order.objects.filter(order_participants__user=self.request.user)
-        return OrderParticipant.objects.filter(order__in=order)
+        return OrderParticipant.objects.filter(order__in=order).select_related("user")
 
 
 class OrderRatingViewSet(GenericViewSet, mixins.CreateModelMixin):
@@ -0,0 +1,18 @@
+"""
+ASGI config for conf project, serving both http and the websockets.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://channels.readthedocs.io/en/2.x/deploying.html
+"""
+
+import os
+
+import django
+from channels.routing import get_default_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "conf.settings")
+django.setup()
+
+application = get_default_application()
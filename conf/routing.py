@@ -0,0 +1,5 @@
+from channels.routing import ProtocolTypeRouter, URLRouter
+
+from apps.order.routing import websocket_urlpatterns as order_websocket_urls
+
+application = ProtocolTypeRouter({"websocket": URLRouter(order_websocket_urls)})
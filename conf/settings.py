@@ -38,6 +38,7 @@ DJANGO_APPS = [
 ]
 
 THIRD_PARTY_APPS = [
+    "channels",
     "corsheaders",
     "rest_framework",
     "rest_framework_simplejwt",
@@ -75,6 +76,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.account.middleware.IdentityMapMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -138,7 +140,7 @@ LOCALE_PATHS = (os.path.join(BASE_DIR, "locale"),)
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.account.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ),
@@ -165,6 +167,10 @@ AWS_DEFAULT_ACL = "public-read"
 PAYTABS_SECRET_KEY = env.str("PAYTABS_SECRET_KEY", default="")
 PAYTABS_MERCHANT_EMAIL = env.str("PAYTABS_MERCHANT_EMAIL", default="")
 PAYTABS_VERIFY_PAYMENT_URL = "https://www.paytabs.com/apiv2/verify_payment_transaction"
+PAYTABS_CAPTURE_URL = "https://www.paytabs.com/apiv3/release_capture_preauth"
+PAYTABS_SUCCESS_CODES = env.list("PAYTABS_SUCCESS_CODES", default=["100"])
+PAYTABS_TIMEOUT = env.float("PAYTABS_TIMEOUT", default=10)
+PAYTABS_MAX_RETRIES = env.int("PAYTABS_MAX_RETRIES", default=3)
 
 if DEBUG is False:
     STATIC_URL = "https://%s/%s/" % (AWS_S3_ENDPOINT_URL, AWS_LOCATION)
@@ -221,6 +227,15 @@ CELERY_TIMEZONE = TIME_ZONE
 BROKER_POOL_LIMIT = 1
 BROKER_TRANSPORT_OPTIONS = {"max_connections": 2}
 
+# Websockets, see conf.routing
+ASGI_APPLICATION = "conf.routing.application"
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {"hosts": [env.str("REDIS_URL")]},
+    }
+}
+
 if DEBUG is False:
     UNIT_TESTING = False
     sentry_sdk.init(
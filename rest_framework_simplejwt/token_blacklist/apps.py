@@ -5,3 +5,6 @@ from django.utils.translation import ugettext_lazy as _
 class TokenBlacklistConfig(AppConfig):
     name = "rest_framework_simplejwt.token_blacklist"
     verbose_name = _("Token Blacklist")
+
+    def ready(self):
+        import rest_framework_simplejwt.token_blacklist.signals
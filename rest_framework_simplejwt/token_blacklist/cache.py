@@ -0,0 +1,50 @@
+from django.core.cache import cache
+
+from ..utils import aware_utcnow
+from .models import BlacklistedToken
+
+
+def _key(jti: str) -> str:
+    return "token_blacklist:{}".format(jti)
+
+
+def _timeout(expires_at):
+    # Expired tokens fail verification anyway, so their entries are not needed
+    # once the token expires.
+    return int((expires_at - aware_utcnow()).total_seconds())
+
+
+def _is_blacklisted_in_db(jti: str) -> bool:
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def is_blacklisted(jti: str, expires_at) -> bool:
+    """
+    Checks the token blacklist through the cache. The database stays the
+    source of truth: unknown tokens and cached hits are confirmed against it,
+    only tokens known not to be blacklisted skip the query.
+    """
+    key = _key(jti)
+    blacklisted = cache.get(key)
+    if blacklisted is False:
+        return False
+
+    blacklisted = _is_blacklisted_in_db(jti)
+    timeout = _timeout(expires_at)
+    if timeout > 0:
+        if blacklisted:
+            cache.set(key, True, timeout=timeout)
+        elif not cache.add(key, False, timeout=timeout):
+            # The token was blacklisted while it was being looked up, or a
+            # stale hit was read; the database answer wins.
+            cache.set(key, _is_blacklisted_in_db(jti), timeout=timeout)
+    return blacklisted
+
+
+def add_to_blacklist(jti: str, expires_at):
+    """
+    Marks a token as blacklisted, overwriting a cached negative lookup.
+    """
+    timeout = _timeout(expires_at)
+    if timeout > 0:
+        cache.set(_key(jti), True, timeout=timeout)
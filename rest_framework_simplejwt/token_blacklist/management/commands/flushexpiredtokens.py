@@ -1,12 +1,36 @@
 from django.core.management.base import BaseCommand
 
-from rest_framework_simplejwt.utils import aware_utcnow
-
-from ...models import OutstandingToken
+from ...utils import flush_expired_tokens
 
 
 class Command(BaseCommand):
     help = "Flushes any expired tokens in the outstanding token list"
 
-    def handle(self, *args, **kwargs):
-        OutstandingToken.objects.filter(expires_at__lte=aware_utcnow()).delete()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tokens deleted per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches, the next run continues",
+        )
+
+    def handle(self, *args, **options):
+        deleted = flush_expired_tokens(
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            max_batches=options["max_batches"],
+            progress=lambda count: self.stdout.write(f"Deleted {count} tokens"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Flushed {deleted} expired tokens."))
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("token_blacklist", "0007_auto_20171017_2214")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="outstandingtoken",
+            name="expires_at",
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
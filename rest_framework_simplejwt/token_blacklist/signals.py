@@ -0,0 +1,18 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .cache import add_to_blacklist
+from .models import BlacklistedToken
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        # Cached once committed, a lookup from another request in between
+        # would store the uncommitted database answer over it.
+        transaction.on_commit(
+            partial(add_to_blacklist, instance.token.jti, instance.token.expires_at)
+        )
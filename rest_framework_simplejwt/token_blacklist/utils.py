@@ -0,0 +1,49 @@
+import time
+
+from django.db import transaction
+
+from ..utils import aware_utcnow
+from .models import BlacklistedToken, OutstandingToken
+
+
+def flush_expired_tokens(batch_size=1000, sleep=0, max_batches=None, progress=None):
+    """
+    Deletes the tokens which expired before the call in batches of
+    `batch_size`, oldest first, so each batch only holds its locks briefly.
+    Stopping part way is safe, the next call continues with the remaining
+    tokens.
+
+    :param batch_size: tokens deleted per transaction
+    :param sleep: seconds to wait between batches
+    :param max_batches: stops after this many batches when given
+    :param progress: called with the number of tokens deleted so far
+    :return: the number of deleted tokens
+    """
+    now = aware_utcnow()
+    deleted = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if len(ids) == 0:
+            break
+
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+
+        deleted += len(ids)
+        batches += 1
+        if progress is not None:
+            progress(deleted)
+
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    return deleted
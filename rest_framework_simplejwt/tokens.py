@@ -6,6 +6,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from .exceptions import TokenBackendError, TokenError
 from .settings import api_settings
+from .token_blacklist.cache import is_blacklisted
 from .token_blacklist.models import BlacklistedToken, OutstandingToken
 from .utils import aware_utcnow, datetime_from_epoch, datetime_to_epoch, format_lazy
 
@@ -188,8 +189,9 @@ class BlacklistMixin:
             `TokenError` if so.
             """
             jti = self.payload[api_settings.JTI_CLAIM]
+            exp = self.payload["exp"]
 
-            if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            if is_blacklisted(jti, datetime_from_epoch(exp)):
                 raise TokenError(_("Token is blacklisted"))
 
         def blacklist(self):
@@ -1,7 +1,110 @@
+import json
+from typing import Dict, Iterable, List, NamedTuple
+
+from fcm_django.fcm import fcm_send_bulk_data_messages, fcm_send_bulk_message
 from fcm_django.models import FCMDevice
+from fcm_django.settings import FCM_DJANGO_SETTINGS
 
 from apps.account.models import User
 
+# FCM errors after which the registration token will never work again.
+INVALID_TOKEN_ERRORS = (
+    "MissingRegistration",
+    "MismatchSenderId",
+    "InvalidRegistration",
+    "NotRegistered",
+)
+
+
+class PushMessage(NamedTuple):
+    user: User
+    title: str
+    body: str
+    data: dict = {}
+
+
+class PushFailure(NamedTuple):
+    user_id: int
+    registration_id: str
+    error: str
+
+
+def send_bulk_push_notification(messages: Iterable[PushMessage]) -> List[PushFailure]:
+    """
+    Sends push notifications to many users at once.
+    Devices of every user are resolved with one query, and users receiving the
+    same payload on the same platform are sent a single multicast request.
+    Devices with invalid tokens are deactivated.
+    :param messages:
+    :return: the failed deliveries
+    """
+    messages = [message for message in messages if message.user is not None]
+    if len(messages) == 0:
+        return []
+
+    devices = FCMDevice.objects.filter(
+        user__in={message.user.id for message in messages}, active=True
+    ).values_list("user_id", "type", "registration_id")
+    devices_by_user: Dict[int, list] = {}
+    for user_id, device_type, registration_id in devices:
+        devices_by_user.setdefault(user_id, []).append((device_type, registration_id))
+
+    # {(is_data_message, payload): (message, [(user_id, registration_id)])}
+    batches = {}
+    for message in messages:
+        for device_type, registration_id in devices_by_user.get(message.user.id, []):
+            is_data_message = device_type == "android"
+            key = (
+                is_data_message,
+                json.dumps(
+                    [message.title, message.body, message.data],
+                    sort_keys=True,
+                    default=str,
+                ),
+            )
+            batch = batches.setdefault(key, (message, []))
+            batch[1].append((message.user.id, registration_id))
+
+    failures = []
+    for (is_data_message, _), (message, recipients) in batches.items():
+        registration_ids = [registration_id for _, registration_id in recipients]
+        if is_data_message:
+            data = dict(message.data)
+            data["notification_data"] = {"title": message.title, "body": message.body}
+            result = fcm_send_bulk_data_messages(
+                registration_ids=registration_ids, data_message=data
+            )
+        else:
+            result = fcm_send_bulk_message(
+                registration_ids=registration_ids,
+                title=message.title,
+                body=message.body,
+                data=message.data,
+            )
+
+        for (user_id, registration_id), item in zip(recipients, result["results"]):
+            if "error" in item:
+                failures.append(PushFailure(user_id, registration_id, item["error"]))
+
+    _deactivate_invalid_devices(failures)
+    return failures
+
+
+def _deactivate_invalid_devices(failures: List[PushFailure]):
+    registration_ids = {
+        failure.registration_id
+        for failure in failures
+        if failure.error in INVALID_TOKEN_ERRORS
+    }
+    if len(registration_ids) == 0:
+        return
+
+    devices = FCMDevice.objects.filter(registration_id__in=registration_ids)
+    if FCM_DJANGO_SETTINGS["DELETE_INACTIVE_DEVICES"]:
+        devices.delete()
+    else:
+        devices.update(active=False)
+
 
 def send_push_notification(user: User, title: str, body: str, data={}):
     """
@@ -12,13 +115,4 @@ def send_push_notification(user: User, title: str, body: str, data={}):
     :param data:
     :return:
     """
-
-    ios_devices = FCMDevice.objects.filter(user=user, active=True, type="ios")
-    ios_devices.send_message(title, body, data=data)
-    web_devices = FCMDevice.objects.filter(user=user, active=True, type="web")
-    web_devices.send_message(title, body, data=data)
-    android_devices = FCMDevice.objects.filter(user=user, active=True, type="android")
-
-    notification_data = {"title": title, "body": body}
-    data["notification_data"] = notification_data
-    android_devices.send_data_message(data_message=data)
+    return send_bulk_push_notification([PushMessage(user, title, body, data)])
@@ -0,0 +1,23 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, using: str = DEFAULT_DB_ALIAS):
+    """
+    Fails when the wrapped block runs more than `max_queries` queries, e.g.
+
+        with assert_max_queries(6):
+            view(request)
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+
+    executed = len(context)
+    assert executed <= max_queries, "{} queries executed, {} allowed:\n{}".format(
+        executed,
+        max_queries,
+        "\n".join(query["sql"] for query in context.captured_queries),
+    )